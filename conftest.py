@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+pytest公共夹具：使用testing配置创建应用，并在每个测试前重建测试数据库
+"""
+
+import sys
+import os
+import threading
+from contextlib import contextmanager
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from src import create_app
+from src.models import db, User, Role
+from src.utils.bootstrap_state import reset_admin_state
+
+
+@pytest.fixture(scope='session')
+def app():
+    """创建测试用应用（整个测试会话只创建一次）"""
+    app = create_app('testing')
+    return app
+
+
+@pytest.fixture
+def clean_db(app):
+    """清空并重建测试数据库表"""
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        # 重建数据库相当于全新安装
+        reset_admin_state()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app, clean_db):
+    """测试客户端"""
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_user(app, clean_db):
+    """创建管理员角色和管理员账户"""
+    admin_role = Role(name='Admin', description='管理员')
+    db.session.add(admin_role)
+    db.session.flush()
+    admin = User(
+        username='admin',
+        email='admin@example.com',
+        password_hash=generate_password_hash('admin123'),
+        role_id=admin_role.id
+    )
+    db.session.add(admin)
+    db.session.commit()
+    return admin
+
+
+@pytest.fixture
+def admin_client(client, admin_user):
+    """已登录管理员账户的测试客户端"""
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(admin_user.id)
+        sess['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def sql_statements(app):
+    """记录执行的SQL语句
+
+    用法:
+        with sql_statements() as statements:
+            client.get('/')
+        # main_thread_only=True 时只记录测试线程执行的语句，忽略后台线程
+    """
+    @contextmanager
+    def capture(main_thread_only=False):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            if not main_thread_only or threading.current_thread() is threading.main_thread():
+                statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', _record)
+
+    return capture
@@ -7,8 +7,22 @@ bind = "0.0.0.0:" + os.getenv("PORT", "10000")
 # 工作进程数
 workers = 4
 
-# 工作模式
-worker_class = "sync"
+# 工作模式：
+# - gevent：协程模式，AI聊天代理、通知推送等流式长连接等待上游时只占用一个协程，
+#   每个进程可同时处理worker_connections个连接（安装了gevent时默认使用）
+# - gthread：每个进程threads个线程，长连接占用一个线程；
+#   此模式下默认不提供通知推送（页面改为轮询），见NOTIFICATION_STREAM_MAX_CONNECTIONS
+# 可通过GUNICORN_WORKER_CLASS环境变量指定
+def _default_worker_class():
+    try:
+        import gevent  # noqa: F401
+        return "gevent"
+    except ImportError:
+        return "gthread"
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS") or _default_worker_class()
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
 
 # 超时设置
 timeout = 120
@@ -48,6 +62,14 @@ def on_starting(server):
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
     logger.info("服务器启动中...")
+    if worker_class != "gevent":
+        stream_limit = os.getenv("NOTIFICATION_STREAM_MAX_CONNECTIONS")
+        if not stream_limit:
+            logger.warning(f"{worker_class}模式下每个推送连接占用一个线程，已关闭通知推送，页面改为轮询未读接口；"
+                           f"安装gevent后自动启用")
+        elif int(stream_limit) > threads // 4:
+            logger.warning(f"NOTIFICATION_STREAM_MAX_CONNECTIONS={stream_limit}，{worker_class}模式下推送连接"
+                           f"最多会占用每个进程{threads}个线程中的{stream_limit}个，建议不超过{threads // 4}")
 
 # 工作进程启动时的钩子
 def when_ready(server):
@@ -55,11 +77,23 @@ def when_ready(server):
     logger = logging.getLogger(__name__)
     logger.info("服务器就绪，可以接受请求")
 
+# 工作进程fork后、加载应用前的钩子
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        # psycopg2的查询默认会阻塞整个进程，打补丁后等待数据库时切换到其他协程；
+        # 必须在加载应用（create_app建立连接池中的连接）之前打补丁
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            import logging
+            logging.getLogger(__name__).warning("未安装psycogreen，PostgreSQL查询期间会阻塞同一进程的其他连接")
+
 # 工作进程启动后的钩子
 def post_worker_init(worker):
     import logging
     logger = logging.getLogger(__name__)
-    logger.info(f"工作进程 {worker.pid} 已初始化")
+    logger.info(f"工作进程 {worker.pid} 已初始化（{worker_class}）")
 
 # 确保环境变量
 def on_exit(server):
@@ -61,7 +61,7 @@ class AutoSyncScheduler:
         retry_count = 0
         while retry_count < self.max_retries:
             try:
-                success = self.syncer.backup_to_clawcloud()
+                success = self.syncer.incremental_backup_to_clawcloud()
                 if success:
                     self.last_sync_time = datetime.now()
                     logger.info(f"同步成功完成，下次同步时间: {self.last_sync_time + timedelta(hours=self.sync_interval_hours)}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+积分分布统计基准测试
+对比"加载全部StudentInfo后在Python中分桶"与"数据库端单条CASE分桶聚合"在不同学生规模下的耗时。
+
+用法:
+    python scripts/benchmark_points_histogram.py [--sizes 1000,10000,100000] [--repeat 5] [--database-url URL]
+
+默认使用临时SQLite数据库；指定--database-url时会在该库中创建并清空student_info表，请勿指向生产库。
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine, select, delete, insert
+from sqlalchemy.orm import Session
+
+from src.models import StudentInfo
+from src.utils.statistics import DEFAULT_POINTS_BINS, points_distribution
+
+
+def legacy_points_distribution(session, edges):
+    """旧实现：加载全部学生对象，在Python中逐个分桶"""
+    counts = [0] * len(edges)
+    for stu in session.execute(select(StudentInfo)).scalars().all():
+        points = stu.points or 0
+        if points >= edges[-1]:
+            counts[-1] += 1
+            continue
+        for i in range(len(edges) - 1):
+            if edges[i] <= points < edges[i + 1]:
+                counts[i] += 1
+                break
+    return counts
+
+
+def fill_students(engine, total):
+    """将student_info表填充到total行"""
+    table = StudentInfo.__table__
+    rng = random.Random(total)
+    with engine.begin() as conn:
+        conn.execute(delete(table))
+        batch = []
+        for i in range(total):
+            batch.append({'student_id': f'S{i:08d}', 'real_name': f'学生{i}', 'points': int(rng.expovariate(1 / 80))})
+            if len(batch) == 5000:
+                conn.execute(insert(table), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(table), batch)
+
+
+def best_of(repeat, func):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='积分分布统计基准测试')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='学生数量，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每种规模重复次数，取最快一次')
+    parser.add_argument('--database-url', help='数据库连接串，默认使用临时SQLite文件')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.mkdtemp(prefix='points_bench_')
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+
+    engine = create_engine(database_url)
+    StudentInfo.__table__.create(engine, checkfirst=True)
+    edges = DEFAULT_POINTS_BINS
+
+    print(f"{'学生数':>10} {'Python分桶(ms)':>16} {'数据库聚合(ms)':>16} {'加速比':>8}")
+    for total in (int(size) for size in args.sizes.split(',')):
+        fill_students(engine, total)
+
+        def _legacy():
+            with Session(engine) as session:
+                return legacy_points_distribution(session, edges)
+
+        def _aggregate():
+            with engine.connect() as conn:
+                return points_distribution(edges, connection=conn)['data']
+
+        legacy_time, legacy_counts = best_of(args.repeat, _legacy)
+        aggregate_time, aggregate_counts = best_of(args.repeat, _aggregate)
+        assert legacy_counts == aggregate_counts, (legacy_counts, aggregate_counts)
+        print(f"{total:>10} {legacy_time * 1000:>16.1f} {aggregate_time * 1000:>16.1f} {legacy_time / aggregate_time:>7.1f}x")
+
+    engine.dispose()
+    if tmp_dir:
+        import shutil
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+恢复写入基准测试
+对比旧的逐行写入（循环内为每行构造 INSERT/UPSERT 并单独执行）与 BatchUpsert 批量写入的速度（行/秒）。
+
+用法:
+    python scripts/benchmark_restore_upsert.py [--sizes 1000,10000,50000] [--repeat 3] [--database-url URL]
+
+默认使用临时SQLite数据库；指定--database-url（如PostgreSQL）时会在该库中创建并删除bench_restore_rows表，请勿指向生产库。
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine, text
+
+from src.batch_upsert import BatchUpsert
+
+TABLE = 'bench_restore_rows'
+COLUMNS = ['id', 'username', 'email', 'points', 'created_at']
+
+
+def make_rows(total, version=0):
+    base = datetime(2026, 1, 1)
+    return [(i, f'user{i}', f'user{i}.v{version}@example.com', i % 500, base + timedelta(minutes=i))
+            for i in range(1, total + 1)]
+
+
+def legacy_write(conn, rows, upsert):
+    """旧实现：每行构造一次语句并单独执行"""
+    for row in rows:
+        column_names = ', '.join([f'"{col}"' for col in COLUMNS])
+        placeholders = ', '.join([f':{col}' for col in COLUMNS])
+        sql = f'INSERT INTO "{TABLE}" ({column_names}) VALUES ({placeholders})'
+        if upsert:
+            sql += ' ON CONFLICT (id) DO UPDATE SET ' + ', '.join(
+                f'"{col}" = EXCLUDED."{col}"' for col in COLUMNS if col != 'id')
+        params = {}
+        for i, col in enumerate(COLUMNS):
+            params[col] = row[i] if i < len(row) else None
+        conn.execute(text(sql), params)
+
+
+def batch_write(conn, rows, upsert):
+    BatchUpsert(conn, TABLE, COLUMNS, on_conflict='update' if upsert else 'error').write(rows)
+
+
+def timed(engine, func, rows, upsert, repeat):
+    """返回最快一次的耗时；插入测试每次先清空表，更新测试在已有数据上执行"""
+    timings = []
+    for _ in range(repeat):
+        with engine.connect() as conn:
+            if not upsert:
+                conn.execute(text(f'DELETE FROM "{TABLE}"'))
+                conn.commit()
+            started = time.perf_counter()
+            func(conn, rows, upsert)
+            conn.commit()
+            timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='恢复写入基准测试')
+    parser.add_argument('--sizes', default='1000,10000,50000', help='行数，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=3, help='每种规模重复次数，取最快一次')
+    parser.add_argument('--database-url', help='数据库连接串，默认使用临时SQLite文件')
+    args = parser.parse_args()
+
+    tmp_dir = None
+    database_url = args.database_url
+    if not database_url:
+        tmp_dir = tempfile.mkdtemp(prefix='restore_bench_')
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{TABLE}"'))
+        conn.execute(text(f'CREATE TABLE "{TABLE}" (id INTEGER PRIMARY KEY, username VARCHAR(64), '
+                          'email VARCHAR(120), points INTEGER, created_at TIMESTAMP)'))
+
+    print(f"数据库: {engine.dialect.name}")
+    print(f"{'行数':>8} {'模式':>6} {'逐行(行/秒)':>14} {'批量(行/秒)':>14} {'加速比':>8}")
+    try:
+        for total in (int(size) for size in args.sizes.split(',')):
+            rows = make_rows(total)
+            for upsert in (False, True):
+                if upsert:
+                    # 更新测试：表中已有相同id的行，写入新版本的数据
+                    rows = make_rows(total, version=1)
+                legacy = timed(engine, legacy_write, rows, upsert, args.repeat)
+                batch = timed(engine, batch_write, rows, upsert, args.repeat)
+                with engine.connect() as conn:
+                    assert conn.execute(text(f'SELECT COUNT(*) FROM "{TABLE}"')).scalar() == total
+                mode = 'upsert' if upsert else 'insert'
+                print(f"{total:>8} {mode:>6} {total / legacy:>14,.0f} {total / batch:>14,.0f} {legacy / batch:>7.1f}x")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{TABLE}"'))
+        engine.dispose()
+        if tmp_dir:
+            import shutil
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -274,6 +274,53 @@ def ensure_db_structure(app=None, db=None):
                         db.session.execute(text("ALTER TABLE activities ADD COLUMN IF NOT EXISTS poster VARCHAR(255)"))
                         logger.info("已添加poster列到activities表(PostgreSQL)")
                     db.session.commit()
+
+                # 检查并添加poster_size列
+                if 'poster_size' not in activities_columns:
+                    db_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+                    if db_uri and 'sqlite' in db_uri:
+                        db.session.execute(text("ALTER TABLE activities ADD COLUMN poster_size INTEGER"))
+                        logger.info("已添加poster_size列到activities表(SQLite)")
+                    else:
+                        db.session.execute(text("ALTER TABLE activities ADD COLUMN IF NOT EXISTS poster_size INTEGER"))
+                        logger.info("已添加poster_size列到activities表(PostgreSQL)")
+                    db.session.commit()
+                
+                # 检查并添加poster_hash列（缺失的哈希在首次请求海报时补齐）
+                if 'poster_hash' not in activities_columns:
+                    db_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+                    if db_uri and 'sqlite' in db_uri:
+                        db.session.execute(text("ALTER TABLE activities ADD COLUMN poster_hash VARCHAR(64)"))
+                        logger.info("已添加poster_hash列到activities表(SQLite)")
+                    else:
+                        db.session.execute(text("ALTER TABLE activities ADD COLUMN IF NOT EXISTS poster_hash VARCHAR(64)"))
+                        logger.info("已添加poster_hash列到activities表(PostgreSQL)")
+                    db.session.commit()
+                
+                # 检查并添加报名计数器列，新增后根据报名表回填
+                counter_columns = ['registered_count', 'attended_count', 'cancelled_count']
+                missing_counters = [c for c in counter_columns if c not in activities_columns]
+                if missing_counters:
+                    db_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+                    for column in missing_counters:
+                        if db_uri and 'sqlite' in db_uri:
+                            db.session.execute(text(f"ALTER TABLE activities ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+                            logger.info(f"已添加{column}列到activities表(SQLite)")
+                        else:
+                            db.session.execute(text(f"ALTER TABLE activities ADD COLUMN IF NOT EXISTS {column} INTEGER NOT NULL DEFAULT 0"))
+                            logger.info(f"已添加{column}列到activities表(PostgreSQL)")
+                    db.session.commit()
+                    
+                    from src.models import recount_registrations
+                    updated = recount_registrations()
+                    db.session.commit()
+                    logger.info(f"已回填 {updated} 个活动的报名计数器")
+                
+                # 根据已有的poster_data回填poster_size（包括从备份库恢复的旧数据）
+                result = db.session.execute(text("UPDATE activities SET poster_size = LENGTH(poster_data) WHERE poster_data IS NOT NULL AND poster_size IS NULL"))
+                if result.rowcount:
+                    logger.info(f"已回填 {result.rowcount} 个活动的poster_size")
+                db.session.commit()
             
             # 检查users表的列
             if 'users' in inspector.get_table_names():
@@ -406,6 +453,17 @@ def ensure_db_structure(app=None, db=None):
             except Exception as e:
                 logger.warning(f"启动自动恢复执行时出现问题: {e}")
             
+            # 每日统计汇总表为空时（新建表或从旧备份恢复后）根据源表回填历史数据
+            try:
+                from src.utils.daily_stats import ensure_daily_stats_backfilled
+                days = ensure_daily_stats_backfilled()
+                db.session.commit()
+                if days:
+                    logger.info(f"已回填 {days} 天的每日统计汇总")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"回填每日统计汇总失败: {e}")
+            
             return True
         except Exception as e:
             logger.error(f"确保数据库结构时出错: {str(e)}")
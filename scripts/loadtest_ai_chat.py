@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+AI聊天流式代理负载测试
+启动一个本地的模拟大模型服务（按固定间隔输出SSE片段），再用gunicorn按指定的工作模式启动应用，
+同时发起大量 /api/ai_chat 流式请求，并在此期间持续请求普通页面，观察长连接是否占满请求槽位。
+
+用法:
+    python scripts/loadtest_ai_chat.py [--streams 200] [--chunks 20] [--chunk-delay 0.25]
+                                       [--worker-class gevent|gthread|sync] [--workers 4] [--threads 8]
+
+默认使用gunicorn_config.py中的工作模式（安装了gevent时为gevent）。
+应用使用临时SQLite数据库和临时共享缓存文件，不会影响instance目录下的数据。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_root)
+
+LOADTEST_USERNAME = 'ai_loadtest'
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """模拟OpenAI兼容的流式chat/completions接口"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, chunks, chunk_delay):
+        super().__init__(address, StubLLMHandler)
+        self.chunks = chunks
+        self.chunk_delay = chunk_delay
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for i in range(self.server.chunks):
+                chunk = {'choices': [{'delta': {'content': f'片段{i} '}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(self.server.chunk_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_app():
+    """gunicorn加载的应用：关闭限流，避免负载测试的请求被默认限额拦截"""
+    from src import create_app, limiter
+
+    app = create_app(os.environ.get('FLASK_CONFIG', 'development'))
+    limiter.enabled = False
+    return app
+
+
+def prepare_session_cookie():
+    """在临时数据库中创建测试用户，返回已登录的会话Cookie"""
+    from werkzeug.security import generate_password_hash
+    from src import create_app
+    from src.models import db, Role, User
+
+    app = create_app(os.environ['FLASK_CONFIG'])
+    with app.app_context():
+        role = db.session.execute(db.select(Role).filter_by(name='Admin')).scalar_one_or_none()
+        if role is None:
+            role = Role(name='Admin', description='管理员')
+            db.session.add(role)
+            db.session.flush()
+        user = db.session.execute(db.select(User).filter_by(username=LOADTEST_USERNAME)).scalar_one_or_none()
+        if user is None:
+            user = User(username=LOADTEST_USERNAME, email=f'{LOADTEST_USERNAME}@example.com',
+                        password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000'), role_id=role.id)
+            db.session.add(user)
+            db.session.commit()
+        serializer = app.session_interface.get_signing_serializer(app)
+        return app.config['SESSION_COOKIE_NAME'], serializer.dumps({'_user_id': str(user.id), '_fresh': True})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, process, timeout=90):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn启动失败')
+        try:
+            if requests.get(f'{base_url}/about', timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('等待gunicorn启动超时')
+
+
+def run_stream(base_url, cookies, index, barrier, results):
+    import requests
+
+    barrier.wait()
+    started = time.perf_counter()
+    first_byte = None
+    chunks = 0
+    error = None
+    try:
+        with requests.get(f'{base_url}/api/ai_chat', params={'message': f'问题{index}'},
+                          cookies=cookies, stream=True, timeout=120) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b'data: '):
+                    continue
+                data = json.loads(line[6:])
+                if 'error' in data:
+                    error = data['error']
+                    break
+                if 'content' in data:
+                    chunks += 1
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+    except Exception as e:
+        error = str(e)
+    results.append({
+        'first_byte': first_byte,
+        'total': time.perf_counter() - started,
+        'chunks': chunks,
+        'error': error,
+    })
+
+
+def probe(base_url, stop_event, latencies):
+    """流式请求进行期间持续请求普通页面，记录响应时间"""
+    import requests
+
+    while not stop_event.is_set():
+        started = time.perf_counter()
+        try:
+            requests.get(f'{base_url}/about', timeout=60)
+            latencies.append(time.perf_counter() - started)
+        except requests.RequestException:
+            latencies.append(float('inf'))
+        stop_event.wait(0.25)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    import gunicorn_config
+
+    parser = argparse.ArgumentParser(description='AI聊天流式代理负载测试')
+    parser.add_argument('--streams', type=int, default=200, help='并发流式请求数')
+    parser.add_argument('--chunks', type=int, default=20, help='模拟模型每次回复的片段数')
+    parser.add_argument('--chunk-delay', type=float, default=0.25, help='模拟模型输出片段的间隔（秒）')
+    parser.add_argument('--worker-class', default=gunicorn_config.worker_class, help='gunicorn工作模式')
+    parser.add_argument('--workers', type=int, default=gunicorn_config.workers, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=gunicorn_config.threads, help='gthread模式下每个进程的线程数')
+    parser.add_argument('--worker-connections', type=int, default=gunicorn_config.worker_connections,
+                        help='gevent模式下每个进程的最大连接数')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='ai_chat_loadtest_')
+    stub = StubLLMServer(('127.0.0.1', 0), args.chunks, args.chunk_delay)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    env = dict(os.environ)
+    env.update({
+        'FLASK_CONFIG': 'development',
+        'DATABASE_URL': f"sqlite:///{os.path.join(tmp_dir, 'loadtest.db')}",
+        'SHARED_CACHE_PATH': os.path.join(tmp_dir, 'shared_cache.db'),
+        'VOLCANO_API_URL': f'http://127.0.0.1:{stub.server_address[1]}/api/v3/chat/completions',
+        'ARK_API_KEY': 'loadtest',
+    })
+    os.environ.update(env)
+    cookie_name, cookie_value = prepare_session_cookie()
+
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers),
+        '--worker-class', args.worker_class,
+        '--threads', str(args.threads),
+        '--worker-connections', str(args.worker_connections),
+        '--timeout', '120',
+        '--log-level', 'warning',
+        '--pythonpath', f'{project_root},{scripts_dir}',
+        'loadtest_ai_chat:build_app()',
+    ]
+    process = subprocess.Popen(command, env=env, cwd=project_root,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(base_url, process)
+
+        results = []
+        latencies = []
+        stop_event = threading.Event()
+        barrier = threading.Barrier(args.streams)
+        workers = [
+            threading.Thread(target=run_stream, args=(base_url, {cookie_name: cookie_value}, i, barrier, results))
+            for i in range(args.streams)
+        ]
+        prober = threading.Thread(target=probe, args=(base_url, stop_event, latencies))
+
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        prober.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        prober.join()
+    finally:
+        process.terminate()
+        process.wait(30)
+        stub.shutdown()
+
+    ideal = args.chunks * args.chunk_delay
+    completed = [r for r in results if not r['error'] and r['chunks'] == args.chunks]
+    first_bytes = [r['first_byte'] for r in results if r['first_byte'] is not None]
+    totals = [r['total'] for r in completed]
+    print(f"工作模式: {args.worker_class}  进程数: {args.workers}  "
+          f"线程数: {args.threads}  每进程连接数: {args.worker_connections}")
+    print(f"并发流: {args.streams}  每个回复: {args.chunks}段 x {args.chunk_delay}s（单个流理想耗时 {ideal:.2f}s）")
+    print(f"完成: {len(completed)}/{args.streams}  出错: {sum(1 for r in results if r['error'])}  总耗时: {elapsed:.2f}s")
+    print(f"首个片段延迟  p50: {percentile(first_bytes, 0.5):.2f}s  p95: {percentile(first_bytes, 0.95):.2f}s  "
+          f"max: {max(first_bytes, default=float('nan')):.2f}s")
+    print(f"单个流耗时    p50: {percentile(totals, 0.5):.2f}s  p95: {percentile(totals, 0.95):.2f}s  "
+          f"max: {max(totals, default=float('nan')):.2f}s")
+    print(f"期间普通页面  请求数: {len(latencies)}  p50: {percentile(latencies, 0.5) * 1000:.0f}ms  "
+          f"max: {max(latencies, default=float('nan')) * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 import os
 import logging
+import click
 from logging.handlers import RotatingFileHandler
 import pytz
-from flask import Flask, session, g, request
+from flask import Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager, current_user
@@ -71,9 +72,19 @@ def create_app(config_name=None):
     # 使用Flask原生会话而不是Flask-Session，避免云环境文件系统问题
     app.logger.info("使用Flask原生会话系统")
     
+    # 注册sqlite://限流存储，缓存和限流计数在各工作进程之间共享
+    import src.utils.shared_cache  # noqa: F401
     limiter.init_app(app)
     cache.init_app(app)
     
+    # 系统日志由后台线程批量写入
+    from src.utils.audit_log import audit_log
+    audit_log.init_app(app)
+    
+    # 通知推送中心（SSE）
+    from src.utils.notification_hub import notification_hub
+    notification_hub.init_app(app)
+    
     # 配置登录管理器
     login_manager.login_view = 'auth.login'
     login_manager.login_message = '请先登录以访问此页面'
@@ -110,8 +121,9 @@ def create_app(config_name=None):
     def before_request():
         """在请求处理前设置时区"""
         timezone_name = app.config.get('TIMEZONE_NAME', 'Asia/Shanghai')
-        # 将时区存储在会话中，方便在模板和视图中使用
-        session['timezone'] = timezone_name
+        # 时区只保存在请求上下文中，不写入会话，
+        # 未登录的请求（首次访问、爬虫、CDN回源、海报图片）不会因此下发Set-Cookie
+        g.timezone_name = timezone_name
         g.timezone = pytz.timezone(timezone_name)
     
     # 注册Shell上下文
@@ -167,7 +179,14 @@ def create_app(config_name=None):
     
     # 注册全局上下文处理器
     register_context_processors(app)
-    
+
+    # 建立海报文件索引，请求中解析海报无需扫描目录
+    try:
+        from src.utils.poster_index import init_poster_index
+        init_poster_index(app)
+    except Exception as e:
+        app.logger.warning(f"建立海报索引失败: {e}")
+
     # 调用确保数据库结构的脚本
     with app.app_context():
         try:
@@ -186,6 +205,24 @@ def create_app(config_name=None):
         except Exception as e:
             app.logger.error(f"初始化数据库结构时出错: {e}")
     
+    # 检查系统是否已创建管理员账户，之后首页无需每次查询
+    from src.utils.bootstrap_state import init_admin_state
+    init_admin_state(app)
+    
+    # 定时重新汇总最近几天的每日统计，修正写入钩子无法感知的变化
+    try:
+        from src.utils.daily_stats import start_daily_stats_scheduler
+        start_daily_stats_scheduler(app)
+    except Exception as e:
+        app.logger.warning(f"启动每日统计汇总定时任务失败: {e}")
+    
+    # 后台预取即将开始的活动的天气，活动详情页不再等待天气接口
+    try:
+        from src.utils.weather_prefetch import start_weather_prefetcher
+        start_weather_prefetcher(app)
+    except Exception as e:
+        app.logger.warning(f"启动活动天气预取任务失败: {e}")
+    
     return app
 
 def setup_logging(app):
@@ -291,6 +328,7 @@ def register_commands(app):
     def create_admin():
         """创建管理员账户"""
         from src.models import User, Role
+        from src.utils.bootstrap_state import mark_admin_created
         from werkzeug.security import generate_password_hash
         
         # 检查是否已存在管理员角色
@@ -312,6 +350,7 @@ def register_commands(app):
             )
             db.session.add(admin)
             db.session.commit()
+            mark_admin_created()
             app.logger.info('已创建管理员用户: admin/admin123')
         else:
             app.logger.info('管理员用户已存在')
@@ -322,6 +361,54 @@ def register_commands(app):
         db.create_all()
         app.logger.info('已初始化数据库表')
 
+    @app.cli.command('repair-registration-counts')
+    def repair_registration_counts():
+        """根据报名表重新计算所有活动的报名计数器"""
+        from src.models import recount_registrations
+
+        try:
+            updated = recount_registrations()
+            db.session.commit()
+            app.logger.info(f'已重新计算 {updated} 个活动的报名计数器')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'重新计算报名计数器失败: {e}')
+            raise
+
+    @app.cli.command('backfill-daily-stats')
+    @click.option('--start', help='起始日期(YYYY-MM-DD)，默认为最早的数据日期')
+    @click.option('--end', help='结束日期(YYYY-MM-DD)，默认为今天')
+    def backfill_daily_stats_command(start, end):
+        """根据活动、报名、用户和积分记录重建每日统计汇总"""
+        from datetime import date
+        from src.utils.daily_stats import backfill_daily_stats
+
+        try:
+            days = backfill_daily_stats(
+                start=date.fromisoformat(start) if start else None,
+                end=date.fromisoformat(end) if end else None
+            )
+            db.session.commit()
+            app.logger.info(f'已重建 {days} 天的每日统计汇总')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'重建每日统计汇总失败: {e}')
+            raise
+
+    @app.cli.command('reconcile-unread-counters')
+    def reconcile_unread_counters_command():
+        """根据通知、阅读记录和消息表重建所有用户的未读计数器"""
+        from src.utils.unread_counters import reconcile_unread_counters
+
+        try:
+            users = reconcile_unread_counters()
+            db.session.commit()
+            app.logger.info(f'已重建 {users} 个用户的未读计数器')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'重建未读计数器失败: {e}')
+            raise
+
 def register_template_functions(app):
     """注册模板函数"""
     # 从utils.time_helpers导入时间处理函数
@@ -41,8 +41,8 @@ class AutoBackupService:
             beijing_time = get_beijing_time()
             logger.info(f"开始自动备份 - {beijing_time.strftime('%Y-%m-%d %H:%M:%S')}")
             
-            # 执行备份
-            success = self.syncer.backup_to_clawcloud()
+            # 执行增量备份（首次同步的表会整表复制）
+            success = self.syncer.incremental_backup_to_clawcloud()
             
             if success:
                 logger.info("自动备份成功完成")
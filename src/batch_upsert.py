@@ -0,0 +1,103 @@
+"""
+数据库同步的批量写入
+恢复和增量备份按表写入大量行，这里把 INSERT 语句在循环外构造一次，按批写入：
+- PostgreSQL：多行 VALUES，一条语句写入一批，减少网络往返；
+- 其他数据库（SQLite）：单行语句 executemany，驱动在进程内循环执行；
+- 冲突处理使用 INSERT ... ON CONFLICT，SQLite（3.24+）与PostgreSQL语法一致：
+  update=按冲突列更新其他列，ignore=跳过冲突的行，error=不处理（冲突时报错）。
+"""
+import os
+
+from sqlalchemy import text
+
+# 每批写入的行数
+BATCH_ROWS = int(os.environ.get('DB_SYNC_BATCH_ROWS', 1000))
+# PostgreSQL单条语句最多65535个参数
+MAX_BIND_PARAMS = 65535
+
+
+class BatchUpsert:
+    """按列顺序批量写入一张表
+
+    用法:
+        writer = BatchUpsert(conn, 'roles', ['id', 'name'], on_conflict='update')
+        written = writer.write(rows)  # rows 为与 columns 顺序一致的元组或Row
+    """
+
+    def __init__(self, conn, table_name, columns, on_conflict='error', conflict_columns=('id',),
+                 update_columns=None, batch_size=None):
+        if on_conflict not in ('error', 'update', 'ignore'):
+            raise ValueError(f"不支持的冲突处理方式: {on_conflict}")
+        self.conn = conn
+        self.table_name = table_name
+        self.columns = list(columns)
+        self.conflict_columns = list(conflict_columns or ())
+        if update_columns is None:
+            update_columns = [col for col in self.columns if col not in self.conflict_columns]
+        self.update_columns = list(update_columns)
+        if on_conflict == 'update' and not self.update_columns:
+            on_conflict = 'ignore'
+        self.on_conflict = on_conflict
+
+        self.multi_values = getattr(conn.dialect, 'name', '') == 'postgresql'
+        batch_size = batch_size or BATCH_ROWS
+        if self.multi_values:
+            batch_size = min(batch_size, MAX_BIND_PARAMS // max(1, len(self.columns)))
+        self.batch_size = max(1, batch_size)
+
+        self._prefix = 'INSERT INTO "{}" ({})'.format(
+            table_name, ', '.join(f'"{col}"' for col in self.columns))
+        self._suffix = self._conflict_clause()
+        self._statements = {}
+
+    def _conflict_clause(self):
+        if self.on_conflict == 'error':
+            return ''
+        clause = ' ON CONFLICT'
+        if self.conflict_columns:
+            clause += ' ({})'.format(', '.join(f'"{col}"' for col in self.conflict_columns))
+        if self.on_conflict == 'ignore':
+            return clause + ' DO NOTHING'
+        updates = ', '.join(f'"{col}" = excluded."{col}"' for col in self.update_columns)
+        return f'{clause} DO UPDATE SET {updates}'
+
+    def _statement(self, rows_per_statement):
+        """rows_per_statement 行的 INSERT 语句，按行数缓存"""
+        stmt = self._statements.get(rows_per_statement)
+        if stmt is None:
+            width = len(self.columns)
+            values = ', '.join(
+                '({})'.format(', '.join(f':p{r * width + c}' for c in range(width)))
+                for r in range(rows_per_statement)
+            )
+            stmt = text(f'{self._prefix} VALUES {values}{self._suffix}')
+            self._statements[rows_per_statement] = stmt
+        return stmt
+
+    def write(self, rows):
+        """写入 rows，返回数据库报告写入（插入或更新）的行数"""
+        written = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                written += self._write_batch(batch)
+                batch = []
+        if batch:
+            written += self._write_batch(batch)
+        return written
+
+    def _write_batch(self, batch):
+        if self.multi_values:
+            params = {}
+            index = 0
+            for row in batch:
+                for value in row:
+                    params[f'p{index}'] = value
+                    index += 1
+            result = self.conn.execute(self._statement(len(batch)), params)
+        else:
+            result = self.conn.execute(self._statement(1), [
+                {f'p{c}': value for c, value in enumerate(row)} for row in batch
+            ])
+        return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(batch)
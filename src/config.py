@@ -111,6 +111,10 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'docx', 'xlsx', 'pptx', 'txt', 'zip'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
+    # 海报尺寸变体配置
+    POSTER_CACHE_FOLDER = os.environ.get('POSTER_CACHE_FOLDER', os.path.join(INSTANCE_PATH, 'poster_cache'))
+    POSTER_VARIANT_WIDTHS = (400, 800, 1200)  # 卡片缩略图、详情页、高清屏详情页
+    
     # 数据库配置
     INSTANCE_PATH = INSTANCE_PATH
     DB_PATH = DB_PATH
@@ -153,6 +157,15 @@ class Config:
     # 天气API配置 - OpenWeather（备用）
     OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', '8091ce90ee692da18471b3961900b431')
     
+    # 天气数据缓存（秒），见src/utils/weather_cache.py
+    WEATHER_LIVE_REPORT_INTERVAL = 3600  # 实况天气约每小时发布一次
+    WEATHER_FORECAST_REPORT_INTERVAL = 10800  # 预报天气约每三小时发布一次
+    WEATHER_CACHE_MIN_TTL = 300
+    WEATHER_CACHE_STALE_SECONDS = 21600  # 上游失败时最多继续使用6小时前的数据
+    WEATHER_CACHE_FAILURE_TTL = 60  # 上游失败后多久再重试
+    WEATHER_REFRESH_WAIT_SECONDS = 3  # 没有旧数据时等待其他请求刷新的最长时间，超时后不显示天气
+    WEATHER_PREFETCH_INTERVAL = int(os.environ.get('WEATHER_PREFETCH_INTERVAL', 600))  # 后台预取活动天气的间隔，0表示不预取
+    
     # 如果使用PostgreSQL，设置时区和连接参数 - 优化连接性能
     if 'postgresql:' in str(SQLALCHEMY_DATABASE_URI):
         SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {
@@ -174,12 +187,15 @@ class Config:
     SESSION_COOKIE_SECURE = False  # 在开发环境中设为False，生产环境应为True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
-    # Flask-Cache配置
-    CACHE_TYPE = 'SimpleCache'
+    # Flask-Cache配置：各工作进程共享instance目录下的SQLite缓存文件
+    SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH') or os.path.join(INSTANCE_PATH, 'shared_cache.db')
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'src.utils.shared_cache.SQLiteCache')
+    CACHE_THRESHOLD = int(os.environ.get('CACHE_THRESHOLD', 2000))
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', 300))
+    HOME_FEED_TTL = int(os.environ.get('HOME_FEED_TTL', 60))  # 首页数据快照有效期（秒），即将开始的活动等依赖当前时间
     
     # Flask-Limiter配置
-    RATELIMIT_STORAGE_URL = "memory://"
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL') or f"sqlite:///{SHARED_CACHE_PATH}"  # 与缓存共用同一文件，限流计数跨进程生效
     RATELIMIT_DEFAULT = "200 per day, 50 per hour"
     RATELIMIT_STRATEGY = 'fixed-window'
     
@@ -187,12 +203,43 @@ class Config:
     APP_NAME = os.environ.get('APP_NAME', '重庆师范大学师能素质协会')
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 10))
     
+    # 每日统计汇总：定时重新汇总的间隔（秒，0表示不启动定时任务）和最近天数
+    DAILY_STATS_REFRESH_INTERVAL = int(os.environ.get('DAILY_STATS_REFRESH_INTERVAL', 600))
+    DAILY_STATS_REFRESH_DAYS = int(os.environ.get('DAILY_STATS_REFRESH_DAYS', 2))
+    
+    # 系统日志异步批量写入：每批条数、最长等待时间（秒）和队列上限
+    AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 100))
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 2))
+    AUDIT_LOG_QUEUE_SIZE = int(os.environ.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+    
+    # 通知推送（SSE）：单个连接最长保持时间和心跳间隔（秒），多进程之间经共享缓存文件中继
+    NOTIFICATION_STREAM_TIMEOUT = int(os.environ.get('NOTIFICATION_STREAM_TIMEOUT', 300))
+    NOTIFICATION_STREAM_HEARTBEAT = int(os.environ.get('NOTIFICATION_STREAM_HEARTBEAT', 15))
+    NOTIFICATION_HUB_RELAY = os.environ.get('NOTIFICATION_HUB_RELAY', 'true').lower() == 'true'
+    # 每个进程最多同时保持的推送连接数；不设置时gevent工作进程为500，
+    # gthread等线程工作进程为0（每个连接占用一个线程，不提供推送，页面改为轮询）
+    NOTIFICATION_STREAM_MAX_CONNECTIONS = (int(os.environ['NOTIFICATION_STREAM_MAX_CONNECTIONS'])
+                                           if os.environ.get('NOTIFICATION_STREAM_MAX_CONNECTIONS') else None)
+    
+    # 统计页积分分布区间边界
+    POINTS_DISTRIBUTION_BINS = os.environ.get('POINTS_DISTRIBUTION_BINS', '0,10,30,50,100,200,500,1000')
+    
     # 活动类型
     ACTIVITY_TYPES = ['cultural', 'sports', 'academic', 'volunteer', 'competition', 'other']
     
     # AI API配置
     VOLCANO_API_KEY = os.environ.get('VOLCANO_API_KEY', os.environ.get('ARK_API_KEY', ''))
     VOLCANO_API_URL = os.environ.get('VOLCANO_API_URL', 'https://ark.cn-beijing.volces.com/api/v3/chat/completions')
+    AI_CHAT_UPSTREAM_TIMEOUT = int(os.environ.get('AI_CHAT_UPSTREAM_TIMEOUT', 30))  # 连接和等待上游每段输出的超时（秒）
+    
+    # 对外HTTP请求（天气、AI接口）的连接池、超时和重试，见src/utils/http_client.py
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # 保留连接池的上游主机数
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 20))  # 每个主机保留的空闲连接数
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+    HTTP_RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))
+    HTTP_SLOW_REQUEST_SECONDS = float(os.environ.get('HTTP_SLOW_REQUEST_SECONDS', 3))
     
     # 应用时区配置
     APP_TIMEZONE = os.environ.get('APP_TIMEZONE') or 'Asia/Shanghai'
@@ -233,6 +280,14 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(INSTANCE_PATH, "cqnu_association_test.db")}'
     WTF_CSRF_ENABLED = False  # 测试环境禁用CSRF验证
+    HOME_FEED_TTL = 0  # 测试环境默认不缓存首页快照，避免测试之间互相影响
+    DAILY_STATS_REFRESH_INTERVAL = 0  # 测试环境不启动每日统计定时汇总线程
+    CACHE_TYPE = 'SimpleCache'  # 测试之间不共享缓存和限流计数
+    RATELIMIT_STORAGE_URL = 'memory://'
+    AUDIT_LOG_FLUSH_INTERVAL = 0.05
+    NOTIFICATION_HUB_RELAY = False  # 测试环境只在进程内推送
+    NOTIFICATION_STREAM_MAX_CONNECTIONS = 2  # 测试客户端在线程中处理请求
+    WEATHER_PREFETCH_INTERVAL = 0  # 测试环境不启动天气预取线程
     
 class ProductionConfig(Config):
     """生产环境配置"""
@@ -6,12 +6,13 @@ import os
 import sys
 import logging
 import json
+import queue
 import subprocess
 import threading
 import time
 import uuid
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine, text, MetaData, Table, inspect
+from sqlalchemy import create_engine, text, bindparam, MetaData, Table, inspect
 from sqlalchemy.orm import sessionmaker
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -20,10 +21,100 @@ from psycopg2.extras import RealDictCursor
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.dual_db_config import dual_db
+from src.batch_upsert import BatchUpsert
+from src.table_checksum import SKIP_UNCHANGED_TABLES, compare_table
 from src.utils.time_helpers import get_beijing_time
 
 logger = logging.getLogger(__name__)
 
+# PostgreSQL之间用COPY流式传输时每个数据块的字节数和最多排队的块数，内存占用约为二者之积
+COPY_CHUNK_BYTES = int(os.environ.get('DB_SYNC_COPY_CHUNK_BYTES', 1024 * 1024))
+COPY_QUEUE_CHUNKS = int(os.environ.get('DB_SYNC_COPY_QUEUE_CHUNKS', 8))
+# 不能使用COPY时（SQLite等），每次从主数据库读取并批量插入的行数
+FALLBACK_FETCH_ROWS = int(os.environ.get('DB_SYNC_FETCH_ROWS', 5000))
+# 增量备份：保存各表水位线的备份库表；按变更时间同步时回看的秒数，覆盖提交晚于变更时间的事务
+WATERMARK_TABLE = 'sync_watermarks'
+WATERMARK_OVERLAP_SECONDS = int(os.environ.get('DB_SYNC_WATERMARK_OVERLAP', 300))
+# 增量备份不复制的表（同步自身的元数据）
+SYNC_EXCLUDED_TABLES = {'sync_tombstones', WATERMARK_TABLE, 'alembic_version'}
+# 数据量最大的表，全量备份时在就绪后优先开始
+LARGE_TABLES = ('system_logs', 'ai_chat_history', 'points_history')
+# 两边指纹一致、跳过复制的表的同步结果
+TABLE_UNCHANGED = 'unchanged'
+
+
+class CopyStream:
+    """连接 COPY ... TO STDOUT 和 COPY ... FROM STDIN 的有界管道
+
+    导出端（后台线程）把COPY数据攒成 chunk_size 字节的块放入队列，导入端按需读取；
+    队列最多缓存 max_chunks 块，导出快于导入时导出端阻塞，内存占用与表大小无关。
+    """
+
+    def __init__(self, chunk_size=None, max_chunks=None):
+        self.chunk_size = chunk_size or COPY_CHUNK_BYTES
+        self._queue = queue.Queue(maxsize=max_chunks or COPY_QUEUE_CHUNKS)
+        self._buffer = bytearray()
+        self._chunk = memoryview(b'')
+        self._offset = 0
+        self._eof = False
+        self._closed = threading.Event()
+        self.error = None
+        self.bytes_written = 0
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise IOError("COPY导入端已关闭")
+
+    def write(self, data):
+        """导出端：psycopg2 copy_expert 按行写入"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        self.bytes_written += len(data)
+        if len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def finish(self, error=None):
+        """导出端结束：正常结束时发送剩余数据，出错时通知导入端中止"""
+        self.error = error
+        try:
+            if error is None and self._buffer:
+                self._put(bytes(self._buffer))
+            self._buffer.clear()
+            self._put(None)
+        except IOError:
+            pass
+
+    def read(self, size=-1):
+        """导入端：psycopg2 copy_expert 按块读取，返回空字节串表示结束"""
+        while self._offset >= len(self._chunk):
+            if self._eof:
+                return b''
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                if self.error is not None:
+                    raise IOError(f"COPY导出失败: {self.error}")
+                return b''
+            self._chunk = memoryview(item)
+            self._offset = 0
+        end = len(self._chunk) if size is None or size < 0 else self._offset + size
+        data = bytes(self._chunk[self._offset:end])
+        self._offset += len(data)
+        return data
+
+    def close(self):
+        """导入端结束或失败时调用，使阻塞中的导出端退出"""
+        self._closed.set()
+
+
 class BackupStatus:
     """备份状态管理"""
     def __init__(self):
@@ -45,6 +136,7 @@ class BackupStatus:
             'end_time': None,
             'error': None,
             'details': [],
+            'tables': {},  # 表名 -> {'status': running/completed/failed/skipped, 'rows': 行数}
             'user_id': None
         }
         return task_id
@@ -62,6 +154,11 @@ class BackupStatus:
                     self.tasks[task_id]['progress'] = progress
                     logger.info(f"任务 {task_id} 进度更新: {completed}/{total} = {progress}%")
 
+    def update_table(self, task_id, table_name, **kwargs):
+        """更新单个表的同步状态"""
+        if task_id in self.tasks:
+            self.tasks[task_id]['tables'].setdefault(table_name, {}).update(kwargs)
+
     def complete_task(self, task_id, success=True, error=None):
         """完成任务"""
         if task_id in self.tasks:
@@ -229,6 +326,7 @@ class DatabaseSyncer:
             'completed_tables': task['completed_tables'],
             'total_tables': task['total_tables'],
             'total_rows': task['total_rows'],
+            'tables': task.get('tables', {}),
             'error': task['error'],
             'start_time': format_time_with_timezone(task['start_time']),
             'end_time': format_time_with_timezone(task['end_time'])
@@ -299,8 +397,38 @@ class DatabaseSyncer:
         """将主数据库备份到ClawCloud - 同步版本（保持向后兼容）"""
         return self._backup_with_progress(None)
 
+    def _connect_sync_engines(self, pool_size=None):
+        """创建主数据库和备份数据库的引擎并测试连接，失败时返回None
+
+        Args:
+            pool_size: 并发同步时每个引擎最多打开的连接数，None时使用默认连接池
+        """
+        try:
+            primary_connect_args = {'connect_timeout': 10} if 'postgresql' in self.dual_db.primary_db_url else {}
+            backup_connect_args = {'connect_timeout': 10} if 'postgresql' in self.dual_db.backup_db_url else {}
+            pool_args = {'pool_size': pool_size, 'max_overflow': 0} if pool_size else {}
+            primary_engine = create_engine(self.dual_db.primary_db_url, connect_args=primary_connect_args, **pool_args)
+            backup_engine = create_engine(self.dual_db.backup_db_url, connect_args=backup_connect_args, **pool_args)
+
+            # 测试连接
+            with primary_engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            with backup_engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+
+            self.log_sync_action("数据库连接", "成功", "主数据库和备份数据库连接正常")
+            return primary_engine, backup_engine
+
+        except Exception as e:
+            self.log_sync_action("数据库连接", "失败", f"连接错误: {str(e)}")
+            return None
+
     def _backup_with_progress(self, task_id):
-        """带进度反馈的备份实现"""
+        """带进度反馈的备份实现
+
+        按外键依赖调度（src/sync_planner.py）：被引用的表复制完成后才开始引用它的表，
+        互不依赖的表在 DB_SYNC_WORKERS 个连接上并发复制。
+        """
         import time
         start_time = time.time()
         max_duration = 150  # 最大150秒执行时间（2.5分钟，确保在前端3分钟超时前完成）
@@ -312,173 +440,630 @@ class DatabaseSyncer:
             return False
 
         try:
+            from src.sync_planner import TableSyncScheduler, sync_workers, table_dependencies
+
             if task_id:
                 backup_status.update_task(task_id, current_table="连接数据库")
             self.log_sync_action("开始备份", "进行中", "连接数据库")
 
-            # 测试数据库连接
+            # 测试数据库连接，连接池大小与并发数一致
+            workers = sync_workers(self.dual_db.primary_db_url, self.dual_db.backup_db_url)
+            engines = self._connect_sync_engines(pool_size=workers)
+            if engines is None:
+                return False
+            primary_engine, backup_engine = engines
+
+            # 要同步的表：所有模型表，大表优先开始以缩短总耗时
+            tables_to_sync = self._model_table_names()
+            dependencies = table_dependencies(tables_to_sync)
+            total_tables = len(tables_to_sync)
+            running = []
+            progress = {'completed': 0, 'synced': 0, 'unchanged': 0, 'rows': 0}
+
+            if task_id:
+                backup_status.update_task(task_id, total_tables=total_tables)
+            self.log_sync_action("同步计划", "开始", f"{total_tables} 个表，{workers} 个并发连接")
+
+            def sync_table(table_name):
+                with primary_engine.connect() as primary_conn, backup_engine.connect() as backup_conn:
+                    self._disable_fk_checks(backup_conn, self.dual_db.backup_db_url)
+
+                    # 检查表是否存在（兼容SQLite/PostgreSQL）
+                    if not self._table_exists(primary_conn, table_name):
+                        self.log_sync_action(f"跳过表 {table_name}", "跳过", "主数据库中不存在")
+                        return None
+                    if not self._table_exists(backup_conn, table_name):
+                        self.log_sync_action(f"跳过表 {table_name}", "跳过", "备份数据库中不存在")
+                        return None
+                    if self._table_unchanged(primary_conn, backup_conn, table_name):
+                        return TABLE_UNCHANGED
+
+                    # 清空后立即提交，避免级联清空时长时间锁住引用它的表
+                    self._clear_backup_table(backup_conn, table_name)
+                    backup_conn.commit()
+                    rows_copied = self._copy_table_rows(primary_conn, backup_conn, table_name)
+                    backup_conn.commit()
+                    return rows_copied
+
+            def on_start(table_name):
+                running.append(table_name)
+                self.log_sync_action(f"同步表 {table_name}", "开始")
+                if task_id:
+                    backup_status.update_table(task_id, table_name, status='running')
+                    backup_status.update_task(task_id, current_table=', '.join(running))
+
+            def on_finish(table_name, result):
+                running.remove(table_name)
+                progress['completed'] += 1
+                if isinstance(result, Exception):
+                    self.log_sync_action(f"同步表 {table_name}", "失败", str(result))
+                    table_state = {'status': 'failed', 'error': str(result)}
+                elif result is None:
+                    table_state = {'status': 'skipped'}
+                elif result == TABLE_UNCHANGED:
+                    progress['synced'] += 1
+                    progress['unchanged'] += 1
+                    table_state = {'status': TABLE_UNCHANGED}
+                else:
+                    progress['synced'] += 1
+                    progress['rows'] += result
+                    self.log_sync_action(f"同步表 {table_name}", "成功", f"{result} 行数据")
+                    table_state = {'status': 'completed', 'rows': result}
+                if task_id:
+                    backup_status.update_table(task_id, table_name, **table_state)
+                    backup_status.update_task(task_id, current_table=', '.join(running),
+                                              completed_tables=progress['completed'],
+                                              total_rows=progress['rows'])
+                    logger.info(f"更新备份进度: {table_name} ({progress['completed']}/{total_tables})")
+
             try:
-                from sqlalchemy import create_engine, text
-                primary_connect_args = {'connect_timeout': 10} if 'postgresql' in self.dual_db.primary_db_url else {}
-                backup_connect_args = {'connect_timeout': 10} if 'postgresql' in self.dual_db.backup_db_url else {}
-                primary_engine = create_engine(self.dual_db.primary_db_url, connect_args=primary_connect_args)
-                backup_engine = create_engine(self.dual_db.backup_db_url, connect_args=backup_connect_args)
+                scheduler = TableSyncScheduler(dependencies, max_workers=workers,
+                                               deadline=start_time + max_duration)
+                results = scheduler.run(sync_table, on_start=on_start, on_finish=on_finish)
+                if len(results) < total_tables:
+                    self.log_sync_action("同步超时", "警告",
+                                         f"已运行{max_duration}秒，{total_tables - len(results)} 个表未同步")
+            finally:
+                # 关闭连接，会话级的外键约束设置随连接一起失效
+                primary_engine.dispose()
+                backup_engine.dispose()
 
-                # 测试连接
-                with primary_engine.connect() as conn:
-                    conn.execute(text('SELECT 1'))
-                with backup_engine.connect() as conn:
-                    conn.execute(text('SELECT 1'))
+            synced_tables = progress['synced']
+            total_rows = progress['rows']
 
-                self.log_sync_action("数据库连接", "成功", "主数据库和备份数据库连接正常")
+            # 更新最终进度
+            if task_id:
+                backup_status.update_task(
+                    task_id,
+                    current_table='',
+                    completed_tables=total_tables,
+                    total_rows=total_rows
+                )
 
-            except Exception as e:
-                self.log_sync_action("数据库连接", "失败", f"连接错误: {str(e)}")
+            if synced_tables > 0:
+                self.log_sync_action("备份到ClawCloud", "成功",
+                                   f"同步了 {synced_tables} 个表（其中 {progress['unchanged']} 个未变化），"
+                                   f"共 {total_rows} 行数据，耗时 {time.time() - start_time:.1f} 秒")
+                return True
+            else:
+                self.log_sync_action("备份到ClawCloud", "失败",
+                                   "没有成功同步任何表，请检查数据库连接和权限")
                 return False
 
-            # 获取要同步的表（按优先级和大小排序）
-            # 优先同步小表，最后同步大表
-            tables_to_sync = [
-                # 第一阶段：基础小表（快速同步）
-                'roles', 'tags',
-                # 第二阶段：用户和活动表（中等大小）
-                'users', 'activities',
-                # 第三阶段：关联表（通常较小）
-                'activity_tags', 'user_tags',
-                # 第四阶段：会话表（中等大小）
-                'ai_chat_session', 'ai_chat_message',
-                # 第五阶段：其他依赖表（较小）
-                'activity_registrations', 'checkin_records', 'messages', 'notifications',
-                # 最后阶段：大表（可能很慢）
-                'system_logs'  # 通常是最大的表，放在最后
-            ]
+        except Exception as e:
+            self.log_sync_action("备份到ClawCloud", "失败", str(e))
+            logger.error(f"备份失败: {e}")
+            return False
 
-            synced_tables = 0
-            total_rows = 0
+    @staticmethod
+    def _model_table_names():
+        """所有模型表（不含同步元数据表），按外键顺序排列，大表排在同一批就绪表的前面"""
+        from src import db
+        import src.models  # noqa: F401  确保所有模型已注册到元数据
 
-            if task_id:
-                backup_status.update_task(task_id, total_tables=len(tables_to_sync))
+        names = [table.name for table in db.metadata.sorted_tables if table.name not in SYNC_EXCLUDED_TABLES]
+        large = [name for name in LARGE_TABLES if name in names]
+        return large + [name for name in names if name not in large]
 
-            with primary_engine.connect() as primary_conn, backup_engine.connect() as backup_conn:
-                # 禁用外键约束检查（PostgreSQL）
-                try:
-                    if 'postgresql' in self.dual_db.backup_db_url:
-                        backup_conn.execute(text('SET session_replication_role = replica'))
-                        self.log_sync_action("禁用外键约束", "成功", "临时禁用外键约束检查")
-                except Exception as e:
-                    self.log_sync_action("禁用外键约束", "警告", f"无法禁用外键约束: {str(e)}")
+    def _table_unchanged(self, source_conn, target_conn, table_name):
+        """两边的表指纹（src/table_checksum.py）一致时返回True，调用方跳过复制
 
+        计算失败时返回False，照常复制。
+        """
+        if not SKIP_UNCHANGED_TABLES:
+            return False
+        try:
+            result = compare_table(source_conn, target_conn, table_name)
+        except Exception as e:
+            self.log_sync_action(f"比较表指纹 {table_name}", "警告", f"无法计算指纹，照常复制: {str(e)}")
+            for conn in (source_conn, target_conn):
                 try:
-                    total_tables = len(tables_to_sync)
-                    for index, table_name in enumerate(tables_to_sync, 1):
-                        # 更新进度
-                        if task_id:
-                            backup_status.update_task(
-                                task_id,
-                                current_table=table_name,
-                                completed_tables=index-1
-                            )
-                            logger.info(f"更新备份进度: {table_name} ({index-1}/{total_tables})")
+                    conn.rollback()
+                except Exception:
+                    pass
+            return False
+        if result['in_sync']:
+            self.log_sync_action(f"跳过表 {table_name}", "未变化", f"{result['source']['rows']} 行，两边指纹一致")
+        return result['in_sync']
 
-                        # 检查超时
-                        if time.time() - start_time > max_duration:
-                            self.log_sync_action("同步超时", "警告", f"已运行{max_duration}秒，停止同步")
-                            break
-                        try:
-                            self.log_sync_action(f"同步表 {table_name} ({index}/{total_tables})", "开始")
+    def compare_table_fingerprints(self):
+        """逐表比较主数据库和备份数据库的指纹，供数据库状态页显示各表差异
 
-                            # 检查表是否存在（兼容SQLite/PostgreSQL）
-                            primary_exists = self._table_exists(primary_conn, table_name)
-                            backup_exists = self._table_exists(backup_conn, table_name)
+        Returns:
+            list: [{'table', 'status', 'primary_rows', 'backup_rows', 'basis'}]，status 为
+                  in_sync/drift/missing_primary/missing_backup/error；双数据库未配置或连接失败时返回None
+        """
+        if not self.dual_db.is_dual_db_enabled():
+            return None
+        engines = self._connect_sync_engines()
+        if engines is None:
+            return None
+        primary_engine, backup_engine = engines
 
-                            if not primary_exists:
-                                self.log_sync_action(f"跳过表 {table_name}", "跳过", "主数据库中不存在")
-                                continue
+        tables = []
+        try:
+            with primary_engine.connect() as primary_conn, backup_engine.connect() as backup_conn:
+                for table_name in self._model_table_names():
+                    entry = {'table': table_name, 'primary_rows': None, 'backup_rows': None, 'basis': None}
+                    tables.append(entry)
+                    if not self._table_exists(primary_conn, table_name):
+                        entry['status'] = 'missing_primary'
+                        continue
+                    if not self._table_exists(backup_conn, table_name):
+                        entry['status'] = 'missing_backup'
+                        continue
+                    try:
+                        result = compare_table(primary_conn, backup_conn, table_name)
+                    except Exception as e:
+                        entry.update(status='error', error=str(e))
+                        primary_conn.rollback()
+                        backup_conn.rollback()
+                        continue
+                    entry.update(status='in_sync' if result['in_sync'] else 'drift',
+                                 primary_rows=result['source']['rows'],
+                                 backup_rows=result['target']['rows'],
+                                 basis=result['source']['basis'])
+        finally:
+            primary_engine.dispose()
+            backup_engine.dispose()
+        return tables
+
+    def _disable_fk_checks(self, conn, db_url):
+        """PostgreSQL连接临时禁用外键约束检查（会话级，连接关闭后失效）"""
+        if 'postgresql' not in (db_url or ''):
+            return False
+        try:
+            conn.execute(text('SET session_replication_role = replica'))
+            # 先提交，单表失败回滚时不会撤销该会话设置
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            self.log_sync_action("禁用外键约束", "警告", f"无法禁用外键约束: {str(e)}")
+            return False
 
-                            if not backup_exists:
-                                self.log_sync_action(f"跳过表 {table_name}", "跳过", "备份数据库中不存在")
-                                continue
+    def _clear_backup_table(self, backup_conn, table_name, cascade=True):
+        """清空备份表（根据方言选择策略）
 
-                            # 清空备份表（根据方言选择策略）
-                            try:
-                                dialect_name = getattr(backup_conn, 'dialect', None).name if hasattr(backup_conn, 'dialect') else ''
-                            except Exception:
-                                dialect_name = ''
+        cascade=False 时只用DELETE清空本表，不级联清空引用它的表（增量备份时使用）。
+        """
+        try:
+            dialect_name = getattr(backup_conn, 'dialect', None).name if hasattr(backup_conn, 'dialect') else ''
+        except Exception:
+            dialect_name = ''
 
-                            if dialect_name == 'sqlite':
-                                # SQLite 不支持 TRUNCATE，直接使用 DELETE
-                                backup_conn.execute(text(f'DELETE FROM "{table_name}"'))
-                            else:
-                                # 非SQLite优先尝试TRUNCATE，失败回退DELETE
-                                try:
-                                    backup_conn.execute(text(f'TRUNCATE TABLE "{table_name}" CASCADE'))
-                                except Exception as truncate_error:
-                                    self.log_sync_action(f"TRUNCATE {table_name} 失败，尝试DELETE", "警告", str(truncate_error))
-                                    backup_conn.execute(text(f'DELETE FROM "{table_name}"'))
+        if dialect_name == 'sqlite' or not cascade:
+            # SQLite 不支持 TRUNCATE，直接使用 DELETE
+            backup_conn.execute(text(f'DELETE FROM "{table_name}"'))
+        else:
+            # 非SQLite优先尝试TRUNCATE，失败回退DELETE
+            try:
+                backup_conn.execute(text(f'TRUNCATE TABLE "{table_name}" CASCADE'))
+            except Exception as truncate_error:
+                self.log_sync_action(f"TRUNCATE {table_name} 失败，尝试DELETE", "警告", str(truncate_error))
+                backup_conn.rollback()
+                backup_conn.execute(text(f'DELETE FROM "{table_name}"'))
 
-                            # 获取主表数据
-                            result = primary_conn.execute(text(f'SELECT * FROM "{table_name}"'))
-                            rows = result.fetchall()
+    def _copy_table_rows(self, primary_conn, backup_conn, table_name, cascade=True):
+        """把主表的全部数据写入已清空的备份表，返回行数
 
-                            if rows:
-                                # 获取列名
-                                columns = result.keys()
-                                column_names = ', '.join([f'"{col}"' for col in columns])
+        PostgreSQL之间用COPY流式传输，COPY失败或其他数据库分批读取后批量插入。
+        """
+        if self._supports_copy(primary_conn) and self._supports_copy(backup_conn):
+            try:
+                return self._copy_table_stream(primary_conn, backup_conn, table_name)
+            except Exception as copy_error:
+                self.log_sync_action(f"COPY {table_name} 失败，改用批量插入", "警告", str(copy_error))
+                primary_conn.rollback()
+                backup_conn.rollback()
+                self._clear_backup_table(backup_conn, table_name, cascade=cascade)
+        return self._stream_insert_table(primary_conn, backup_conn, table_name)
 
-                                # 使用更高效的批量插入 - 简化版本
-                                # 直接使用批量插入，避免COPY的复杂性
-                                self._batch_insert_fallback(backup_conn, table_name, columns, column_names, rows)
+    @staticmethod
+    def _supports_copy(conn):
+        """是否为psycopg2驱动的PostgreSQL连接（支持 COPY ... STDIN/STDOUT）"""
+        dialect = getattr(conn, 'dialect', None)
+        return getattr(dialect, 'name', '') == 'postgresql' and getattr(dialect, 'driver', '') == 'psycopg2'
 
-                            synced_tables += 1
-                            total_rows += len(rows)
-                            self.log_sync_action(f"同步表 {table_name}", "成功", f"{len(rows)} 行数据")
+    def _copy_table_stream(self, primary_conn, backup_conn, table_name):
+        """用 COPY TO STDOUT / COPY FROM STDIN 把主表数据流式写入备份表
 
-                        except Exception as e:
-                            self.log_sync_action(f"同步表 {table_name}", "失败", str(e))
-                            # 记录错误但继续处理其他表
-                            continue
+        导出在后台线程中进行，经 CopyStream 按块交给导入端，不在内存中保存整张表。
+        与其他写入在同一事务中，由调用方提交。
+
+        Returns:
+            int: 复制的行数
+        """
+        columns = list(primary_conn.execute(text(f'SELECT * FROM "{table_name}" LIMIT 0')).keys())
+        column_list = ', '.join(f'"{col}"' for col in columns)
+        source = primary_conn.connection.dbapi_connection
+        target = backup_conn.connection.dbapi_connection
+        stream = CopyStream()
+
+        def export():
+            error = None
+            try:
+                with source.cursor() as cursor:
+                    cursor.copy_expert(f'COPY "{table_name}" ({column_list}) TO STDOUT', stream)
+            except Exception as e:
+                error = e
+            finally:
+                stream.finish(error)
 
-                    # 重新启用外键约束检查
+        exporter = threading.Thread(target=export, name=f'copy-export-{table_name}', daemon=True)
+        exporter.start()
+        try:
+            with target.cursor() as cursor:
+                cursor.copy_expert(f'COPY "{table_name}" ({column_list}) FROM STDIN', stream, size=stream.chunk_size)
+                rows = cursor.rowcount
+        finally:
+            stream.close()
+            exporter.join()
+        if stream.error is not None:
+            raise stream.error
+        logger.info(f"COPY {table_name}: {rows} 行, {stream.bytes_written / 1024 / 1024:.1f} MB")
+        return rows
+
+    def _stream_insert_table(self, primary_conn, backup_conn, table_name):
+        """分批读取主表数据并批量插入备份表（不支持COPY时的通用方案）
+
+        Returns:
+            int: 插入的行数
+        """
+        result = primary_conn.execute(
+            text(f'SELECT * FROM "{table_name}"').execution_options(stream_results=True,
+                                                                     max_row_buffer=FALLBACK_FETCH_ROWS)
+        )
+        columns = list(result.keys())
+        column_names = ', '.join([f'"{col}"' for col in columns])
+        total = 0
+        try:
+            while True:
+                rows = result.fetchmany(FALLBACK_FETCH_ROWS)
+                if not rows:
+                    break
+                self._batch_insert_fallback(backup_conn, table_name, columns, column_names, rows)
+                total += len(rows)
+        finally:
+            result.close()
+        return total
+
+    def incremental_backup_to_clawcloud(self, task_id=None):
+        """增量备份：只复制上次成功同步以来变更的行
+
+        - INCREMENTAL_SYNC_TABLES 中有变更时间列的表复制变更时间不早于水位线（减去回看时间）的行，
+          只追加的表复制id大于水位线的行，都按主键upsert；
+        - 按 sync_tombstones 中的墓碑删除备份库中已删除的行；
+        - 校验：比较两边行数，不一致时按主键比对补齐缺失的行、删除多余的行（批量删除、级联删除等没有墓碑的情况）；
+        - 校验通过后把水位线写入备份库的 sync_watermarks 表，没有水位线的表先整表复制一次；
+        - 其他表没有可靠的变更时间，整表重新复制（只DELETE本表，不级联清空增量表）。
+
+        Returns:
+            bool: 所有表是否同步成功
+        """
+        start_time = time.time()
+        max_duration = 150
+
+        if not self.dual_db.is_dual_db_enabled():
+            if task_id:
+                backup_status.update_task(task_id, error="双数据库未配置")
+            self.log_sync_action("增量备份到ClawCloud", "失败", "双数据库未配置")
+            return False
+
+        try:
+            from src.models import INCREMENTAL_SYNC_TABLES
+
+            engines = self._connect_sync_engines()
+            if engines is None:
+                return False
+            primary_engine, backup_engine = engines
+
+            synced_tables = 0
+            failed_tables = []
+            total_rows = 0
+
+            with primary_engine.connect() as primary_conn, backup_engine.connect() as backup_conn:
+                self._disable_fk_checks(backup_conn, self.dual_db.backup_db_url)
+                self._ensure_watermark_table(backup_conn)
+                watermarks = self._load_watermarks(backup_conn)
+                tables = self._sync_table_order(primary_conn, backup_conn)
+                has_tombstones = self._table_exists(primary_conn, 'sync_tombstones')
+                if task_id:
+                    backup_status.update_task(task_id, total_tables=len(tables))
+
+                for index, table in enumerate(tables, 1):
+                    if task_id:
+                        backup_status.update_task(task_id, current_table=table.name, completed_tables=index - 1)
+                    if time.time() - start_time > max_duration:
+                        # 未同步的表保留原水位线，下次继续
+                        self.log_sync_action("同步超时", "警告", f"已运行{max_duration}秒，剩余的表下次同步")
+                        failed_tables.extend(t.name for t in tables[index - 1:])
+                        break
                     try:
-                        if 'postgresql' in self.dual_db.backup_db_url:
-                            backup_conn.execute(text('SET session_replication_role = DEFAULT'))
-                            self.log_sync_action("恢复外键约束", "成功", "重新启用外键约束检查")
+                        pk_columns = [col.name for col in table.primary_key.columns]
+                        if table.name in INCREMENTAL_SYNC_TABLES and len(pk_columns) == 1:
+                            rows, watermark = self._sync_table_incremental(
+                                primary_conn, backup_conn, table, INCREMENTAL_SYNC_TABLES[table.name],
+                                watermarks.get(table.name), has_tombstones
+                            )
+                            self._save_watermark(backup_conn, table.name, watermark)
+                            watermarks[table.name] = watermark
+                            detail = f"增量 {rows} 行"
+                        elif self._table_unchanged(primary_conn, backup_conn, table.name):
+                            rows = 0
+                            detail = "未变化"
+                        else:
+                            self._clear_backup_table(backup_conn, table.name, cascade=False)
+                            rows = self._copy_table_rows(primary_conn, backup_conn, table.name, cascade=False)
+                            detail = f"整表 {rows} 行"
+                        backup_conn.commit()
+                        primary_conn.commit()
+                        synced_tables += 1
+                        total_rows += rows
+                        self.log_sync_action(f"同步表 {table.name}", "成功", detail)
                     except Exception as e:
-                        self.log_sync_action("恢复外键约束", "警告", f"无法恢复外键约束: {str(e)}")
+                        failed_tables.append(table.name)
+                        self.log_sync_action(f"同步表 {table.name}", "失败", str(e))
+                        try:
+                            primary_conn.rollback()
+                            backup_conn.rollback()
+                        except Exception:
+                            pass
 
-                except Exception as e:
-                    # 确保恢复外键约束
-                    try:
-                        if 'postgresql' in self.dual_db.backup_db_url:
-                            backup_conn.execute(text('SET session_replication_role = DEFAULT'))
-                    except:
-                        pass
+                if has_tombstones:
+                    self._prune_tombstones(primary_conn, watermarks, INCREMENTAL_SYNC_TABLES)
 
-                    self.log_sync_action("数据库同步", "失败", f"同步过程失败: {str(e)}")
-                    synced_tables = 0  # 确保返回失败状态
+                if 'postgresql' in self.dual_db.backup_db_url:
+                    try:
+                        backup_conn.execute(text('SET session_replication_role = DEFAULT'))
+                        backup_conn.commit()
+                    except Exception as e:
+                        self.log_sync_action("恢复外键约束", "警告", f"无法恢复外键约束: {str(e)}")
 
-            # 更新最终进度
             if task_id:
-                backup_status.update_task(
-                    task_id,
-                    completed_tables=len(tables_to_sync),
-                    total_rows=total_rows
-                )
+                backup_status.update_task(task_id, completed_tables=len(tables), total_rows=total_rows)
 
-            if synced_tables > 0:
-                self.log_sync_action("备份到ClawCloud", "成功",
-                                   f"同步了 {synced_tables} 个表，共 {total_rows} 行数据")
-                return True
-            else:
-                self.log_sync_action("备份到ClawCloud", "失败",
-                                   "没有成功同步任何表，请检查数据库连接和权限")
+            if failed_tables:
+                self.log_sync_action("增量备份到ClawCloud", "失败",
+                                     f"同步了 {synced_tables} 个表，失败或未完成: {', '.join(failed_tables)}")
                 return False
+            self.log_sync_action("增量备份到ClawCloud", "成功",
+                                 f"同步了 {synced_tables} 个表，共 {total_rows} 行数据，耗时 {time.time() - start_time:.1f} 秒")
+            return True
 
         except Exception as e:
-            self.log_sync_action("备份到ClawCloud", "失败", str(e))
-            logger.error(f"备份失败: {e}")
+            self.log_sync_action("增量备份到ClawCloud", "失败", str(e))
+            logger.error(f"增量备份失败: {e}")
             return False
-    
+
+    def _sync_table_order(self, primary_conn, backup_conn):
+        """两边都存在的表，按外键依赖排序（被引用的表在前）"""
+        metadata = MetaData()
+        metadata.reflect(bind=primary_conn)
+        backup_tables = set(inspect(backup_conn).get_table_names())
+        return [table for table in metadata.sorted_tables
+                if table.name in backup_tables and table.name not in SYNC_EXCLUDED_TABLES]
+
+    def _ensure_watermark_table(self, backup_conn):
+        backup_conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{WATERMARK_TABLE}" ('
+            'table_name VARCHAR(64) PRIMARY KEY, '
+            'last_id BIGINT, '
+            'last_changed_at VARCHAR(40), '
+            'tombstone_id BIGINT, '
+            'synced_at VARCHAR(40))'
+        ))
+        backup_conn.commit()
+
+    def _load_watermarks(self, backup_conn):
+        """读取备份库中保存的水位线：{表名: {last_id, last_changed_at, tombstone_id}}"""
+        rows = backup_conn.execute(text(
+            f'SELECT table_name, last_id, last_changed_at, tombstone_id FROM "{WATERMARK_TABLE}"'
+        )).mappings().all()
+        return {row['table_name']: {'last_id': row['last_id'],
+                                    'last_changed_at': row['last_changed_at'],
+                                    'tombstone_id': row['tombstone_id'] or 0} for row in rows}
+
+    def _save_watermark(self, backup_conn, table_name, watermark):
+        backup_conn.execute(text(
+            f'INSERT INTO "{WATERMARK_TABLE}" (table_name, last_id, last_changed_at, tombstone_id, synced_at) '
+            'VALUES (:table_name, :last_id, :last_changed_at, :tombstone_id, :synced_at) '
+            'ON CONFLICT (table_name) DO UPDATE SET last_id = excluded.last_id, '
+            'last_changed_at = excluded.last_changed_at, tombstone_id = excluded.tombstone_id, '
+            'synced_at = excluded.synced_at'
+        ), dict(watermark, table_name=table_name, synced_at=get_beijing_time().isoformat()))
+
+    @staticmethod
+    def _watermark_value(value):
+        """变更时间列的值转换为可保存的字符串（SQLite原生查询返回字符串，PostgreSQL返回datetime）"""
+        if value is None:
+            return None
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else str(value)
+
+    @staticmethod
+    def _pk_value(table, pk_column, value):
+        """墓碑中保存的字符串主键转换为主键列的类型"""
+        try:
+            if table.c[pk_column].type.python_type is int:
+                return int(value)
+        except (NotImplementedError, ValueError):
+            pass
+        return value
+
+    def _sync_table_incremental(self, primary_conn, backup_conn, table, change_column, watermark, has_tombstones):
+        """按水位线同步单表，返回 (复制和修正的行数, 新水位线)"""
+        table_name = table.name
+        pk = table.primary_key.columns.values()[0].name
+        id_watermark = change_column is None
+
+        # 先记录本次的上界，之后发生的变更留给下次同步
+        bounds = primary_conn.execute(text(
+            f'SELECT MAX("{pk}") AS max_id' + (f', MAX("{change_column}") AS max_changed' if change_column else '')
+            + f' FROM "{table_name}"'
+        )).mappings().one()
+        tombstone_id = 0
+        if has_tombstones:
+            tombstone_id = primary_conn.execute(text(
+                'SELECT MAX(id) FROM sync_tombstones WHERE table_name = :table_name'
+            ), {'table_name': table_name}).scalar() or 0
+        new_watermark = {
+            'last_id': bounds['max_id'] if id_watermark else None,
+            'last_changed_at': self._watermark_value(bounds['max_changed']) if change_column else None,
+            'tombstone_id': tombstone_id,
+        }
+
+        if watermark is None:
+            # 首次增量同步：整表复制后建立水位线（两边已一致时直接建立）
+            if self._table_unchanged(primary_conn, backup_conn, table_name):
+                return 0, new_watermark
+            self._clear_backup_table(backup_conn, table_name, cascade=False)
+            rows = self._copy_table_rows(primary_conn, backup_conn, table_name, cascade=False)
+            return rows, new_watermark
+
+        # 新增和修改的行
+        if id_watermark:
+            where, params = f'"{pk}" > :last_id', {'last_id': watermark['last_id'] or 0}
+        elif watermark['last_changed_at']:
+            since = datetime.fromisoformat(watermark['last_changed_at']) - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)
+            where, params = f'"{change_column}" >= :since', {'since': since}
+        else:
+            where, params = '1 = 1', {}
+        rows = self._upsert_query_rows(primary_conn, backup_conn, table_name, [pk],
+                                       f'SELECT * FROM "{table_name}" WHERE {where}', params)
+
+        # 删除的行
+        if has_tombstones and tombstone_id > watermark['tombstone_id']:
+            deleted_ids = primary_conn.execute(text(
+                'SELECT row_id FROM sync_tombstones WHERE table_name = :table_name AND id > :after AND id <= :until'
+            ), {'table_name': table_name, 'after': watermark['tombstone_id'], 'until': tombstone_id}).scalars().all()
+            rows += self._delete_backup_rows(backup_conn, table_name, pk,
+                                             [self._pk_value(table, pk, value) for value in deleted_ids])
+
+        rows += self._verify_table_rows(primary_conn, backup_conn, table_name, pk)
+        if id_watermark and new_watermark['last_id'] is None:
+            new_watermark['last_id'] = watermark['last_id']
+        if change_column and new_watermark['last_changed_at'] is None:
+            new_watermark['last_changed_at'] = watermark['last_changed_at']
+        return rows, new_watermark
+
+    def _upsert_query_rows(self, primary_conn, backup_conn, table_name, pk_columns, query, params=None):
+        """分批读取主库查询结果并按主键upsert到备份表，返回行数"""
+        stmt = text(query) if isinstance(query, str) else query
+        result = primary_conn.execute(
+            stmt.execution_options(stream_results=True, max_row_buffer=FALLBACK_FETCH_ROWS), params or {}
+        )
+        columns = list(result.keys())
+        total = 0
+        try:
+            while True:
+                rows = result.fetchmany(FALLBACK_FETCH_ROWS)
+                if not rows:
+                    break
+                self._upsert_rows(backup_conn, table_name, columns, pk_columns, rows)
+                total += len(rows)
+        finally:
+            result.close()
+        return total
+
+    def _upsert_rows(self, conn, table_name, columns, pk_columns, rows):
+        """按主键插入或更新"""
+        BatchUpsert(conn, table_name, columns, on_conflict='update', conflict_columns=pk_columns).write(rows)
+
+    def _delete_backup_rows(self, backup_conn, table_name, pk, ids):
+        """按主键删除备份表中的行，返回删除的行数"""
+        deleted = 0
+        stmt = text(f'DELETE FROM "{table_name}" WHERE "{pk}" IN :ids').bindparams(bindparam('ids', expanding=True))
+        for i in range(0, len(ids), FALLBACK_FETCH_ROWS):
+            deleted += backup_conn.execute(stmt, {'ids': ids[i:i + FALLBACK_FETCH_ROWS]}).rowcount or 0
+        return deleted
+
+    def _verify_table_rows(self, primary_conn, backup_conn, table_name, pk):
+        """校验两边行数，不一致时按主键比对修正，返回修正的行数
+
+        按主键分块（键集分页）比对：每块先比较两边的行数，只有不一致的块才读取备份库的主键，
+        内存中最多保存一块主键。
+        """
+        count_sql = text(f'SELECT COUNT(*) FROM "{table_name}"')
+        primary_count = primary_conn.execute(count_sql).scalar()
+        backup_count = backup_conn.execute(count_sql).scalar()
+        if primary_count == backup_count:
+            return 0
+
+        select_missing = text(f'SELECT * FROM "{table_name}" WHERE "{pk}" IN :ids').bindparams(
+            bindparam('ids', expanding=True))
+        fixed = missing_total = extra_total = 0
+        after = None
+        while True:
+            where = f' WHERE "{pk}" > :after' if after is not None else ''
+            params = {'after': after} if after is not None else {}
+            primary_ids = primary_conn.execute(text(
+                f'SELECT "{pk}" FROM "{table_name}"{where} ORDER BY "{pk}" LIMIT :limit'
+            ), dict(params, limit=FALLBACK_FETCH_ROWS)).scalars().all()
+            last_chunk = len(primary_ids) < FALLBACK_FETCH_ROWS
+            # 最后一块不设上界，覆盖备份库中主键比主库最大主键还大的行
+            if not last_chunk:
+                where = f'{where} AND "{pk}" <= :until' if where else f' WHERE "{pk}" <= :until'
+                params['until'] = primary_ids[-1]
+
+            chunk_count = backup_conn.execute(text(f'SELECT COUNT(*) FROM "{table_name}"{where}'), params).scalar()
+            if chunk_count != len(primary_ids):
+                backup_ids = set(backup_conn.execute(text(f'SELECT "{pk}" FROM "{table_name}"{where}'), params).scalars())
+                extra = list(backup_ids - set(primary_ids))
+                missing = [value for value in primary_ids if value not in backup_ids]
+                fixed += self._delete_backup_rows(backup_conn, table_name, pk, extra)
+                if missing:
+                    fixed += self._upsert_query_rows(primary_conn, backup_conn, table_name, [pk], select_missing,
+                                                     {'ids': missing})
+                missing_total += len(missing)
+                extra_total += len(extra)
+
+            if last_chunk:
+                break
+            after = primary_ids[-1]
+
+        self.log_sync_action(f"校验 {table_name}", "警告",
+                             f"行数不一致（主库 {primary_count}，备份 {backup_count}），"
+                             f"补齐 {missing_total} 行，删除 {extra_total} 行")
+        return fixed
+
+    def _prune_tombstones(self, primary_conn, watermarks, incremental_tables):
+        """删除已同步到备份库的墓碑"""
+        try:
+            pruned = 0
+            for table_name in incremental_tables:
+                if table_name not in watermarks:
+                    continue
+                pruned += primary_conn.execute(
+                    text('DELETE FROM sync_tombstones WHERE table_name = :table_name AND id <= :until'),
+                    {'table_name': table_name, 'until': watermarks[table_name]['tombstone_id']}
+                ).rowcount or 0
+            primary_conn.commit()
+            if pruned:
+                logger.info(f"已清理 {pruned} 条已同步的墓碑记录")
+        except Exception as e:
+            primary_conn.rollback()
+            logger.warning(f"清理墓碑记录失败: {e}")
+
     def restore_from_clawcloud(self):
         """从ClawCloud恢复到主数据库 - 紧急禁用版本"""
         self.log_sync_action("从ClawCloud恢复", "失败", "恢复功能已紧急禁用，防止数据丢失")
@@ -666,7 +1251,7 @@ class DatabaseSyncer:
             with backup_engine.connect() as backup_conn, primary_engine.connect() as primary_conn:
                 if force_full_restore:
                     self.log_sync_action("恢复策略", "强制完整", "执行强制完整恢复，适用于Render数据库重置")
-                    success, rows = self._perform_full_migration(backup_conn, primary_conn, start_time, max_duration)
+                    success, rows = self._perform_full_migration(backup_engine, primary_engine, start_time, max_duration)
                     restored_tables = success
                     total_rows = rows
                 else:
@@ -675,7 +1260,9 @@ class DatabaseSyncer:
 
                     if is_new_deployment:
                         self.log_sync_action("数据库检测", "新部署", "检测到新部署数据库，使用完整迁移策略")
-                        success, rows = self._perform_full_migration(backup_conn, primary_conn, start_time, max_duration)
+                        # 结束检测用的事务，迁移在各自的连接上进行
+                        primary_conn.rollback()
+                        success, rows = self._perform_full_migration(backup_engine, primary_engine, start_time, max_duration)
                         restored_tables = success
                         total_rows = rows
                     else:
@@ -685,6 +1272,33 @@ class DatabaseSyncer:
                         total_rows = rows
 
             if restored_tables > 0:
+                # 报名记录绕过ORM写入，恢复后重新计算活动报名计数器
+                try:
+                    from src.models import registration_recount_statement
+                    with primary_engine.begin() as conn:
+                        conn.execute(registration_recount_statement())
+                    self.log_sync_action("报名计数器", "成功", "已根据报名表重新计算")
+                except Exception as e:
+                    logger.warning(f"重新计算报名计数器失败: {e}")
+
+                # 同理根据源表重建每日统计汇总
+                try:
+                    from src.utils.daily_stats import backfill_daily_stats
+                    with primary_engine.begin() as conn:
+                        days = backfill_daily_stats(connection=conn)
+                    self.log_sync_action("每日统计汇总", "成功", f"已重建 {days} 天")
+                except Exception as e:
+                    logger.warning(f"重建每日统计汇总失败: {e}")
+
+                # 未读计数器同样根据恢复后的通知和消息重建
+                try:
+                    from src.utils.unread_counters import reconcile_unread_counters
+                    with primary_engine.begin() as conn:
+                        users = reconcile_unread_counters(connection=conn)
+                    self.log_sync_action("未读计数器", "成功", f"已重建 {users} 个用户")
+                except Exception as e:
+                    logger.warning(f"重建未读计数器失败: {e}")
+
                 recovery_type = "强制完整恢复" if force_full_restore else "智能恢复"
                 self.log_sync_action(recovery_type, "成功",
                                    f"恢复了 {restored_tables} 个表，共 {total_rows} 行数据")
@@ -710,33 +1324,25 @@ class DatabaseSyncer:
             self.log_sync_action(f"安全恢复 {table_name}", "开始")
 
             # 检查表是否存在
-            if not backup_conn.execute(check_sql).scalar() or not primary_conn.execute(check_sql).scalar():
+            if not self._table_exists(backup_conn, table_name) or not self._table_exists(primary_conn, table_name):
                 self.log_sync_action(f"跳过 {table_name}", "跳过", "表不存在")
                 return False, 0
+            if self._table_unchanged(backup_conn, primary_conn, table_name):
+                return True, 0
 
             # 获取备份数据
             backup_result = backup_conn.execute(text(f'SELECT * FROM "{table_name}"'))
+            columns = list(backup_result.keys())
             backup_rows = backup_result.fetchall()
 
             if not backup_rows:
                 self.log_sync_action(f"跳过 {table_name}", "跳过", "备份数据为空")
                 return False, 0
 
-            # 使用UPSERT策略
-            for row in backup_rows:
-                if table_name == 'tags':
-                    upsert_sql = text('''
-                        INSERT INTO "tags" (id, name, color)
-                        VALUES (:id, :name, :color)
-                        ON CONFLICT (id) DO UPDATE SET
-                            name = EXCLUDED.name,
-                            color = EXCLUDED.color
-                    ''')
-                    primary_conn.execute(upsert_sql, {
-                        'id': row[0],
-                        'name': row[1],
-                        'color': row[2] if len(row) > 2 else None
-                    })
+            # 使用UPSERT策略：按id更新已有的行（标签只更新名称和颜色）
+            update_columns = ['name', 'color'] if table_name == 'tags' else None
+            BatchUpsert(primary_conn, table_name, columns, on_conflict='update',
+                        update_columns=update_columns).write(backup_rows)
 
             primary_conn.commit()
             self.log_sync_action(f"安全恢复 {table_name}", "成功", f"更新了 {len(backup_rows)} 行数据")
@@ -756,31 +1362,20 @@ class DatabaseSyncer:
             self.log_sync_action(f"智能恢复 {table_name}", "开始")
 
             # 检查表是否存在
-            if not backup_conn.execute(check_sql).scalar() or not primary_conn.execute(check_sql).scalar():
+            if not self._table_exists(backup_conn, table_name) or not self._table_exists(primary_conn, table_name):
                 self.log_sync_action(f"跳过 {table_name}", "跳过", "表不存在")
                 return False, 0
 
             if table_name == 'roles':
+                role_columns = ['id', 'name', 'description']
+                backup_roles = backup_conn.execute(text('SELECT id, name, description FROM "roles"')).fetchall()
+
                 # 检查是否有用户引用
                 user_count = primary_conn.execute(text('SELECT COUNT(*) FROM users')).scalar()
 
                 if user_count > 0:
                     # 有用户存在，使用UPSERT更新角色
-                    backup_roles = backup_conn.execute(text('SELECT * FROM "roles"')).fetchall()
-
-                    for role_row in backup_roles:
-                        upsert_sql = text('''
-                            INSERT INTO "roles" (id, name, description)
-                            VALUES (:id, :name, :description)
-                            ON CONFLICT (id) DO UPDATE SET
-                                name = EXCLUDED.name,
-                                description = EXCLUDED.description
-                        ''')
-                        primary_conn.execute(upsert_sql, {
-                            'id': role_row[0],
-                            'name': role_row[1],
-                            'description': role_row[2] if len(role_row) > 2 else None
-                        })
+                    BatchUpsert(primary_conn, 'roles', role_columns, on_conflict='update').write(backup_roles)
 
                     primary_conn.commit()
                     self.log_sync_action(f"智能恢复 {table_name}", "成功", f"更新了 {len(backup_roles)} 行角色数据")
@@ -788,15 +1383,7 @@ class DatabaseSyncer:
                 else:
                     # 没有用户，可以安全重建
                     primary_conn.execute(text(f'DELETE FROM "{table_name}"'))
-
-                    backup_roles = backup_conn.execute(text('SELECT * FROM "roles"')).fetchall()
-                    for role_row in backup_roles:
-                        insert_sql = text('INSERT INTO "roles" (id, name, description) VALUES (:id, :name, :description)')
-                        primary_conn.execute(insert_sql, {
-                            'id': role_row[0],
-                            'name': role_row[1],
-                            'description': role_row[2] if len(role_row) > 2 else None
-                        })
+                    BatchUpsert(primary_conn, 'roles', role_columns).write(backup_roles)
 
                     primary_conn.commit()
                     self.log_sync_action(f"智能恢复 {table_name}", "成功", f"重建了 {len(backup_roles)} 行角色数据")
@@ -816,35 +1403,18 @@ class DatabaseSyncer:
             self.log_sync_action(f"增量恢复 {table_name}", "开始")
 
             # 检查表是否存在
-            if not backup_conn.execute(check_sql).scalar() or not primary_conn.execute(check_sql).scalar():
+            if not self._table_exists(backup_conn, table_name) or not self._table_exists(primary_conn, table_name):
                 self.log_sync_action(f"跳过 {table_name}", "跳过", "表不存在")
                 return False, 0
 
             if table_name == 'activities':
-                # 获取现有活动ID
-                existing_ids = set()
-                existing_result = primary_conn.execute(text('SELECT id FROM activities'))
-                for row in existing_result:
-                    existing_ids.add(row[0])
-
-                # 获取备份活动
-                backup_activities = backup_conn.execute(text('SELECT * FROM "activities"')).fetchall()
-                new_activities = 0
-
-                for activity_row in backup_activities:
-                    activity_id = activity_row[0]
-                    if activity_id not in existing_ids:
-                        # 只添加不存在的活动
-                        columns = ['id', 'title', 'description', 'start_time', 'end_time', 'location', 'max_participants', 'created_by', 'created_at', 'updated_at', 'poster_data']
-                        placeholders = ', '.join([f':{col}' for col in columns])
-                        insert_sql = text(f'INSERT INTO "activities" ({", ".join(columns)}) VALUES ({placeholders})')
-
-                        params = {}
-                        for i, col in enumerate(columns):
-                            params[col] = activity_row[i] if i < len(activity_row) else None
-
-                        primary_conn.execute(insert_sql, params)
-                        new_activities += 1
+                # 只添加不存在的活动（按id跳过已有的活动）
+                columns = ['id', 'title', 'description', 'start_time', 'end_time', 'location', 'max_participants', 'created_by', 'created_at', 'updated_at', 'poster_data']
+                backup_activities = backup_conn.execute(
+                    text(f'SELECT {", ".join(columns)} FROM "activities"')
+                ).fetchall()
+                new_activities = BatchUpsert(primary_conn, 'activities', columns,
+                                             on_conflict='ignore').write(backup_activities)
 
                 primary_conn.commit()
                 self.log_sync_action(f"增量恢复 {table_name}", "成功", f"添加了 {new_activities} 个新活动")
@@ -869,6 +1439,8 @@ class DatabaseSyncer:
             if not backup_exists or not primary_exists:
                 self.log_sync_action(f"跳过 {table_name}", "跳过", "表不存在")
                 return False, 0
+            if self._table_unchanged(backup_conn, primary_conn, table_name):
+                return True, 0
 
             # 获取备份数据
             backup_result = backup_conn.execute(text(f'SELECT * FROM "{table_name}"'))
@@ -885,16 +1457,7 @@ class DatabaseSyncer:
             primary_conn.execute(text(f'DELETE FROM "{table_name}"'))
 
             # 批量插入备份数据
-            for row in backup_rows:
-                column_names = ', '.join([f'"{col}"' for col in columns])
-                placeholders = ', '.join([f':{col}' for col in columns])
-                insert_sql = text(f'INSERT INTO "{table_name}" ({column_names}) VALUES ({placeholders})')
-
-                params = {}
-                for i, col in enumerate(columns):
-                    params[col] = row[i] if i < len(row) else None
-
-                primary_conn.execute(insert_sql, params)
+            BatchUpsert(primary_conn, table_name, columns).write(backup_rows)
 
             primary_conn.commit()
             self.log_sync_action(f"完整恢复 {table_name}", "成功", f"恢复了 {len(backup_rows)} 行数据")
@@ -979,12 +1542,12 @@ class DatabaseSyncer:
         """强制完整恢复 - 专为Render数据库重置设计"""
         return self.safe_restore_from_clawcloud(force_full_restore=True)
 
-    def _perform_full_migration(self, backup_conn, primary_conn, start_time, max_duration):
-        """执行完整迁移（适用于Render数据库重置后的完整恢复）"""
-        try:
-            import time
-            from sqlalchemy import text
+    def _perform_full_migration(self, backup_engine, primary_engine, start_time, max_duration):
+        """执行完整迁移（适用于Render数据库重置后的完整恢复）
 
+        每个表在各自的连接上迁移，按外键依赖并发执行（src/sync_planner.py）。
+        """
+        try:
             # 完整的表迁移计划 - 按依赖顺序排列
             migration_plan = [
                 # 第一阶段：基础配置表（无外键依赖）
@@ -1019,34 +1582,27 @@ class DatabaseSyncer:
                 ('announcements', 'clear_insert'),     # 公告
             ]
 
-            restored_count = 0
-            total_rows = 0
+            from src.sync_planner import TableSyncScheduler, sync_workers, table_dependencies
 
-            # 临时禁用外键约束检查
-            try:
-                if 'postgresql' in self.dual_db.primary_db_url:
-                    primary_conn.execute(text('SET session_replication_role = replica'))
-                    self.log_sync_action("外键约束", "禁用", "临时禁用外键约束检查")
-            except Exception as e:
-                self.log_sync_action("外键约束", "警告", f"无法禁用外键约束: {str(e)}")
-            try:
-                for table_name, strategy in migration_plan:
-                    if time.time() - start_time > max_duration:
-                        self.log_sync_action("迁移超时", "警告", f"已运行{max_duration}秒，停止迁移")
-                        break
+            strategies = dict(migration_plan)
+            workers = sync_workers(self.dual_db.primary_db_url, self.dual_db.backup_db_url)
+            self.log_sync_action("外键约束", "禁用", "迁移连接临时禁用外键约束检查")
 
+            def migrate_table(table_name):
+                """迁移单个表，返回迁移的行数，跳过时返回None"""
+                strategy = strategies[table_name]
+                with backup_engine.connect() as backup_conn, primary_engine.connect() as primary_conn:
+                    self._disable_fk_checks(primary_conn, self.dual_db.primary_db_url)
                     try:
                         # 检查表是否存在（跨数据库兼容）
-                        backup_exists = self._table_exists(backup_conn, table_name)
-                        primary_exists = self._table_exists(primary_conn, table_name)
-
-                        if not backup_exists:
+                        if not self._table_exists(backup_conn, table_name):
                             self.log_sync_action(f"跳过 {table_name}", "跳过", "备份数据库中表不存在")
-                            continue
-                            
-                        if not primary_exists:
+                            return None
+                        if not self._table_exists(primary_conn, table_name):
                             self.log_sync_action(f"跳过 {table_name}", "跳过", "主数据库中表不存在")
-                            continue
+                            return None
+                        if self._table_unchanged(backup_conn, primary_conn, table_name):
+                            return TABLE_UNCHANGED
 
                         # 获取备份数据
                         backup_result = backup_conn.execute(text(f'SELECT * FROM "{table_name}"'))
@@ -1054,7 +1610,7 @@ class DatabaseSyncer:
 
                         if not backup_rows:
                             self.log_sync_action(f"跳过 {table_name}", "跳过", "备份数据为空")
-                            continue
+                            return None
 
                         # 根据策略执行迁移
                         if strategy == 'upsert':
@@ -1068,65 +1624,51 @@ class DatabaseSyncer:
                         else:  # insert
                             success, rows = self._migrate_table_insert(primary_conn, table_name, backup_rows, backup_result.keys())
 
-                        if success:
-                            restored_count += 1
-                            total_rows += rows
-                            self.log_sync_action(f"完整迁移 {table_name}", "成功", f"迁移了 {rows} 行数据")
-                        else:
-                            self.log_sync_action(f"完整迁移 {table_name}", "失败", "迁移失败")
-
-                    except Exception as e:
-                        self.log_sync_action(f"完整迁移 {table_name}", "失败", str(e))
-                        # 出错后回滚以清除事务错误状态，避免后续命令被忽略
-                        try:
-                            primary_conn.rollback()
-                        except Exception:
-                            pass
-                        try:
-                            backup_conn.rollback()
-                        except Exception:
-                            pass
-                        # 继续处理下一个表，不中断整个过程
-                        continue
-
-            finally:
-                # 重新启用外键约束检查
-                try:
-                    if 'postgresql' in self.dual_db.primary_db_url:
-                        primary_conn.execute(text('SET session_replication_role = DEFAULT'))
-                        self.log_sync_action("外键约束", "恢复", "重新启用外键约束检查")
-                except Exception as e:
-                    self.log_sync_action("外键约束", "警告", f"无法恢复外键约束: {str(e)}")
-                    try:
-                        primary_conn.rollback()
-                    except Exception:
-                        pass
-
-            return restored_count, total_rows
+                        if not success:
+                            raise RuntimeError("迁移失败")
+                        return rows
+                    finally:
+                        # 重新启用外键约束检查后再把连接还给连接池
+                        if 'postgresql' in self.dual_db.primary_db_url:
+                            try:
+                                primary_conn.rollback()
+                                primary_conn.execute(text('SET session_replication_role = DEFAULT'))
+                                primary_conn.commit()
+                            except Exception as e:
+                                self.log_sync_action("外键约束", "警告", f"无法恢复外键约束: {str(e)}")
+
+            progress = {'restored': 0, 'rows': 0}
+
+            def on_finish(table_name, result):
+                if isinstance(result, Exception):
+                    self.log_sync_action(f"完整迁移 {table_name}", "失败", str(result))
+                elif result == TABLE_UNCHANGED:
+                    # 主数据库已与备份一致，视为恢复成功
+                    progress['restored'] += 1
+                elif result is not None:
+                    progress['restored'] += 1
+                    progress['rows'] += result
+                    self.log_sync_action(f"完整迁移 {table_name}", "成功", f"迁移了 {result} 行数据")
+
+            # 按外键依赖调度：被引用的表迁移完成后才开始引用它的表，互不依赖的表并发迁移
+            scheduler = TableSyncScheduler(table_dependencies(strategies), max_workers=workers,
+                                           deadline=start_time + max_duration)
+            results = scheduler.run(migrate_table, on_finish=on_finish)
+            if len(results) < len(strategies):
+                self.log_sync_action("迁移超时", "警告",
+                                     f"已运行{max_duration}秒，{len(strategies) - len(results)} 个表未迁移")
+            self.log_sync_action("外键约束", "恢复", "重新启用外键约束检查")
+
+            return progress['restored'], progress['rows']
 
         except Exception as e:
             self.log_sync_action("完整迁移", "失败", str(e))
             return 0, 0
 
     def _migrate_table_upsert(self, primary_conn, table_name, backup_rows, columns):
-        """使用UPSERT策略迁移表"""
+        """使用UPSERT策略迁移表（按id更新已有的行）"""
         try:
-            from sqlalchemy import text
-
-            for row in backup_rows:
-                if table_name == 'roles':
-                    upsert_sql = text('''
-                        INSERT INTO "roles" (id, name, description)
-                        VALUES (:id, :name, :description)
-                        ON CONFLICT (id) DO UPDATE SET
-                            name = EXCLUDED.name,
-                            description = EXCLUDED.description
-                    ''')
-                    primary_conn.execute(upsert_sql, {
-                        'id': row[0],
-                        'name': row[1],
-                        'description': row[2] if len(row) > 2 else None
-                    })
+            BatchUpsert(primary_conn, table_name, columns, on_conflict='update').write(backup_rows)
 
             primary_conn.commit()
             return True, len(backup_rows)
@@ -1138,34 +1680,20 @@ class DatabaseSyncer:
     def _migrate_users_smart(self, primary_conn, backup_conn, backup_rows, columns):
         """智能迁移用户数据，避免管理员冲突"""
         try:
-            from sqlalchemy import text
-
             # 获取现有用户的用户名
-            existing_usernames = set()
-            existing_result = primary_conn.execute(text('SELECT username FROM users'))
-            for row in existing_result:
-                existing_usernames.add(row[0])
-
-            migrated_count = 0
+            existing_usernames = set(primary_conn.execute(text('SELECT username FROM users')).scalars())
 
+            # 只迁移不存在的用户
+            new_rows = []
             for row in backup_rows:
-                username = row[1] if len(row) > 1 else None  # 假设username是第二列
-
+                username = row._mapping['username']
                 if username and username not in existing_usernames:
-                    # 只迁移不存在的用户
-                    column_names = ', '.join([f'"{col}"' for col in columns])
-                    placeholders = ', '.join([f':{col}' for col in columns])
-                    insert_sql = text(f'INSERT INTO "users" ({column_names}) VALUES ({placeholders})')
-
-                    params = {}
-                    for i, col in enumerate(columns):
-                        params[col] = row[i] if i < len(row) else None
-
-                    primary_conn.execute(insert_sql, params)
-                    migrated_count += 1
+                    new_rows.append(row)
                 else:
                     self.log_sync_action("跳过用户", "跳过", f"用户 {username} 已存在")
 
+            migrated_count = BatchUpsert(primary_conn, 'users', columns).write(new_rows)
+
             primary_conn.commit()
             return True, migrated_count
 
@@ -1176,18 +1704,7 @@ class DatabaseSyncer:
     def _migrate_table_insert(self, primary_conn, table_name, backup_rows, columns):
         """使用INSERT策略迁移表"""
         try:
-            from sqlalchemy import text
-
-            for row in backup_rows:
-                column_names = ', '.join([f'"{col}"' for col in columns])
-                placeholders = ', '.join([f':{col}' for col in columns])
-                insert_sql = text(f'INSERT INTO "{table_name}" ({column_names}) VALUES ({placeholders})')
-
-                params = {}
-                for i, col in enumerate(columns):
-                    params[col] = row[i] if i < len(row) else None
-
-                primary_conn.execute(insert_sql, params)
+            BatchUpsert(primary_conn, table_name, columns).write(backup_rows)
 
             primary_conn.commit()
             return True, len(backup_rows)
@@ -1199,8 +1716,6 @@ class DatabaseSyncer:
     def _migrate_table_clear_insert(self, primary_conn, table_name, backup_rows, columns):
         """清空表后插入数据（适用于完整恢复）"""
         try:
-            from sqlalchemy import text
-            
             # 先清空表
             primary_conn.execute(text(f'DELETE FROM "{table_name}"'))
             
@@ -1211,16 +1726,7 @@ class DatabaseSyncer:
                 pass  # 忽略序列不存在的错误
             
             # 批量插入数据
-            for row in backup_rows:
-                column_names = ', '.join([f'"{col}"' for col in columns])
-                placeholders = ', '.join([f':{col}' for col in columns])
-                insert_sql = text(f'INSERT INTO "{table_name}" ({column_names}) VALUES ({placeholders})')
-
-                params = {}
-                for i, col in enumerate(columns):
-                    params[col] = row[i] if i < len(row) else None
-
-                primary_conn.execute(insert_sql, params)
+            BatchUpsert(primary_conn, table_name, columns).write(backup_rows)
             
             primary_conn.commit()
             return True, len(backup_rows)
@@ -1233,8 +1739,6 @@ class DatabaseSyncer:
     def _migrate_table_append(self, primary_conn, table_name, backup_rows, columns):
         """追加模式迁移（适用于日志表等）"""
         try:
-            from sqlalchemy import text
-            
             # 获取主表现有的最大ID（如果有ID列）
             max_id = 0
             try:
@@ -1243,28 +1747,24 @@ class DatabaseSyncer:
             except:
                 pass  # 忽略没有ID列的情况
             
-            # 插入数据，调整ID避免冲突
-            inserted_count = 0
+            # 调整可能冲突的ID，接在主表现有的最大ID之后
+            columns = list(columns)
+            id_index = columns.index('id') if 'id' in columns else None
+            rows = []
+            next_id = max_id
             for row in backup_rows:
-                column_names = ', '.join([f'"{col}"' for col in columns])
-                placeholders = ', '.join([f':{col}' for col in columns])
-                insert_sql = text(f'INSERT INTO "{table_name}" ({column_names}) VALUES ({placeholders})')
-
-                params = {}
-                for i, col in enumerate(columns):
-                    value = row[i] if i < len(row) else None
-                    # 如果是ID列且值可能冲突，则调整
-                    if col == 'id' and value and value <= max_id:
-                        value = max_id + inserted_count + 1
-                    params[col] = value
-
-                try:
-                    primary_conn.execute(insert_sql, params)
-                    inserted_count += 1
-                except Exception as row_error:
-                    # 跳过重复或冲突的记录
-                    self.log_sync_action(f"跳过 {table_name} 重复记录", "警告", str(row_error))
-                    continue
+                values = list(row)
+                if id_index is not None and values[id_index] and values[id_index] <= max_id:
+                    next_id += 1
+                    values[id_index] = next_id
+                rows.append(values)
+
+            # 跳过其他唯一约束冲突的记录
+            inserted_count = BatchUpsert(primary_conn, table_name, columns, on_conflict='ignore',
+                                         conflict_columns=None).write(rows)
+            skipped = len(rows) - inserted_count
+            if skipped:
+                self.log_sync_action(f"跳过 {table_name} 重复记录", "警告", f"{skipped} 行")
             
             primary_conn.commit()
             return True, inserted_count
@@ -1368,8 +1868,8 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='数据库同步工具')
-    parser.add_argument('action', choices=['backup', 'restore', 'test'], 
-                       help='操作类型: backup(备份到ClawCloud), restore(从ClawCloud恢复), test(测试连接)')
+    parser.add_argument('action', choices=['backup', 'incremental', 'restore', 'test'], 
+                       help='操作类型: backup(全量备份到ClawCloud), incremental(增量备份到ClawCloud), restore(从ClawCloud恢复), test(测试连接)')
     
     args = parser.parse_args()
     
@@ -1395,6 +1895,15 @@ def main():
             print("备份失败!")
             sys.exit(1)
     
+    elif args.action == 'incremental':
+        print("开始增量备份到ClawCloud...")
+        success = syncer.incremental_backup_to_clawcloud()
+        if success:
+            print("增量备份成功完成!")
+        else:
+            print("增量备份失败!")
+            sys.exit(1)
+    
     elif args.action == 'restore':
         print("开始从ClawCloud恢复...")
         success = syncer.restore_from_clawcloud()
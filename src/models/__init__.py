@@ -3,9 +3,12 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import json
+import hashlib
 import pytz
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Float, Table, func, UniqueConstraint
-from sqlalchemy.orm import relationship, backref
+from collections import defaultdict
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, ForeignKey, Float, Table, func, UniqueConstraint, event, update, select, or_
+from sqlalchemy.orm import relationship, backref, deferred, column_property, Session
+from sqlalchemy.orm.attributes import get_history
 from sqlalchemy.ext.declarative import declarative_base
 from src import db
 
@@ -164,6 +167,11 @@ class Activity(db.Model):
     # 参与人数
     max_participants = Column(Integer, default=0)  # 0表示不限制
     
+    # 报名人数计数器，随Registration状态变化在同一事务中维护，避免每次COUNT报名表
+    registered_count = Column(Integer, default=0, server_default='0', nullable=False)  # 已报名（未签到）人数
+    attended_count = Column(Integer, default=0, server_default='0', nullable=False)  # 已参加人数
+    cancelled_count = Column(Integer, default=0, server_default='0', nullable=False)  # 已取消人数
+    
     # 积分和类型
     points = Column(Integer, default=10)  # 参与可获得的积分
     type = Column(String(50), default='其他')  # 活动类型
@@ -172,8 +180,10 @@ class Activity(db.Model):
     
     # 海报图片
     poster_image = Column(String(255))  # 存储海报图片文件名
-    poster_data = Column(db.LargeBinary)  # 存储海报图片二进制数据
+    poster_data = deferred(Column(db.LargeBinary), group='poster_blob')  # 存储海报图片二进制数据（延迟加载，列表查询不读取）
     poster_mimetype = Column(String(50))  # 存储海报图片MIME类型
+    poster_size = Column(Integer)  # 海报二进制数据大小（字节），用于判断是否有数据库海报而无需加载二进制数据
+    poster_hash = Column(String(64))  # 海报内容SHA-256哈希，用于ETag和带版本号的海报URL
     
     # 签到相关
     checkin_key = Column(String(32))  # 签到密钥
@@ -192,14 +202,29 @@ class Activity(db.Model):
     checkins = relationship('ActivityCheckin', backref='activity', lazy='dynamic', cascade='all, delete-orphan')
     tags = relationship('Tag', secondary=activity_tags, backref=backref('activities', lazy='dynamic'))
     
+    def set_poster(self, filename, data, mimetype):
+        """更新海报信息，同时维护poster_size和poster_hash，避免之后为判断是否有海报或校验缓存而加载二进制数据"""
+        self.poster_image = filename
+        self.poster_data = data
+        self.poster_mimetype = mimetype
+        self.poster_size = len(data) if data else None
+        self.poster_hash = hashlib.sha256(data).hexdigest() if data else None
+    
+    @property
+    def poster_version(self):
+        """海报版本号（内容哈希前16位），用于生成内容变化即失效的海报URL"""
+        return self.poster_hash[:16] if self.poster_hash else None
+    
     # 海报属性方法 - 不再定义数据库字段，而是通过属性方法提供兼容性
     @property
     def poster_url(self):
         """提供向后兼容的poster_url属性"""
         if not self.poster_image:
             return None
-        # 如果存在poster_data，优先使用数据库中的图片
-        if hasattr(self, 'poster_data') and self.poster_data:
+        # 如果数据库中存有海报数据，优先使用数据库中的图片（通过poster_size判断，不触发poster_data加载）
+        if self.poster_size:
+            if self.poster_version:
+                return f"/poster/{self.id}?v={self.poster_version}"
             return f"/poster/{self.id}"
         # 返回相对路径，模板中可以与url_for一起使用
         elif 'banner' in self.poster_image:
@@ -212,6 +237,16 @@ class Activity(db.Model):
         """提供向后兼容的poster属性"""
         return None  # 数据库中不再有此字段，返回None
     
+    @property
+    def active_registration_count(self):
+        """有效报名人数（已报名+已参加），用于名额判断"""
+        return (self.registered_count or 0) + (self.attended_count or 0)
+    
+    @property
+    def total_registration_count(self):
+        """全部报名记录数（包括已取消）"""
+        return self.active_registration_count + (self.cancelled_count or 0)
+    
     def __repr__(self):
         return f'<Activity {self.title}>'
 
@@ -220,10 +255,11 @@ class Registration(db.Model):
     __tablename__ = 'registrations'
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'))
-    activity_id = Column(Integer, ForeignKey('activities.id'))
-    status = Column(String(20), default='registered')  # registered, attended, cancelled
+    # active_history: 修改已过期的对象时也先加载原值，报名计数器和每日统计需要知道原来的值
+    activity_id = column_property(Column(Integer, ForeignKey('activities.id')), active_history=True)
+    status = column_property(Column(String(20), default='registered'), active_history=True)  # registered, attended, cancelled
     register_time = Column(DateTime, default=func.now())
-    check_in_time = Column(DateTime)  # 签到时间
+    check_in_time = column_property(Column(DateTime), active_history=True)  # 签到时间
     remark = Column(Text)  # 备注
     
     # 唯一约束，确保一个用户只能报名一个活动一次
@@ -232,6 +268,156 @@ class Registration(db.Model):
     def __repr__(self):
         return f'<Registration {self.user_id} {self.activity_id}>'
 
+# 报名状态与活动计数器列的对应关系
+REGISTRATION_COUNTER_COLUMNS = {
+    'registered': 'registered_count',
+    'attended': 'attended_count',
+    'cancelled': 'cancelled_count',
+}
+
+def _registration_old_values(registration):
+    """获取报名记录在数据库中的原始(activity_id, status)"""
+    values = []
+    for attr in ('activity_id', 'status'):
+        history = get_history(registration, attr)
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.unchanged:
+            values.append(history.unchanged[0])
+        else:
+            values.append(getattr(registration, attr))
+    return tuple(values)
+
+def _release_reserved_seat(registration, deltas):
+    """通过reserve_registration_seat预占名额的报名记录，已报名计数器已经加过1，这里不再重复计数"""
+    activity_id = getattr(registration, '_reserved_seat', None)
+    if activity_id is None:
+        return
+    del registration._reserved_seat
+    if activity_id == registration.activity_id and registration.status == 'registered':
+        deltas[(activity_id, 'registered')] -= 1
+
+def reserve_registration_seat(activity, registration):
+    """原子地为报名记录预占一个活动名额
+    
+    使用一条带条件的UPDATE完成"检查名额+占用名额"：只有当活动不限人数或有效报名人数
+    （已报名+已参加）小于max_participants时才会更新成功。数据库在UPDATE时对活动行加锁，
+    并发报名时不会超额。预占成功后将registration的状态设为registered，随后提交即可；
+    事务回滚时名额一并释放。registration不能是已经刷新到数据库的新记录，否则会重复计数。
+    
+    Args:
+        activity: 活动对象
+        registration: 新建或已取消的报名记录
+    
+    Returns:
+        bool: 是否成功预占名额，False表示名额已满
+    """
+    activities = Activity.__table__
+    stmt = update(activities).where(
+        activities.c.id == activity.id,
+        or_(
+            func.coalesce(activities.c.max_participants, 0) <= 0,
+            activities.c.registered_count + activities.c.attended_count < activities.c.max_participants
+        )
+    ).values(registered_count=activities.c.registered_count + 1)
+    
+    with db.session.no_autoflush:
+        result = db.session.execute(stmt)
+    # 计数器已在数据库中更新，让会话中的活动对象下次访问时重新读取
+    db.session.expire(activity, ['registered_count', 'attended_count', 'cancelled_count'])
+    if result.rowcount != 1:
+        return False
+    
+    registration.status = 'registered'
+    registration._reserved_seat = activity.id
+    return True
+
+@event.listens_for(Session, 'before_flush')
+def _capture_registration_old_values(session, flush_context, instances):
+    """刷新前记录待删除/待修改报名记录的原始值（此时仍可安全加载已过期的属性）"""
+    old_values = {}
+    for obj in list(session.deleted) + list(session.dirty):
+        if isinstance(obj, Registration):
+            old_values[obj] = _registration_old_values(obj)
+    session.info['_registration_old_values'] = old_values
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_registration_counters(session, flush_context):
+    """报名记录新增、删除或状态变化时，在同一事务中增减活动的报名计数器
+    
+    通过ORM的所有报名变更都会经过这里；绕过ORM的批量删除需要调用recount_registrations修正。
+    """
+    old_values = session.info.pop('_registration_old_values', {})
+    deltas = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, Registration):
+            deltas[(obj.activity_id, obj.status or 'registered')] += 1
+            _release_reserved_seat(obj, deltas)
+    for obj in session.deleted:
+        if isinstance(obj, Registration) and obj in old_values:
+            deltas[old_values[obj]] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Registration) and obj not in session.deleted and obj in old_values:
+            old = old_values[obj]
+            new = (obj.activity_id, obj.status)
+            if old != new:
+                deltas[old] -= 1
+                deltas[new] += 1
+                _release_reserved_seat(obj, deltas)
+    
+    changed = defaultdict(dict)
+    for (activity_id, status), delta in deltas.items():
+        column = REGISTRATION_COUNTER_COLUMNS.get(status)
+        if activity_id is None or column is None or not delta:
+            continue
+        changed[activity_id][column] = Activity.__table__.c[column] + delta
+    
+    if not changed:
+        return
+    connection = session.connection()
+    for activity_id, values in changed.items():
+        connection.execute(update(Activity.__table__).where(Activity.__table__.c.id == activity_id).values(**values))
+        # 让会话中已加载的活动对象下次访问时重新读取计数器
+        activity = session.identity_map.get(session.identity_key(Activity, activity_id))
+        if activity is not None:
+            session.expire(activity, list(values))
+
+def registration_recount_statement(activity_ids=None):
+    """生成根据报名表重新计算活动报名计数器的UPDATE语句（单条语句，兼容SQLite和PostgreSQL）
+    
+    Args:
+        activity_ids: 需要修正的活动ID列表，为None时修正全部活动
+    """
+    activities = Activity.__table__
+    registrations = Registration.__table__
+    
+    def _count(status):
+        return select(func.count()).where(
+            registrations.c.activity_id == activities.c.id,
+            registrations.c.status == status
+        ).scalar_subquery()
+    
+    stmt = update(activities).values(
+        registered_count=_count('registered'),
+        attended_count=_count('attended'),
+        cancelled_count=_count('cancelled'),
+    )
+    if activity_ids is not None:
+        stmt = stmt.where(activities.c.id.in_(list(activity_ids)))
+    return stmt
+
+def recount_registrations(activity_ids=None):
+    """根据报名表重新计算活动的报名计数器（需由调用方提交事务）
+    
+    Args:
+        activity_ids: 需要修正的活动ID列表，为None时修正全部活动
+    
+    Returns:
+        int: 更新的活动数量
+    """
+    result = db.session.execute(registration_recount_statement(activity_ids))
+    return result.rowcount
+
 # 积分历史模型
 class PointsHistory(db.Model):
     __tablename__ = 'points_history'
@@ -313,6 +499,92 @@ class ActivityCheckin(db.Model):
     def __repr__(self):
         return f'<ActivityCheckin {self.user_id} {self.activity_id}>'
 
+
+# 每日统计汇总模型
+class DailyStats(db.Model):
+    __tablename__ = 'daily_stats'
+    stat_date = Column(Date, primary_key=True)  # 统计日期（与数据库中时间字段的日期一致）
+    activities_created = Column(Integer, default=0, server_default='0', nullable=False)  # 当天创建的活动数
+    registrations = Column(Integer, default=0, server_default='0', nullable=False)  # 当天的报名数
+    new_users = Column(Integer, default=0, server_default='0', nullable=False)  # 当天注册的用户数
+    checkins = Column(Integer, default=0, server_default='0', nullable=False)  # 当天的签到数
+    points_awarded = Column(Integer, default=0, server_default='0', nullable=False)  # 当天发放的积分（只计正数）
+    updated_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f'<DailyStats {self.stat_date}>'
+
+# 每日统计汇总的计数列
+DAILY_STATS_COLUMNS = ('activities_created', 'registrations', 'new_users', 'checkins', 'points_awarded')
+
+def daily_stats_upsert_statement(dialect_name, accumulate=True):
+    """生成写入daily_stats的INSERT ... ON CONFLICT语句（SQLite和PostgreSQL通用语法）
+    
+    Args:
+        dialect_name: 数据库方言名称
+        accumulate: True时在已有行上累加（写入钩子），False时覆盖（重新汇总）
+    """
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = DailyStats.__table__
+    stmt = dialect_insert(table)
+    values = {'updated_at': stmt.excluded.updated_at}
+    for name in DAILY_STATS_COLUMNS:
+        values[name] = table.c[name] + stmt.excluded[name] if accumulate else stmt.excluded[name]
+    return stmt.on_conflict_do_update(index_elements=[table.c.stat_date], set_=values)
+
+def _stat_day(obj, attr):
+    """对象时间字段所在的日期；使用数据库默认值（尚未加载）时返回None，表示数据库当天"""
+    value = obj.__dict__.get(attr)
+    if isinstance(value, datetime):
+        return value.date()
+    return None
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_daily_stats(session, flush_context):
+    """新增活动、报名、用户、积分记录或签到时，在同一事务中累加当天的统计汇总
+    
+    删除记录和绕过ORM的写入不在这里处理，由定时任务重新汇总最近几天修正，历史数据使用backfill-daily-stats命令重建。
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for obj in session.new:
+        if isinstance(obj, Activity):
+            deltas[_stat_day(obj, 'created_at')]['activities_created'] += 1
+        elif isinstance(obj, Registration):
+            deltas[_stat_day(obj, 'register_time')]['registrations'] += 1
+            if obj.check_in_time is not None:
+                deltas[_stat_day(obj, 'check_in_time')]['checkins'] += 1
+        elif isinstance(obj, User):
+            deltas[_stat_day(obj, 'created_at')]['new_users'] += 1
+        elif isinstance(obj, PointsHistory) and (obj.points or 0) > 0:
+            deltas[_stat_day(obj, 'created_at')]['points_awarded'] += obj.points
+    for obj in session.dirty:
+        if isinstance(obj, Registration) and obj not in session.deleted:
+            history = get_history(obj, 'check_in_time')
+            if not history.added and not history.deleted:
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if isinstance(old, datetime):
+                deltas[old.date()]['checkins'] -= 1
+            if isinstance(new, datetime):
+                deltas[new.date()]['checkins'] += 1
+    
+    deltas = {day: counts for day, counts in deltas.items() if any(counts.values())}
+    if not deltas:
+        return
+    connection = session.connection()
+    stmt = daily_stats_upsert_statement(connection.dialect.name)
+    for day, counts in deltas.items():
+        values = {name: counts.get(name, 0) for name in DAILY_STATS_COLUMNS}
+        connection.execute(stmt.values(
+            stat_date=day if day is not None else func.current_date(),
+            updated_at=datetime.utcnow(),
+            **values
+        ))
+
 # 消息模型
 class Message(db.Model):
     __tablename__ = 'message'
@@ -321,7 +593,8 @@ class Message(db.Model):
     receiver_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     subject = Column(String(100), nullable=False)
     content = Column(Text, nullable=False)
-    is_read = Column(Boolean, default=False)
+    # active_history: 修改已过期的对象时也先加载原值，未读计数器需要知道原来是否已读
+    is_read = column_property(Column(Boolean, default=False), active_history=True)
     created_at = Column(DateTime)
     
     def __repr__(self):
@@ -359,6 +632,123 @@ class NotificationRead(db.Model):
     def __repr__(self):
         return f'<NotificationRead {self.user_id} {self.notification_id}>'
 
+# 用户未读计数器模型
+class UserUnreadCounter(db.Model):
+    __tablename__ = 'user_unread_counters'
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_notifications = Column(Integer)  # 未读且未过期的重要通知数，NULL表示需要重新计算
+    unread_messages = Column(Integer)  # 未读消息数，NULL表示需要重新计算
+    updated_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f'<UserUnreadCounter {self.user_id}>'
+
+def unexpired_notification_clause(now=None):
+    """通知未过期的条件（无过期日期或过期日期不早于当前时间）"""
+    if now is None:
+        from src.utils.time_helpers import ensure_timezone_aware
+        now = ensure_timezone_aware(datetime.now())
+    notifications = Notification.__table__
+    return or_(notifications.c.expiry_date == None, notifications.c.expiry_date >= now)
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_unread_counters(session, flush_context):
+    """新增/阅读/删除消息、发布/阅读通知时，在同一事务中更新接收者的未读计数器
+    
+    计数器不存在的用户不做处理，首次读取时再根据源表计算；编辑或删除通知影响的用户较多，
+    直接把所有用户的通知计数置为NULL，下次读取时重新计算。绕过ORM的写入由reconcile-unread-counters命令修正。
+    """
+    message_deltas = defaultdict(int)
+    read_notification_ids = defaultdict(list)
+    stale_notification_users = set()
+    stale_message_users = set()
+    deleted_user_ids = set()
+    new_important = 0
+    reset_notifications = False
+    
+    for obj in session.new:
+        if isinstance(obj, Message):
+            if not obj.is_read:
+                message_deltas[obj.receiver_id] += 1
+        elif isinstance(obj, NotificationRead):
+            read_notification_ids[obj.user_id].append(obj.notification_id)
+        elif isinstance(obj, Notification):
+            if obj.is_important:
+                new_important += 1
+    for obj in session.dirty:
+        if obj in session.deleted:
+            continue
+        if isinstance(obj, Message):
+            history = get_history(obj, 'is_read')
+            if not history.added and not history.deleted:
+                continue
+            was_unread = not (history.deleted[0] if history.deleted else False)
+            is_unread = not (history.added[0] if history.added else False)
+            message_deltas[obj.receiver_id] += int(is_unread) - int(was_unread)
+        elif isinstance(obj, Notification):
+            if get_history(obj, 'is_important').has_changes() or get_history(obj, 'expiry_date').has_changes():
+                reset_notifications = True
+    for obj in session.deleted:
+        if isinstance(obj, Message):
+            # 删除前已加载的对象才能判断是否未读，否则该用户的消息计数需要重新计算
+            if 'is_read' in obj.__dict__:
+                if not obj.is_read:
+                    message_deltas[obj.receiver_id] -= 1
+            else:
+                stale_message_users.add(obj.receiver_id)
+        elif isinstance(obj, Notification):
+            reset_notifications = True
+        elif isinstance(obj, NotificationRead):
+            stale_notification_users.add(obj.user_id)
+        elif isinstance(obj, User):
+            deleted_user_ids.add(obj.id)
+    
+    message_deltas = {user_id: delta for user_id, delta in message_deltas.items() if delta}
+    if not (message_deltas or read_notification_ids or stale_notification_users or stale_message_users
+            or deleted_user_ids or new_important or reset_notifications):
+        return
+    
+    connection = session.connection()
+    counters = UserUnreadCounter.__table__
+    now = datetime.utcnow()
+    for user_id, delta in message_deltas.items():
+        connection.execute(update(counters).where(
+            counters.c.user_id == user_id,
+            counters.c.unread_messages != None
+        ).values(unread_messages=counters.c.unread_messages + delta, updated_at=now))
+    if stale_message_users:
+        connection.execute(update(counters).where(counters.c.user_id.in_(stale_message_users))
+                           .values(unread_messages=None, updated_at=now))
+    
+    if reset_notifications:
+        connection.execute(update(counters).values(unread_notifications=None, updated_at=now))
+    else:
+        if new_important:
+            connection.execute(update(counters).where(counters.c.unread_notifications != None).values(
+                unread_notifications=counters.c.unread_notifications + new_important, updated_at=now))
+        if read_notification_ids:
+            # 只有未过期的重要通知计入未读数
+            notifications = Notification.__table__
+            all_ids = {nid for ids in read_notification_ids.values() for nid in ids}
+            counted = set(connection.execute(select(notifications.c.id).where(
+                notifications.c.id.in_(all_ids),
+                notifications.c.is_important == True,
+                unexpired_notification_clause()
+            )).scalars())
+            for user_id, ids in read_notification_ids.items():
+                delta = len(counted.intersection(ids))
+                if delta:
+                    connection.execute(update(counters).where(
+                        counters.c.user_id == user_id,
+                        counters.c.unread_notifications != None
+                    ).values(unread_notifications=counters.c.unread_notifications - delta, updated_at=now))
+        if stale_notification_users:
+            connection.execute(update(counters).where(counters.c.user_id.in_(stale_notification_users))
+                               .values(unread_notifications=None, updated_at=now))
+    
+    if deleted_user_ids:
+        connection.execute(counters.delete().where(counters.c.user_id.in_(deleted_user_ids)))
+
 # AI聊天历史记录模型
 class AIChatHistory(db.Model):
     __tablename__ = 'ai_chat_history'
@@ -423,3 +813,40 @@ class AIUserPreferences(db.Model):
     
     def __repr__(self):
         return f'<AIUserPreferences {self.user_id}>'
+
+# 增量备份（src/db_sync.py）按水位线同步的表：表名 -> 变更时间列，None表示只追加的表，按自增id同步。
+# 其他表没有可靠的变更时间，增量备份时整表重新复制。
+INCREMENTAL_SYNC_TABLES = {
+    'activities': 'updated_at',
+    'ai_chat_session': 'updated_at',
+    'system_logs': None,
+    'points_history': None,
+    'ai_chat_history': None,
+    'notification_read': None,
+    'activity_checkins': None,
+}
+
+# 增量备份的删除记录（墓碑）
+class SyncTombstone(db.Model):
+    __tablename__ = 'sync_tombstones'
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(64), nullable=False, index=True)
+    row_id = Column(String(255), nullable=False)  # 被删除行的主键
+    deleted_at = Column(DateTime, default=func.now())
+    
+    def __repr__(self):
+        return f'<SyncTombstone {self.table_name} {self.row_id}>'
+
+@event.listens_for(Session, 'after_flush')
+def _record_sync_tombstones(session, flush_context):
+    """删除按水位线增量备份的表中的行时记录墓碑，下次增量备份时在备份库中删除
+    
+    批量删除和数据库级联删除不经过这里，由增量备份的校验步骤比对行数后修正。
+    """
+    rows = []
+    for obj in session.deleted:
+        table_name = getattr(obj, '__tablename__', None)
+        if table_name in INCREMENTAL_SYNC_TABLES:
+            rows.append({'table_name': table_name, 'row_id': str(obj.id), 'deleted_at': datetime.utcnow()})
+    if rows:
+        session.connection().execute(SyncTombstone.__table__.insert(), rows)
@@ -25,9 +25,11 @@ from flask_login import current_user, login_required
 from sqlalchemy import func, desc, or_, and_, extract, text, case
 from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
-from src.models import db, User, Role, StudentInfo, Activity, Registration, SystemLog, Tag, Message, Notification, NotificationRead, PointsHistory, ActivityReview, ActivityCheckin, AIChatHistory, AIChatSession, AIUserPreferences, student_tags, activity_tags, Announcement
+from src.models import db, User, Role, StudentInfo, Activity, Registration, SystemLog, Tag, Message, Notification, NotificationRead, PointsHistory, ActivityReview, ActivityCheckin, AIChatHistory, AIChatSession, AIUserPreferences, student_tags, activity_tags, Announcement, recount_registrations
 from src.routes.utils import admin_required, log_action
 from src.utils.time_helpers import normalize_datetime_for_db, display_datetime, ensure_timezone_aware, get_localized_now, safe_less_than, safe_greater_than, get_activity_status
+from src.utils.home_feed import invalidate_home_feed
+from src.utils.notification_hub import notification_hub, notification_event_data, publish_unread_messages
 from src.forms import ActivityForm  # 添加ActivityForm导入
 from flask_wtf.csrf import generate_csrf, validate_csrf
 from src.utils import get_compatible_paginate
@@ -114,6 +116,11 @@ def handle_poster_upload(file_data, activity_id):
                 logger.info(f"设置文件权限为644: {file_path}")
             except Exception as e:
                 logger.warning(f"无法设置文件权限: {e}")
+            
+            # 更新海报索引
+            if activity_id is not None:
+                from src.utils.poster_index import poster_index
+                poster_index.register(str_activity_id, unique_filename)
         except Exception as e:
             logger.warning(f"保存文件到文件系统失败: {e}")
         
@@ -122,6 +129,14 @@ def handle_poster_upload(file_data, activity_id):
         binary_data = file_data.read()
         logger.info(f"已读取二进制数据，大小: {len(binary_data)} 字节")
         
+        # 预先生成缩略图和不同格式的变体，首页和列表页首次访问无需等待缩放
+        try:
+            from src.utils.poster_images import generate_poster_variants
+            variant_count = generate_poster_variants(binary_data)
+            logger.info(f"已生成 {variant_count} 个海报变体")
+        except Exception as e:
+            logger.warning(f"生成海报变体失败，将在首次访问时生成: {e}")
+        
         # 返回文件信息 (包含文件名、二进制数据和MIME类型)
         logger.info(f"活动海报已处理: {unique_filename}")
         return {
@@ -360,9 +375,7 @@ def create_activity():
                         old_poster = activity.poster_image
                         
                         # 更新海报信息
-                        activity.poster_image = poster_info['filename']
-                        activity.poster_data = poster_info['data']
-                        activity.poster_mimetype = poster_info['mimetype']
+                        activity.set_poster(poster_info['filename'], poster_info['data'], poster_info['mimetype'])
                         logger.info(f"活动海报信息已更新: {poster_info['filename']}")
                         
                         # 尝试删除旧海报文件（如果存在且不是默认banner）
@@ -372,6 +385,8 @@ def create_activity():
                                 if os.path.exists(old_poster_path):
                                     os.remove(old_poster_path)
                                     logger.info(f"已删除旧海报文件: {old_poster_path}")
+                                from src.utils.poster_index import poster_index
+                                poster_index.discard(activity.id, old_poster)
                             except Exception as e:
                                 logger.warning(f"删除旧海报文件时出错: {e}")
                     else:
@@ -384,6 +399,7 @@ def create_activity():
             # 保存到数据库
             db.session.add(activity)
             db.session.commit()
+            invalidate_home_feed()
             
             # 记录操作
             log_action(
@@ -572,9 +588,7 @@ def edit_activity(id):
                             old_poster = activity.poster_image
                             
                             # 更新海报信息
-                            activity.poster_image = poster_info['filename']
-                            activity.poster_data = poster_info['data']
-                            activity.poster_mimetype = poster_info['mimetype']
+                            activity.set_poster(poster_info['filename'], poster_info['data'], poster_info['mimetype'])
                             logger.info(f"编辑活动: 海报信息已更新: {poster_info['filename']}")
                             
                             # 尝试删除旧海报文件（如果存在且不是默认banner）
@@ -584,6 +598,8 @@ def edit_activity(id):
                                     if os.path.exists(old_poster_path):
                                         os.remove(old_poster_path)
                                         logger.info(f"编辑活动: 已删除旧海报文件: {old_poster_path}")
+                                    from src.utils.poster_index import poster_index
+                                    poster_index.discard(activity.id, old_poster)
                                 except Exception as e:
                                     logger.warning(f"编辑活动: 删除旧海报文件时出错: {e}")
                         else:
@@ -606,6 +622,7 @@ def edit_activity(id):
                 
                 try:
                     db.session.commit()
+                    invalidate_home_feed()
                     logger.info("活动更新成功提交到数据库")
                     
                     # 记录日志
@@ -799,77 +816,17 @@ def adjust_student_points(id):
 @admin_required
 def statistics():
     try:
-        # 获取当前时间
-        now = get_localized_now()
-        
-        # 获取最近7天的日期范围
-        end_date = now
-        start_date = end_date - timedelta(days=6)
-        
-        # 确保时间是规范化的
-        start_date = normalize_datetime_for_db(start_date)
-        end_date = normalize_datetime_for_db(end_date)
-        
-        # 获取最近7天的活动数据
-        daily_activities_stmt = db.select(
-            func.date(Activity.created_at).label('date'),
-            func.count(Activity.id).label('count')
-        ).filter(
-            Activity.created_at.between(start_date, end_date)
-        ).group_by(
-            func.date(Activity.created_at)
-        )
-        daily_activities = db.session.execute(daily_activities_stmt).all()
-        
-        # 获取最近7天的注册数据
-        daily_registrations_stmt = db.select(
-            func.date(Registration.register_time).label('date'),
-            func.count(Registration.id).label('count')
-        ).filter(
-            Registration.register_time.between(start_date, end_date)
-        ).group_by(
-            func.date(Registration.register_time)
-        )
-        daily_registrations = db.session.execute(daily_registrations_stmt).all()
-        
-        # 获取最近7天的用户注册数据
-        daily_users_stmt = db.select(
-            func.date(User.created_at).label('date'),
-            func.count(User.id).label('count')
-        ).filter(
-            User.created_at.between(start_date, end_date)
-        ).group_by(
-            func.date(User.created_at)
-        )
-        daily_users = db.session.execute(daily_users_stmt).all()
-        
-        # 将查询结果转换为字典格式，方便前端使用
-        date_format = '%Y-%m-%d'
-        
-        # 创建包含所有日期的字典
-        date_range = [(start_date + timedelta(days=i)).strftime(date_format) for i in range(7)]
-        
-        activities_data = {date: 0 for date in date_range}
-        for item in daily_activities:
-            date_str = item.date.strftime(date_format) if hasattr(item.date, 'strftime') else str(item.date)
-            activities_data[date_str] = item.count
-            
-        registrations_data = {date: 0 for date in date_range}
-        for item in daily_registrations:
-            date_str = item.date.strftime(date_format) if hasattr(item.date, 'strftime') else str(item.date)
-            registrations_data[date_str] = item.count
-            
-        users_data = {date: 0 for date in date_range}
-        for item in daily_users:
-            date_str = item.date.strftime(date_format) if hasattr(item.date, 'strftime') else str(item.date)
-            users_data[date_str] = item.count
+        # 最近7天的活动、报名和新用户数据读取每日统计汇总表（单次查询）
+        from src.utils.daily_stats import daily_series
+        start_date = get_localized_now().date() - timedelta(days=6)
+        series = daily_series(start_date, 7)
         
         # 准备图表数据
         chart_data = {
-            'labels': date_range,
-            'activities': [activities_data[date] for date in date_range],
-            'registrations': [registrations_data[date] for date in date_range],
-            'users': [users_data[date] for date in date_range]
+            'labels': series['labels'],
+            'activities': series['activities_created'],
+            'registrations': series['registrations'],
+            'users': series['new_users']
         }
         
         # 获取活动类型分布
@@ -922,81 +879,10 @@ def statistics():
 @admin_required
 def api_statistics():
     try:
-        # 活动状态统计
-        active_count_stmt = db.select(func.count()).select_from(Activity).filter_by(status='active')
-        active_count = db.session.execute(active_count_stmt).scalar()
-        
-        completed_count_stmt = db.select(func.count()).select_from(Activity).filter_by(status='completed')
-        completed_count = db.session.execute(completed_count_stmt).scalar()
-        
-        cancelled_count_stmt = db.select(func.count()).select_from(Activity).filter_by(status='cancelled')
-        cancelled_count = db.session.execute(cancelled_count_stmt).scalar()
-        
-        registration_stats = {
-            'labels': ['进行中', '已结束', '已取消'],
-            'data': [active_count, completed_count, cancelled_count]
-        }
-        
-        # 学生参与度统计
-        student_role_stmt = db.select(Role.id).filter_by(name='Student')
-        student_role_id = db.session.execute(student_role_stmt).scalar()
-        
-        total_students_stmt = db.select(func.count()).select_from(User).filter_by(role_id=student_role_id)
-        total_students = db.session.execute(total_students_stmt).scalar()
-        
-        active_students_stmt = db.select(func.count(Registration.user_id.distinct())).select_from(Registration)
-        active_students = db.session.execute(active_students_stmt).scalar()
-        
-        inactive_students = total_students - active_students if total_students > active_students else 0
-        
-        participation_stats = {
-            'labels': ['已参与活动', '未参与活动'],
-            'data': [active_students, inactive_students]
-        }
-        
-        # 月度活动和报名统计
-        months = []
-        activities_count = []
-        registrations_count = []
-        
-        for i in range(5, -1, -1):
-            # 获取过去6个月的数据
-            current_month = normalize_datetime_for_db(datetime.now()).replace(day=1) - timedelta(days=i*30)
-            month_start = current_month.replace(day=1)
-            if current_month.month == 12:
-                month_end = current_month.replace(year=current_month.year+1, month=1, day=1)
-            else:
-                month_end = current_month.replace(month=current_month.month+1, day=1)
-            
-            # 月份标签
-            month_label = current_month.strftime('%Y-%m')
-            months.append(month_label)
-            
-            # 活动数量
-            monthly_activities_stmt = db.select(func.count()).select_from(Activity).filter(
-                Activity.created_at.between(month_start, month_end)
-            )
-            monthly_activities = db.session.execute(monthly_activities_stmt).scalar() or 0
-            activities_count.append(monthly_activities)
-            
-            # 报名数量
-            monthly_registrations_stmt = db.select(func.count()).select_from(Registration).filter(
-                Registration.register_time.between(month_start, month_end)
-            )
-            monthly_registrations = db.session.execute(monthly_registrations_stmt).scalar() or 0
-            registrations_count.append(monthly_registrations)
-        
-        monthly_stats = {
-            'labels': months,
-            'activities': activities_count,
-            'registrations': registrations_count
-        }
-        
-        return jsonify({
-            'registration_stats': registration_stats,
-            'participation_stats': participation_stats,
-            'monthly_stats': monthly_stats
-        })
+        # 所有统计均为分组查询，查询次数与月份窗口长度无关；可通过?months=指定窗口
+        from src.utils.statistics import collect_statistics
+        months = request.args.get('months', 6, type=int)
+        return jsonify(collect_statistics(months, now=normalize_datetime_for_db(datetime.now())))
     except Exception as e:
         logger.error(f"Error in api_statistics: {e}")
         return jsonify({'error': '获取统计数据失败'}), 500
@@ -1032,9 +918,9 @@ def activity_registrations(id):
         ).all()
         
         # 统计报名状态
-        registered_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='registered')).scalar()
-        cancelled_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='cancelled')).scalar()
-        attended_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='attended')).scalar()
+        registered_count = activity.registered_count
+        cancelled_count = activity.cancelled_count
+        attended_count = activity.attended_count
         
         # 修复签到状态统计 - 确保报名统计准确性
         # 这里处理签到后的状态计数，让前端能正确显示
@@ -1736,67 +1622,18 @@ def api_statistics_ext():
             'data': [t[1] for t in tag_stats]
         }
         
-        # 积分分布
-        from src.models import StudentInfo
-        points_bins = [0, 10, 30, 50, 100, 200, 500, 1000]
-        bin_labels = [f'{points_bins[i]}-{points_bins[i+1]-1}' for i in range(len(points_bins)-1)] + [f'{points_bins[-1]}+']
-        bin_counts = [0] * len(bin_labels)  # 修正：使用bin_labels的长度
-        
-        student_info_stmt = db.select(StudentInfo)
-        students = db.session.execute(student_info_stmt).scalars().all()
-        
-        for stu in students:
-            points = stu.points or 0  # 处理None值
-            
-            # 检查最后一个区间（特殊情况）
-            if points >= points_bins[-1]:
-                bin_counts[-1] += 1
-                continue
-                
-            # 检查其他区间
-            for i in range(len(points_bins) - 1):
-                if points_bins[i] <= points < points_bins[i+1]:
-                    bin_counts[i] += 1
-                    break
-        
-        points_dist = {
-            'labels': bin_labels,
-            'data': bin_counts
-        }
+        # 积分分布 - 在数据库中分桶聚合，区间边界可通过?bins=0,10,30调整
+        from src.utils.statistics import points_distribution
+        points_dist = points_distribution(request.args.get('bins') or current_app.config.get('POINTS_DISTRIBUTION_BINS'))
         
         # 添加注册趋势数据（每日新注册用户数）
         try:
-            now = get_localized_now()
-            days_ago_30 = now - timedelta(days=30)
-            
-            registration_trend_stmt = db.select(
-                func.date(User.created_at).label('date'),
-                func.count(User.id).label('count')
-            ).filter(
-                User.created_at >= days_ago_30
-            ).group_by(
-                func.date(User.created_at)
-            )
-            
-            registration_trend = db.session.execute(registration_trend_stmt).all()
-            
-            # 将结果转换为前端可用的格式
-            reg_dates = [(days_ago_30 + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(31)]
-            reg_counts = [0] * 31
-            
-            for item in registration_trend:
-                date_str = item.date.strftime('%Y-%m-%d') if hasattr(item.date, 'strftime') else str(item.date)
-                try:
-                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                    day_diff = (date_obj - days_ago_30).days
-                    if 0 <= day_diff < 31:
-                        reg_counts[day_diff] = item.count
-                except:
-                    pass
-            
+            from src.utils.daily_stats import daily_series
+            days_ago_30 = get_localized_now().date() - timedelta(days=30)
+            series = daily_series(days_ago_30, 31)
             registration_trend_data = {
-                'labels': reg_dates,
-                'data': reg_counts
+                'labels': series['labels'],
+                'data': series['new_users']
             }
         except Exception as e:
             logger.error(f"获取注册趋势数据失败: {e}")
@@ -1934,13 +1771,7 @@ def checkin_modal(id):
         logger.info(f"获取当前北京时间: {now}")
         
         # 获取报名人数
-        registration_count = Registration.query.filter(
-            Registration.activity_id == id,
-            db.or_(
-                Registration.status == 'registered',
-                Registration.status == 'attended'
-            )
-        ).count()
+        registration_count = activity.active_registration_count
         logger.info(f"获取报名人数: {registration_count}")
         
         # 获取签到人数
@@ -2320,6 +2151,7 @@ def reset_system():
         if reset_registrations:
             logger.info("删除报名记录")
             Registration.query.delete()
+            recount_registrations()
             db.session.commit()
             flash('所有报名记录已重置', 'success')
         
@@ -2514,6 +2346,9 @@ def create_notification():
             
             db.session.add(notification)
             db.session.commit()
+            invalidate_home_feed()
+            # 推送给所有在线用户
+            notification_hub.publish('notification', notification_event_data(notification))
             
             log_action('create_notification', f'创建通知: {title}')
             flash('通知创建成功', 'success')
@@ -2564,6 +2399,7 @@ def edit_notification(id):
             notification.is_important = is_important
             
             db.session.commit()
+            invalidate_home_feed()
             
             log_action('edit_notification', f'编辑通知: {title}')
             flash('通知更新成功', 'success')
@@ -2596,6 +2432,7 @@ def delete_notification(id):
         # 删除通知
         db.session.delete(notification)
         db.session.commit()
+        invalidate_home_feed()
         
         log_action(
             action='delete_notification', 
@@ -2716,6 +2553,7 @@ def create_message():
                 
                 db.session.add(message)
                 db.session.commit()
+                publish_unread_messages(receiver.id)
                 
                 log_action('send_message', f'发送消息给 {receiver.username}: {subject}')
                 flash('消息发送成功', 'success')
@@ -2761,6 +2599,7 @@ def view_message(id):
         if message.receiver_id == current_user.id and not message.is_read:
             message.is_read = True
             db.session.commit()
+            publish_unread_messages(current_user.id)
             
         # 导入display_datetime
         from src.utils.time_helpers import display_datetime
@@ -3016,6 +2855,7 @@ def change_activity_status(id):
             activity.completed_at = datetime.now(pytz.utc)
             
         db.session.commit()
+        invalidate_home_feed()
         
         # 获取状态的中文名称
         status_names = {
@@ -3338,18 +3178,9 @@ def activity_view(id):
         # 获取活动详情
         activity = db.get_or_404(Activity, id)
         
-        # 获取报名统计
-        registrations_count = db.session.execute(
-            db.select(func.count()).select_from(Registration).filter_by(activity_id=id)
-        ).scalar()
-        
-        # 获取签到统计
-        checkins_count = db.session.execute(
-            db.select(func.count()).select_from(Registration).filter_by(
-                activity_id=id, 
-                status='attended'
-            )
-        ).scalar()
+        # 获取报名统计和签到统计（读取活动上的计数器）
+        registrations_count = activity.total_registration_count
+        checkins_count = activity.attended_count
         
         # 获取报名学生列表
         registrations = Registration.query.filter_by(
@@ -3405,6 +3236,7 @@ def delete_activity(id):
             # 删除活动
             db.session.delete(activity)
             db.session.commit()
+            invalidate_home_feed()
             
             # 记录操作
             log_action('force_delete_activity', f'永久删除活动: {activity.title}')
@@ -3414,6 +3246,7 @@ def delete_activity(id):
             # 软删除（标记为已取消）
             activity.status = 'cancelled'
             db.session.commit()
+            invalidate_home_feed()
             
             # 记录操作
             log_action('cancel_activity', f'取消活动: {activity.title}')
@@ -3453,6 +3286,32 @@ def api_database_status():
             'backup_configured': False
         }), 500
 
+@admin_bp.route('/api/database-drift')
+@login_required
+@admin_required
+def api_database_drift():
+    """逐表比较主数据库和备份数据库（行数和指纹）API"""
+    try:
+        from src.db_sync import DatabaseSyncer
+
+        tables = DatabaseSyncer().compare_table_fingerprints()
+        if tables is None:
+            return jsonify({
+                'success': False,
+                'message': '双数据库未配置或连接失败'
+            }), 400
+        return jsonify({
+            'success': True,
+            'tables': tables
+        })
+
+    except Exception as e:
+        logger.error(f"比较表差异失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @admin_bp.route('/api/sync-to-backup', methods=['POST'])
 @login_required
 @admin_required
@@ -2,7 +2,9 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from src import db
-from src.models import User, Role, StudentInfo, Tag, AIUserPreferences, SystemLog
+from src.models import User, Role, StudentInfo, Tag, AIUserPreferences
+from src.utils.audit_log import audit_log
+from src.utils.bootstrap_state import mark_admin_created
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, SelectField, ValidationError
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Regexp
@@ -202,20 +204,13 @@ def login():
                 # 记录登录成功日志
                 logger.info(f"登录成功: 用户名={username}, 用户ID={user.id}")
                 
-                # 添加系统日志
-                log = SystemLog(
-                    user_id=user.id,
-                    action="用户登录",
+                # 添加系统日志（后台批量写入，不影响登录流程）
+                audit_log.log(
+                    "用户登录",
                     details=f"用户 {username} 登录成功",
+                    user_id=user.id,
                     ip_address=request.remote_addr
                 )
-                db.session.add(log)
-                # 安全提交：失败时回滚并不中断登录流程
-                try:
-                    db.session.commit()
-                except Exception as e:
-                    logger.error(f"记录系统日志失败，已回滚: {e}", exc_info=True)
-                    db.session.rollback()
                 
                 # 检查next参数是否安全，避免重定向循环
                 next_page = request.form.get('next')
@@ -313,6 +308,7 @@ def setup_admin():
         )
         db.session.add(admin)
         db.session.commit()
+        mark_admin_created()
         
         flash('管理员账户创建成功！请登录。', 'success')
         return redirect(url_for('auth.login'))
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, flash, redirect, url_for, render_template, current_app, abort
 from flask_login import login_required, current_user
-from src.models import db, Activity, ActivityCheckin, Registration, StudentInfo, PointsHistory, User
+from src.models import db, Activity, ActivityCheckin, Registration, StudentInfo, PointsHistory, User, reserve_registration_seat
 from datetime import datetime, timezone, timedelta
 import logging
 from src.utils.time_helpers import get_localized_now, localize_time, ensure_timezone_aware, normalize_datetime_for_db
@@ -210,22 +210,17 @@ def register_activity(activity_id):
             flash('您已经报名了此活动', 'info')
             return redirect(url_for('main.activity_detail', activity_id=activity_id))
         
-        # 检查活动人数限制
-        if activity.max_participants > 0:
-            count_stmt = db.select(func.count()).select_from(Registration).filter_by(activity_id=activity_id)
-            current_count = db.session.execute(count_stmt).scalar()
-            
-            if current_count >= activity.max_participants:
-                flash('该活动报名人数已满', 'warning')
-                return redirect(url_for('main.activity_detail', activity_id=activity_id))
-        
-        # 创建报名记录
+        # 创建报名记录，原子地检查并占用名额，并发报名时不会超过人数上限
         registration = Registration(
             user_id=current_user.id,
             activity_id=activity_id,
             status='registered',
             register_time=datetime.now(timezone.utc)
         )
+        if not reserve_registration_seat(activity, registration):
+            db.session.rollback()
+            flash('该活动报名人数已满', 'warning')
+            return redirect(url_for('main.activity_detail', activity_id=activity_id))
         
         db.session.add(registration)
         db.session.commit()
@@ -11,6 +11,7 @@ from flask_wtf.csrf import CSRFProtect, generate_csrf
 from src.models import db, User, Role
 from src.routes.utils import log_action
 from src.utils.time_helpers import get_localized_now
+from src.utils.http_client import http_client
 import logging
 
 # 配置日志
@@ -229,7 +230,7 @@ def gemini_api():
         
         try:
             # 添加超时参数，避免长时间等待
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = http_client.post(url, json=payload, headers=headers, timeout=30)
             
             # 记录响应状态
             current_app.logger.info(f"AI API响应状态码：{response.status_code}")
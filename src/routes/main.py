@@ -13,6 +13,7 @@ import pytz
 from flask_wtf import FlaskForm
 import os
 from src.utils import get_compatible_paginate
+from src.utils.bootstrap_state import admin_exists
 
 logger = logging.getLogger(__name__)
 
@@ -32,120 +33,31 @@ def demo_loading():
 @main_bp.route('/')
 def index():
     try:
-        # 检查是否存在管理员账户，如果没有则重定向到设置页面
-        admin_role = db.session.execute(db.select(Role).filter_by(name='Admin')).scalar_one_or_none()
-        if admin_role:
-            admin_exists = db.session.execute(db.select(User).filter_by(role_id=admin_role.id)).scalar_one_or_none()
-            if not admin_exists:
-                return redirect(url_for('auth.setup_admin'))
-        else:
+        # 检查是否存在管理员账户，如果没有则重定向到设置页面（系统初始化后不再查询数据库）
+        if not admin_exists():
             return redirect(url_for('auth.setup_admin'))
         
         # 获取当前北京时间
         now = get_localized_now()
-        logger.info(f"当前北京时间: {now}")
-        
-        # 获取静态文件目录
-        static_folder = current_app.static_folder
-        logger.info(f"静态文件目录: {static_folder}")
+        logger.debug(f"当前北京时间: {now}")
         
-        # 获取公共通知
+        # 首页数据对所有访客相同，从快照缓存读取，活动或通知变更时失效
+        from src.utils.home_feed import get_home_feed
         try:
-            public_notifications = Notification.query.filter(
-                Notification.is_public == True,
-                or_(
-                    Notification.expiry_date == None,
-                    Notification.expiry_date > now
-                )
-            ).order_by(Notification.is_important.desc(), Notification.created_at.desc()).limit(3).all()
-            logger.info(f"获取到{len(public_notifications)}条公共通知")
+            feed = get_home_feed(now)
+            featured_activities = feed.featured_activities
+            latest_activities = feed.latest_activities
+            upcoming_activities = feed.upcoming_activities
+            popular_activities = feed.popular_activities
+            public_notifications = feed.public_notifications
         except Exception as e:
-            logger.error(f"获取公共通知出错: {e}")
-            public_notifications = []
-        
-        # 获取特色活动
-        try:
-            featured_activities = Activity.query.filter(
-                Activity.is_featured == True,
-                Activity.status == 'active'
-            ).order_by(Activity.created_at.desc()).limit(3).all()
-        except Exception as e:
-            logger.error(f"获取特色活动出错: {e}")
+            logger.error(f"获取首页数据出错: {e}")
+            db.session.rollback()
             featured_activities = []
-        
-        # 记录特色活动信息
-        for i, activity in enumerate(featured_activities, 1):
-            logger.info(f"特色活动 {i}: ID={activity.id}, 标题={activity.title}, 海报={activity.poster_image}")
-            
-            # 检查海报文件是否存在
-            if activity.poster_image:
-                poster_path = os.path.join(static_folder, 'uploads', 'posters', activity.poster_image)
-                if os.path.exists(poster_path):
-                    logger.info(f"  海报文件存在: {poster_path}")
-                else:
-                    logger.info(f"  海报文件不存在: {poster_path}")
-                    
-                    # 尝试查找匹配的海报文件
-                    if static_folder:  # 确保static_folder不为None
-                        poster_dir = os.path.join(static_folder, 'uploads', 'posters')
-                        if os.path.exists(poster_dir):
-                            matching_files = [f for f in os.listdir(poster_dir) if f.startswith(f"activity_{activity.id}_")]
-                            if matching_files:
-                                logger.info(f"  找到匹配的海报文件: {matching_files[0]}")
-                                activity.poster_image = matching_files[0]
-                    
-                    # 如果仍然没有找到海报，设置默认图片
-                    poster_path = os.path.join(static_folder, 'uploads', 'posters', activity.poster_image) if static_folder and activity.poster_image else ""
-                    if not os.path.exists(poster_path):
-                        logger.info(f"设置活动详情页备用风景图: landscape.jpg")
-        
-        # 获取最新活动
-        try:
-            latest_activities = Activity.query.filter_by(
-                status='active'
-            ).order_by(Activity.created_at.desc()).limit(6).all()
-        except Exception as e:
-            logger.error(f"获取最新活动出错: {e}")
             latest_activities = []
-            
-        # 获取即将开始的活动
-        try:
-            upcoming_activities = Activity.query.filter(
-                Activity.status == 'active',
-                Activity.start_time > now
-            ).order_by(Activity.start_time.asc()).limit(3).all()
-        except Exception as e:
-            logger.error(f"获取即将开始的活动出错: {e}")
             upcoming_activities = []
-            
-        # 获取热门活动（按报名人数排序）
-        try:
-            # 使用子查询计算每个活动的报名人数
-            reg_count_subq = db.session.query(
-                Registration.activity_id,
-                func.count(Registration.id).label('reg_count')
-            ).filter(
-                Registration.status.in_(['registered', 'attended'])
-            ).group_by(Registration.activity_id).subquery()
-        
-            # 查询活动并按报名人数排序
-            popular_activities = db.session.query(Activity).join(
-                reg_count_subq,
-                Activity.id == reg_count_subq.c.activity_id,
-                isouter=True
-            ).filter(
-                Activity.status == 'active'
-            ).order_by(
-                reg_count_subq.c.reg_count.desc().nullslast()
-            ).limit(3).all()
-        except Exception as e:
-            logger.error(f"获取热门活动出错: {e}")
             popular_activities = []
-        
-        # 检查活动是否有二进制海报数据
-        for activity in featured_activities + latest_activities:
-            if hasattr(activity, 'poster_data') and activity.poster_data:
-                logger.info(f"活动ID={activity.id}在数据库中有二进制海报数据，大小: {len(activity.poster_data)} 字节")
+            public_notifications = []
         
         # 渲染模板
         return render_template('main/index.html',
@@ -169,90 +81,44 @@ def index():
                               display_datetime=display_datetime)
 
 # 辅助函数：处理活动海报
-def process_activity_poster(activity, static_folder):
+def process_activity_poster(activity, static_folder=None):
     """处理活动海报，确保使用最新的海报文件
     
+    海报文件通过启动时建立的内存索引解析，热路径上不访问文件系统。
+    
     Args:
         activity: 活动对象
-        static_folder: 静态文件目录
+        static_folder: 静态文件目录（保留参数以兼容旧调用）
     """
     try:
         # 检查是否有海报
         if activity.poster_image is None or str(activity.poster_image).strip() == '':
-            logger.info(f"活动ID={activity.id}没有海报图片，设置默认图片")
+            logger.debug(f"活动ID={activity.id}没有海报图片，设置默认图片")
             setattr(activity, 'poster_image', "landscape.jpg")
             return
             
-        # 检查数据库中是否有二进制海报数据
-        if hasattr(activity, 'poster_data') and activity.poster_data:
-            logger.info(f"活动ID={activity.id}在数据库中有二进制海报数据，大小: {len(activity.poster_data)} 字节")
+        # 检查数据库中是否有二进制海报数据（通过poster_size判断，避免加载二进制数据）
+        if activity.poster_size:
             # 如果有二进制数据，优先使用数据库中的图片
-            # 确保poster_image字段与文件名一致
             return
-            
-        # 检查文件是否存在
-        if static_folder:
-            poster_dir = os.path.join(static_folder, 'uploads', 'posters')
-            logger.info(f"检查海报目录: {poster_dir}")
-            
-            if os.path.exists(poster_dir):
-                # 查找以活动ID开头的任何海报文件
-                try:
-                    matching_files = [f for f in os.listdir(poster_dir) if f.startswith(f"activity_{activity.id}_")]
-                    logger.info(f"找到匹配活动ID={activity.id}的海报文件: {matching_files}")
-                    
-                    if matching_files:
-                        # 使用最新的匹配文件 - 按时间戳排序
-                        matching_files.sort(reverse=True)  # 按文件名降序排序，通常最新的时间戳在最前面
-                        new_poster = matching_files[0]
-                        logger.info(f"选择最新的海报文件: {new_poster}")
-                        
-                        # 检查是否需要更新活动的海报文件名
-                        if new_poster != activity.poster_image:
-                            logger.info(f"更新活动ID={activity.id}的海报: {activity.poster_image} -> {new_poster}")
-                            setattr(activity, 'poster_image', new_poster)
-                        
-                        poster_path = os.path.join(poster_dir, new_poster)
-                        if os.path.exists(poster_path):
-                            logger.info(f"海报文件存在: {poster_path}")
-                            # 尝试读取文件内容并更新数据库中的二进制数据
-                            try:
-                                if hasattr(activity, 'poster_data') and not activity.poster_data:
-                                    with open(poster_path, 'rb') as f:
-                                        binary_data = f.read()
-                                        setattr(activity, 'poster_data', binary_data)
-                                        logger.info(f"已从文件读取海报数据并更新到数据库，大小: {len(binary_data)} 字节")
-                            except Exception as e:
-                                logger.warning(f"读取海报文件失败: {e}")
-                            return
-                except Exception as e:
-                    logger.error(f"处理匹配海报文件时出错: {e}")
-                
-                # 如果没有找到匹配的文件或文件不存在，检查指定的海报是否存在
-                if activity.poster_image:
-                    poster_path = os.path.join(poster_dir, str(activity.poster_image))
-                    if os.path.exists(poster_path):
-                        logger.info(f"使用指定海报文件: {activity.poster_image}")
-                        return
-                    else:
-                        logger.warning(f"海报文件不存在: {poster_path}")
-                        setattr(activity, 'poster_image', "landscape.jpg")
-                        logger.info(f"设置活动详情页备用风景图: landscape.jpg")
-                else:
-                    setattr(activity, 'poster_image', "landscape.jpg")
-                    logger.info(f"设置活动详情页备用风景图: landscape.jpg")
-            else:
-                logger.warning(f"海报目录不存在: {poster_dir}")
-                setattr(activity, 'poster_image', "landscape.jpg")
-                logger.info(f"海报目录不存在，设置备用风景图: landscape.jpg")
-        else:
-            logger.warning("静态文件目录未设置")
+        
+        from src.utils.poster_index import poster_index
+        
+        # 使用索引中该活动最新的海报文件（文件名带时间戳，最大者最新）
+        new_poster = poster_index.latest(activity.id)
+        if new_poster:
+            if new_poster != activity.poster_image:
+                logger.debug(f"更新活动ID={activity.id}的海报: {activity.poster_image} -> {new_poster}")
+                setattr(activity, 'poster_image', new_poster)
+            return
+        
+        # 没有匹配的文件时，检查指定的海报是否存在
+        if not poster_index.contains(str(activity.poster_image)):
+            logger.debug(f"海报文件不存在: {activity.poster_image}，设置备用风景图: landscape.jpg")
             setattr(activity, 'poster_image', "landscape.jpg")
-            logger.info("静态文件目录未设置，使用备用风景图")
     except Exception as e:
         logger.error(f"处理活动海报出错: {e}")
         setattr(activity, 'poster_image', "landscape.jpg")
-        logger.info(f"处理出错，设置备用风景图: landscape.jpg")
 
 @main_bp.route('/activities')
 def activities():
@@ -362,9 +228,6 @@ def activity_detail(activity_id):
         try:
             static_folder = current_app.static_folder
             process_activity_poster(activity, static_folder)
-            poster_image = str(activity.poster_image) if activity.poster_image else "landscape.jpg"
-            if static_folder:
-                logger.info(f"检查活动海报路径: {os.path.join(static_folder, 'uploads', 'posters', poster_image)}")
         except Exception as e:
             logger.error(f"处理活动海报时出错: {e}")
             setattr(activity, 'poster_image', "landscape.jpg")
@@ -374,8 +237,7 @@ def activity_detail(activity_id):
         form = FlaskForm()
         
         # 获取报名人数
-        reg_stmt = db.select(func.count()).select_from(Registration).filter_by(activity_id=activity_id)
-        registration_count = db.session.execute(reg_stmt).scalar()
+        registration_count = activity.total_registration_count
         logger.info(f"活动ID={activity_id} 的报名人数: {registration_count}")
         
         # 检查当前用户是否已报名
@@ -545,31 +407,91 @@ def clear_ai_chat_history():
 
 @main_bp.route('/poster/<int:activity_id>')
 def poster_image(activity_id):
-    """直接从数据库获取海报图片"""
+    """直接从数据库获取海报图片
+    
+    支持?w=宽度参数，返回对应尺寸的缩略图变体（WebP/JPEG），不带参数时返回原图。
+    以海报内容哈希作为强ETag，条件请求命中时直接返回304，不读取海报二进制数据；
+    URL中的?v=版本号与当前海报一致时允许浏览器长期缓存。
+    """
     try:
         from src.models import Activity
         
-        # 获取活动信息
+        # 获取活动信息（poster_data为延迟加载列，此时尚未读取二进制数据）
         activity = db.get_or_404(Activity, activity_id)
         
         # 检查活动是否有图片数据
-        if not activity.poster_data:
+        if not activity.poster_size:
             # 如果没有图片数据，重定向到默认图片
             return redirect(url_for('static', filename='img/landscape.jpg'))
         
-        # 获取MIME类型，默认为image/png
-        mime_type = activity.poster_mimetype or 'image/png'
+        # 旧数据没有内容哈希时，读取一次二进制数据补齐
+        if not activity.poster_hash:
+            activity.set_poster(activity.poster_image, activity.poster_data, activity.poster_mimetype)
+            try:
+                db.session.commit()
+                logger.info(f"已为活动ID={activity_id}补齐海报内容哈希")
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"保存海报内容哈希失败: {e}")
+        
+        # 请求了指定宽度时返回缩略图变体
+        requested_width = request.args.get('w', type=int)
+        variant = None
+        if requested_width and requested_width > 0:
+            from src.utils.poster_images import pick_variant_width, choose_variant_format
+            variant = (pick_variant_width(requested_width), choose_variant_format(request.headers.get('Accept')))
+        
+        etag = activity.poster_hash
+        if variant:
+            etag = f"{activity.poster_hash}-w{variant[0]}.{variant[1]}"
+        
+        # 带版本号的URL内容不会变化，可以长期缓存；否则缓存1小时后通过ETag重新验证
+        if request.args.get('v') == activity.poster_version:
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = 'public, max-age=3600'
         
-        # 返回图片数据
-        response = make_response(activity.poster_data)
-        response.headers.set('Content-Type', mime_type)
-        response.headers.set('Cache-Control', 'public, max-age=3600')  # 缓存1小时
+        # 条件请求：ETag一致时直接返回304，不读取海报二进制数据
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(_load_poster_bytes(activity, variant))
+        
+        response.set_etag(etag)
+        response.headers.set('Cache-Control', cache_control)
+        if variant:
+            response.headers.add('Vary', 'Accept')
         return response
     except Exception as e:
         logger.error(f"获取活动海报时出错: {e}")
         # 重定向到默认图片
         return redirect(url_for('static', filename='img/landscape.jpg'))
 
+def _load_poster_bytes(activity, variant):
+    """读取海报内容，变体优先从派生缓存读取，未命中时才加载poster_data
+    
+    Args:
+        activity: 活动对象
+        variant: (宽度, 格式) 元组，为None时返回原图
+    
+    Returns:
+        tuple: (图片数据, 状态码, 响应头)
+    """
+    mime_type = activity.poster_mimetype or 'image/png'
+    if variant:
+        from src.utils.poster_images import find_cached_variant, get_poster_variant
+        width, fmt = variant
+        try:
+            cached = find_cached_variant(activity.poster_hash, width, fmt)
+            if cached:
+                image_data, variant_mime_type = cached
+            else:
+                image_data, variant_mime_type = get_poster_variant(activity.poster_data, width, fmt, activity.poster_hash)
+            return image_data, 200, {'Content-Type': variant_mime_type}
+        except Exception as e:
+            logger.warning(f"生成活动ID={activity.id}的海报变体失败，返回原图: {e}")
+    return activity.poster_data, 200, {'Content-Type': mime_type}
+
 @main_bp.route('/tencent5668923388243771053.txt')
 def tencent_verification():
     """处理腾讯站长验证文件请求"""
@@ -1,12 +1,16 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, abort, session, Response
 from flask_login import login_required, current_user
-from src.models import db, Activity, Registration, User, StudentInfo, PointsHistory, ActivityReview, Tag, Message, Notification, NotificationRead, Role
+from src.models import db, Activity, Registration, User, StudentInfo, PointsHistory, ActivityReview, Tag, Message, Notification, NotificationRead, Role, recount_registrations, reserve_registration_seat
 from datetime import datetime, timedelta
 import logging
 import json
+import time
 from functools import wraps
 from src.routes.utils import log_action, random_string
+from src.utils.notification_hub import notification_hub, format_sse, notification_event_data, count_unread_messages, publish_unread_messages, stream_connection_limit
+from src.utils.unread_counters import get_unread_counts, unread_notification_filters, correct_unread_notifications
 from sqlalchemy import func, desc, or_, and_, not_
+from sqlalchemy.exc import IntegrityError
 from wtforms import StringField, TextAreaField, IntegerField, SelectField, SubmitField, RadioField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Length, Optional, NumberRange, Email, Regexp
 from flask_wtf import FlaskForm
@@ -224,8 +228,9 @@ def activity_detail(id):
         has_registered = registration is not None and registration.status in ['registered', 'attended']
         has_checked_in = registration.check_in_time is not None if registration else False
 
-        registered_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='registered')).scalar() or 0
-        checked_in_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='attended')).scalar() or 0
+        # 报名人数直接读取活动上的计数器
+        registered_count = activity.registered_count or 0
+        checked_in_count = activity.attended_count or 0
         total_registered = registered_count + checked_in_count
 
         can_register = (
@@ -322,31 +327,29 @@ def register_activity(id):
         if activity.registration_deadline and safe_less_than(activity.registration_deadline, now):
             return jsonify({'success': False, 'message': '该活动已过报名截止时间'})
 
-        if activity.max_participants > 0:
-            reg_count = db.session.execute(db.select(func.count()).select_from(Registration).filter_by(activity_id=id, status='registered')).scalar() or 0
-            if reg_count >= activity.max_participants:
-                return jsonify({'success': False, 'message': '该活动报名人数已满'})
-
         existing_reg = db.session.execute(db.select(Registration).filter_by(user_id=current_user.id, activity_id=id)).scalar_one_or_none()
+        if existing_reg and existing_reg.status in ('registered', 'attended'):
+            return jsonify({'success': False, 'message': '您已报名此活动'})
+
+        # 原子地检查并占用名额，并发报名时不会超过人数上限
+        registration = existing_reg or Registration(user_id=current_user.id, activity_id=id)
+        if not reserve_registration_seat(activity, registration):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '该活动报名人数已满'})
+
+        registration.register_time = now
         if existing_reg:
-            if existing_reg.status == 'registered':
-                return jsonify({'success': False, 'message': '您已报名此活动'})
-            elif existing_reg.status == 'cancelled':
-                existing_reg.status = 'registered'
-                existing_reg.register_time = now
-                db.session.commit()
-                return jsonify({'success': True, 'message': '已成功重新报名活动'})
+            db.session.commit()
+            return jsonify({'success': True, 'message': '已成功重新报名活动'})
 
-        new_registration = Registration(
-            user_id=current_user.id,
-            activity_id=id,
-            register_time=now,
-            status='registered'
-        )
-        db.session.add(new_registration)
+        db.session.add(registration)
         db.session.commit()
 
         return jsonify({'success': True, 'message': '报名成功！'})
+    except IntegrityError:
+        # 同一用户并发提交的重复报名被唯一约束拦截，回滚时已占用的名额一并释放
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '您已报名此活动'})
     except Exception as e:
         logger.error(f"Error in register activity: {e}")
         db.session.rollback()
@@ -576,8 +579,11 @@ def delete_account():
         
         user_id = current_user.id
         
-        # 删除关联的报名记录
+        # 删除关联的报名记录（批量删除绕过ORM事件，需要重新计算相关活动的报名计数器）
+        affected_activity_ids = db.session.execute(db.select(Registration.activity_id).filter_by(user_id=user_id)).scalars().all()
         Registration.query.filter_by(user_id=user_id).delete()
+        if affected_activity_ids:
+            recount_registrations(affected_activity_ids)
         
         # 删除学生信息
         StudentInfo.query.filter_by(user_id=user_id).delete()
@@ -1013,6 +1019,7 @@ def view_message(id):
             logger.info(f"标记消息 {id} 为已读")
             message.is_read = True
             db.session.commit()
+            publish_unread_messages(current_user.id)
         
         # 预加载发送者和接收者信息，避免在模板中引发懒加载
         sender = db.session.get(User, message.sender_id) if message.sender_id else None
@@ -1081,6 +1088,7 @@ def create_message():
             
             db.session.add(message)
             db.session.commit()
+            publish_unread_messages(admin_user.id)
             
             log_action('send_message', f'发送消息给管理员: {subject}')
             flash('消息发送成功', 'success')
@@ -1196,51 +1204,98 @@ def mark_notification_read(id):
             )
             db.session.add(read_record)
             db.session.commit()
+            # 同一用户的其他页面移除该通知横幅
+            notification_hub.publish('notification_read', {'id': id}, user_ids=[current_user.id])
         
         return jsonify({'success': True})
     except Exception as e:
         logger.error(f"Error in mark_notification_read: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _unread_important_notifications(user_id):
+    """用户未读且未过期的重要通知（通知横幅使用的格式）"""
+    # 计数器为0时不再查询通知表
+    expected = get_unread_counts(user_id)['notifications']
+    if not expected:
+        return []
+    
+    # 获取未读的重要通知
+    important_notifications = db.session.execute(
+        db.select(Notification).filter(*unread_notification_filters(user_id))
+        .order_by(Notification.created_at.desc())
+    ).scalars().all()
+    
+    # 有通知过期后计数偏大，根据源表重新计算
+    if len(important_notifications) != expected:
+        correct_unread_notifications(user_id)
+    
+    return [notification_event_data(notification) for notification in important_notifications]
+
 @student_bp.route('/api/notifications/unread')
 @student_required
 def get_unread_notifications():
     try:
-        # 获取当前时间，确保带有时区信息
-        now = ensure_timezone_aware(datetime.now())
-        
-        # 获取未读的重要通知
-        important_notifications = Notification.query.filter(
-            Notification.is_important == True,
-            or_(
-                Notification.expiry_date == None,
-                Notification.expiry_date >= now
-            ),
-            ~Notification.id.in_(
-                db.session.query(NotificationRead.notification_id).filter(
-                    NotificationRead.user_id == current_user.id
-                )
-            )
-        ).order_by(Notification.created_at.desc()).all()
-        
-        # 格式化通知数据
-        notifications_data = []
-        for notification in important_notifications:
-            notifications_data.append({
-                'id': notification.id,
-                'title': notification.title,
-                'content': notification.content,
-                'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M')
-            })
-        
         return jsonify({
             'success': True,
-            'notifications': notifications_data
+            'notifications': _unread_important_notifications(current_user.id)
         })
     except Exception as e:
         logger.error(f"Error in get_unread_notifications: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@student_bp.route('/api/notifications/stream')
+@login_required
+def notification_stream():
+    """SSE推送：连接时发送一次未读快照，之后只推送新事件，空闲时不查询数据库"""
+    # 通知横幅和消息徽章只对学生显示；204会让浏览器停止重连
+    if not current_user.role or current_user.role.name != 'Student':
+        return Response(status=204)
+    
+    user_id = current_user.id
+    # 线程工作进程不提供推送，连接数已满时同样不保持连接：发送fallback事件后结束，页面改为轮询
+    limit = stream_connection_limit(current_app.config)
+    subscription = notification_hub.subscribe(user_id, limit=limit) if limit > 0 else None
+    if subscription is None:
+        return Response(format_sse('fallback', {'poll': True}), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    
+    try:
+        snapshot = {
+            'notifications': _unread_important_notifications(user_id),
+            'message_count': count_unread_messages(user_id)
+        }
+    except Exception as e:
+        subscription.close()
+        logger.error(f"Error in notification_stream: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    stream_timeout = current_app.config.get('NOTIFICATION_STREAM_TIMEOUT', 300)
+    heartbeat = current_app.config.get('NOTIFICATION_STREAM_HEARTBEAT', 15)
+    
+    def generate():
+        try:
+            # 连接到达最长时间后结束，浏览器按retry间隔自动重连
+            yield 'retry: 5000\n\n'
+            yield format_sse('snapshot', snapshot)
+            deadline = time.monotonic() + stream_timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                item = subscription.get(timeout=min(heartbeat, remaining))
+                if item is None:
+                    yield ': ping\n\n'
+                    continue
+                event, data = item
+                yield format_sse(event, data)
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @student_bp.route('/api/messages/unread_count')
 @login_required
 def unread_message_count():
@@ -1253,11 +1308,7 @@ def unread_message_count():
         if hasattr(current_user, 'role') and current_user.role and current_user.role.name == 'Admin':
             return jsonify({'success': True, 'count': 0})
 
-        count = db.session.query(func.count(Message.id)).filter(
-            Message.receiver_id == current_user.id,
-            Message.is_read == False
-        ).scalar()
-        return jsonify({'success': True, 'count': count or 0})
+        return jsonify({'success': True, 'count': count_unread_messages(current_user.id)})
     except Exception as e:
         logger.error(f"Error getting unread message count: {e}")
         return jsonify({'success': False, 'count': 0, 'error': str(e)}), 500
@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 from sqlalchemy import func
 from src.models import db, Activity, Tag, StudentInfo, SystemLog, Registration, AIChatHistory, AIChatSession, activity_tags, PointsHistory, User, Role, Message
 from src.utils.time_helpers import get_beijing_time, ensure_timezone_aware
+from src.utils.http_client import http_client
 from src import csrf # Import csrf
 
 utils_bp = Blueprint('utils', __name__)
@@ -91,33 +92,25 @@ def log_action(action, details=None, user_id=None):
         user_id: 用户ID，如果为None则使用当前登录用户ID
     """
     try:
-        from src.models import SystemLog, db
         import datetime
+        from src.utils.audit_log import audit_log
         from src.utils.time_helpers import ensure_timezone_aware
         
         if user_id is None and current_user.is_authenticated:
             user_id = current_user.id
         
-        log = SystemLog(
-            user_id=user_id,
-            action=action,
+        # 日志进入队列由后台线程批量写入，不在请求中单独提交事务
+        audit_log.log(
+            action,
             details=details,
+            user_id=user_id,
             ip_address=request.remote_addr,
             created_at=ensure_timezone_aware(datetime.datetime.now())
         )
         
-        db.session.add(log)
-        try:
-            db.session.commit()
-        except Exception as e:
-            logger.error(f"记录系统日志失败，已回滚: {e}", exc_info=True)
-            db.session.rollback()
-            return
-        
         logger.info(f"Action logged: {action} by user {user_id}")
     except Exception as e:
         logger.error(f"Error logging action: {e}")
-        db.session.rollback()
 
 # API响应生成器
 def api_response(success, message, data=None, status_code=200):
@@ -399,33 +392,38 @@ def ai_chat():
     
     # 获取Flask应用实例的引用，避免上下文问题
     app = current_app._get_current_object()  # 获取实际的应用对象而不是代理
+    upstream_timeout = current_app.config.get('AI_CHAT_UPSTREAM_TIMEOUT', 30)
 
+    # 生成器在请求上下文结束后才执行，数据库连接已归还连接池；
+    # 等待上游模型输出时只占用一个协程（gevent）或线程（gthread），见gunicorn_config.py
     def generate():
         nonlocal current_user_id, current_message, current_session_id
         try:
-            logger.info(f"发送 AI 请求: URL={url}, Headers={headers}, Payload={payload}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30, stream=True)
+            logger.info(f"发送 AI 请求: URL={url}, 消息数={len(messages)}")
+            response = http_client.post(url, headers=headers, json=payload, timeout=upstream_timeout, stream=True)
             logger.info(f"AI API 响应状态码: {response.status_code}")
             response.raise_for_status()
             
             full_response = ""
             
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data = line[6:]  # 去掉 'data: ' 前缀
-                        if data == '[DONE]':
-                            break
-                        try:
-                            chunk = json.loads(data)
-                            if 'choices' in chunk and len(chunk['choices']) > 0:
-                                content = chunk['choices'][0].get('delta', {}).get('content', '')
-                                if content:
-                                    full_response += content
-                                    yield f"data: {json.dumps({'content': content})}\n\n"
-                        except json.JSONDecodeError:
-                            continue
+            # 读完或客户端断开时关闭响应，连接归还连接池
+            with response:
+                for line in response.iter_lines():
+                    if line:
+                        line = line.decode('utf-8')
+                        if line.startswith('data: '):
+                            data = line[6:]  # 去掉 'data: ' 前缀
+                            if data == '[DONE]':
+                                break
+                            try:
+                                chunk = json.loads(data)
+                                if 'choices' in chunk and len(chunk['choices']) > 0:
+                                    content = chunk['choices'][0].get('delta', {}).get('content', '')
+                                    if content:
+                                        full_response += content
+                                        yield f"data: {json.dumps({'content': content})}\n\n"
+                            except json.JSONDecodeError:
+                                continue
             
             # 响应结束，保存历史记录
             if current_session_id and full_response and current_user_id:
@@ -20,11 +20,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const userMenu = document.querySelector('.user-menu');
     
     if (userMenu) {
-        // 获取未读重要通知
-        fetchUnreadNotifications();
-
-        // 设置定时刷新（每10分钟，减少频率）
-        setInterval(fetchUnreadNotifications, 10 * 60 * 1000);
+        // 优先使用服务端推送（SSE），浏览器不支持或服务端不提供推送时退回定时轮询
+        if (!connectNotificationStream()) {
+            startNotificationPolling();
+        }
     }
     
     // 为所有通知关闭按钮添加事件监听
@@ -899,7 +898,87 @@ function updateRegistrationStatus(registrationId, newStatus) {
     });
 }
 
-// 通知系统
+// 通知推送
+// 连接建立时服务端发送一次未读快照，之后只推送新通知和未读消息数量；
+// 连接到达最长时间后由浏览器自动重连。未读消息数量通过unread-messages事件通知页面其他部分。
+let unreadNotificationIds = new Set();
+
+function connectNotificationStream() {
+    if (!window.EventSource) {
+        return false;
+    }
+
+    const stream = new EventSource('/student/api/notifications/stream');
+    window.notificationStreamActive = true;
+
+    stream.addEventListener('snapshot', function(e) {
+        const data = JSON.parse(e.data);
+        unreadNotificationIds = new Set(data.notifications.map(notification => notification.id));
+        updateNotificationBadge(unreadNotificationIds.size);
+        data.notifications.forEach((notification, index) => {
+            setTimeout(() => {
+                showNotificationBanner(notification);
+            }, index * 200);
+        });
+        dispatchUnreadMessages(data.message_count);
+    });
+
+    stream.addEventListener('notification', function(e) {
+        const notification = JSON.parse(e.data);
+        if (!notification.is_important || unreadNotificationIds.has(notification.id)) {
+            return;
+        }
+        unreadNotificationIds.add(notification.id);
+        updateNotificationBadge(unreadNotificationIds.size);
+        showNotificationBanner(notification);
+    });
+
+    stream.addEventListener('notification_read', function(e) {
+        const data = JSON.parse(e.data);
+        if (unreadNotificationIds.delete(data.id)) {
+            updateNotificationBadge(unreadNotificationIds.size);
+        }
+        const banner = document.querySelector(`.notification-banner[data-notification-id="${data.id}"]`);
+        if (banner) {
+            banner.remove();
+        }
+    });
+
+    stream.addEventListener('messages', function(e) {
+        dispatchUnreadMessages(JSON.parse(e.data).count);
+    });
+
+    stream.addEventListener('fallback', function() {
+        // 服务端不提供推送（线程工作进程或连接数已满），改为定时轮询
+        stream.close();
+        window.notificationStreamActive = false;
+        startNotificationPolling();
+        document.dispatchEvent(new CustomEvent('notification-stream-fallback'));
+    });
+
+    stream.addEventListener('error', function() {
+        // 服务端返回204（非学生账户）时浏览器不再重连
+        if (stream.readyState === EventSource.CLOSED) {
+            window.notificationStreamActive = false;
+        }
+    });
+
+    return true;
+}
+
+function startNotificationPolling() {
+    // 获取未读重要通知
+    fetchUnreadNotifications();
+
+    // 设置定时刷新（每10分钟，减少频率）
+    setInterval(fetchUnreadNotifications, 10 * 60 * 1000);
+}
+
+function dispatchUnreadMessages(count) {
+    document.dispatchEvent(new CustomEvent('unread-messages', { detail: { count: count } }));
+}
+
+// 通知系统（不支持推送时的轮询方式）
 // 请求去重和频率控制
 let isFetchingNotifications = false;
 let lastNotificationFetch = 0;
@@ -924,7 +1003,7 @@ function fetchUnreadNotifications() {
     isFetchingNotifications = true;
     lastNotificationFetch = now;
 
-    fetch('/api/notifications/unread')
+    fetch('/student/api/notifications/unread')
         .then(response => {
             if (response.status === 429) {
                 throw new Error('请求过于频繁，请稍后再试');
@@ -1092,7 +1171,7 @@ function removeNotificationBanner() {
 
 // 标记通知为已读
 function markNotificationAsRead(notificationId) {
-    fetch(`/notification/${notificationId}/mark_read`, {
+    fetch(`/student/notification/${notificationId}/mark_read`, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -0,0 +1,112 @@
+"""
+数据库同步的表调度
+根据 src/models 中SQLAlchemy元数据的外键推导表之间的依赖，被引用的表复制完成后才开始复制引用它的表，
+互不依赖的表由有限数量的工作线程并发复制（每个线程使用各自的数据库连接）
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger(__name__)
+
+# 并发复制的表数（同时占用的主库/备份库连接数）
+SYNC_WORKERS = int(os.environ.get('DB_SYNC_WORKERS', 4))
+
+
+def table_dependencies(table_names, metadata=None):
+    """返回 {表名: 需要先复制的表名集合}
+
+    只考虑 table_names 之间的外键，忽略自引用；不在元数据中的表没有依赖。
+
+    Args:
+        table_names: 要同步的表名（保持调度时的优先顺序）
+        metadata: SQLAlchemy MetaData，默认使用 src.models 注册的模型
+    """
+    if metadata is None:
+        from src import db
+        import src.models  # noqa: F401  确保所有模型已注册到元数据
+        metadata = db.metadata
+
+    names = list(table_names)
+    selected = set(names)
+    dependencies = {name: set() for name in names}
+    for name in names:
+        table = metadata.tables.get(name)
+        if table is None:
+            continue
+        for fk in table.foreign_keys:
+            parent = fk.target_fullname.split('.')[0]
+            if parent != name and parent in selected:
+                dependencies[name].add(parent)
+    return dependencies
+
+
+def sync_workers(*db_urls):
+    """并发复制的线程数；SQLite同一时间只能有一个写入者，只要涉及SQLite就串行执行"""
+    if any(url and url.startswith('sqlite') for url in db_urls):
+        return 1
+    return max(1, SYNC_WORKERS)
+
+
+class TableSyncScheduler:
+    """按外键依赖顺序并发执行每张表的同步函数"""
+
+    def __init__(self, dependencies, max_workers=None, deadline=None):
+        """
+        Args:
+            dependencies: table_dependencies 的返回值，字典顺序即就绪表的优先顺序
+            max_workers: 同时同步的表数
+            deadline: time.time() 截止时间，超过后不再开始新的表
+        """
+        self.dependencies = {name: set(parents) for name, parents in dependencies.items()}
+        self.max_workers = max(1, int(max_workers or SYNC_WORKERS))
+        self.deadline = deadline
+
+    def run(self, sync_table, on_start=None, on_finish=None):
+        """执行同步
+
+        被引用的表无论同步成功与否都视为完成，之后开始引用它的表（与逐表同步时出错继续处理后续表一致）。
+        on_start/on_finish 在调用 run 的线程中执行，可以安全地更新进度。
+
+        Args:
+            sync_table: sync_table(table_name)，在工作线程中执行
+            on_start: on_start(table_name)
+            on_finish: on_finish(table_name, result)，出错时 result 为异常对象
+
+        Returns:
+            dict: {表名: sync_table 的返回值或异常}，超时未开始的表不在其中
+        """
+        pending = list(self.dependencies)
+        done = set()
+        results = {}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='table-sync') as executor:
+            while pending or running:
+                if self.deadline is None or time.time() < self.deadline:
+                    ready = [name for name in pending if self.dependencies[name] <= done]
+                    if not ready and not running:
+                        # 循环依赖：按原顺序继续
+                        logger.warning(f"表之间存在循环外键依赖，按顺序同步: {', '.join(pending)}")
+                        ready = pending[:1]
+                    for name in ready[:self.max_workers - len(running)]:
+                        pending.remove(name)
+                        if on_start:
+                            on_start(name)
+                        running[executor.submit(sync_table, name)] = name
+                elif not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = e
+                    results[name] = result
+                    done.add(name)
+                    if on_finish:
+                        on_finish(name, result)
+        return results
@@ -0,0 +1,198 @@
+"""
+数据库同步的表指纹
+同步前比较主库和备份库同一张表的指纹（行数 + 按主键排序的哈希），一致时跳过该表：
+- INCREMENTAL_SYNC_TABLES 中有变更时间列的表只哈希主键和变更时间，其余表哈希整行；
+- 单列主键的表按主键分块（键集分页），每块算出一个摘要，再把各块摘要合并为整表摘要；
+- 两边都是PostgreSQL时每块的摘要在数据库中计算（md5(string_agg(...))），只传回摘要；
+  否则两边都分块读取到进程内计算，两种算法的结果不能互相比较，同一次比较总是使用同一种。
+"""
+import os
+import re
+import hashlib
+import logging
+from datetime import datetime, date
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# 计算指纹时每块的行数
+CHECKSUM_CHUNK_ROWS = int(os.environ.get('DB_SYNC_CHECKSUM_ROWS', 20000))
+# 同步前比较指纹、跳过未变化的表（设为0关闭）
+SKIP_UNCHANGED_TABLES = os.environ.get('DB_SYNC_SKIP_UNCHANGED', '1') != '0'
+
+_DATETIME_TEXT = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}')
+
+
+def fingerprint_columns(table_name, metadata=None):
+    """返回 (主键列列表, 变更时间列或None)，不在模型中的表返回 ([], None)"""
+    if metadata is None:
+        from src import db
+        import src.models  # noqa: F401  确保所有模型已注册到元数据
+        metadata = db.metadata
+    from src.models import INCREMENTAL_SYNC_TABLES
+
+    table = metadata.tables.get(table_name)
+    if table is None:
+        return [], None
+    pk_columns = [col.name for col in table.primary_key.columns]
+    change_column = INCREMENTAL_SYNC_TABLES.get(table_name)
+    if change_column is not None and change_column not in table.c:
+        change_column = None
+    return pk_columns, change_column
+
+
+def _canonical(value):
+    """进程内计算时把值转换为与数据库方言无关的文本
+
+    SQLite原生查询把时间和布尔值返回为字符串和整数，PostgreSQL返回datetime和bool，这里统一格式。
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, str) and _DATETIME_TEXT.match(value):
+        try:
+            return _canonical(datetime.fromisoformat(value))
+        except ValueError:
+            pass
+    return str(value)
+
+
+class TableFingerprint:
+    """计算一张表的指纹
+
+    用法:
+        fingerprint = TableFingerprint(conn, 'activities', ['id'], 'updated_at', in_database=True).compute()
+        # {'rows': 1024, 'digest': '...', 'basis': 'updated_at'}
+    """
+
+    def __init__(self, conn, table_name, pk_columns, change_column=None, in_database=False, chunk_rows=None):
+        """
+        Args:
+            conn: SQLAlchemy连接
+            pk_columns: 主键列，决定哈希的顺序
+            change_column: 变更时间列，有则只哈希主键和该列，否则哈希整行
+            in_database: 在数据库中计算每块的摘要（仅PostgreSQL）
+            chunk_rows: 每块的行数
+        """
+        self.conn = conn
+        self.table_name = table_name
+        self.pk_columns = list(pk_columns)
+        self.change_column = change_column
+        self.in_database = in_database
+        self.chunk_rows = max(1, chunk_rows or CHECKSUM_CHUNK_ROWS)
+
+    def compute(self):
+        if len(self.pk_columns) == 1:
+            chunks = self._sql_chunks() if self.in_database else self._python_chunks()
+        else:
+            # 复合主键只有关联表，数据量小，整表算作一块
+            chunks = [self._sql_whole_table() if self.in_database else self._python_whole_table()]
+
+        rows = 0
+        combined = hashlib.sha256()
+        for count, digest in chunks:
+            rows += count
+            combined.update(f'{count}:{digest or ""};'.encode())
+        return {'rows': rows, 'digest': combined.hexdigest(),
+                'basis': self.change_column or 'row'}
+
+    # PostgreSQL：在数据库中计算每块的摘要
+
+    def _row_expression(self, key):
+        if self.change_column:
+            return f"{key}::text || '|' || COALESCE(t.\"{self.change_column}\"::text, '')"
+        return 't::text'
+
+    def _sql_chunks(self):
+        pk = f't."{self.pk_columns[0]}"'
+        inner = f'SELECT {pk} AS k, {self._row_expression(pk)} AS r FROM "{self.table_name}" AS t'
+        after = None
+        while True:
+            where = f' WHERE {pk} > :after' if after is not None else ''
+            row = self.conn.execute(text(
+                'SELECT COUNT(*) AS row_count, MAX(k) AS last_key, '
+                "md5(string_agg(r, E'\\n' ORDER BY k)) AS digest "
+                f'FROM ({inner}{where} ORDER BY {pk} LIMIT :limit) AS chunk'
+            ), {'after': after, 'limit': self.chunk_rows}).one()
+            if not row.row_count:
+                return
+            yield row.row_count, row.digest
+            if row.row_count < self.chunk_rows:
+                return
+            after = row.last_key
+
+    def _sql_whole_table(self):
+        order = ', '.join(f't."{col}"' for col in self.pk_columns) or 't::text'
+        key = "concat_ws(',', {})".format(', '.join(f't."{col}"' for col in self.pk_columns) or "''")
+        row = self.conn.execute(text(
+            f"SELECT COUNT(*) AS row_count, md5(string_agg({self._row_expression(key)}, E'\\n' "
+            f'ORDER BY {order})) AS digest FROM "{self.table_name}" AS t'
+        )).one()
+        return row.row_count, row.digest
+
+    # 其他数据库：分块读取后在进程内计算
+
+    def _select_columns(self):
+        if self.change_column:
+            return ', '.join(f'"{col}"' for col in self.pk_columns + [self.change_column])
+        return '*'
+
+    @staticmethod
+    def _digest(rows):
+        md5 = hashlib.md5()
+        for row in rows:
+            md5.update('|'.join(_canonical(value) for value in row).encode())
+            md5.update(b'\n')
+        return md5.hexdigest()
+
+    def _python_chunks(self):
+        pk = self.pk_columns[0]
+        query = f'SELECT {self._select_columns()} FROM "{self.table_name}"'
+        after = None
+        while True:
+            where = f' WHERE "{pk}" > :after' if after is not None else ''
+            result = self.conn.execute(text(f'{query}{where} ORDER BY "{pk}" LIMIT :limit'),
+                                       {'after': after, 'limit': self.chunk_rows})
+            key_index = list(result.keys()).index(pk)
+            rows = result.fetchall()
+            if not rows:
+                return
+            yield len(rows), self._digest(rows)
+            if len(rows) < self.chunk_rows:
+                return
+            after = rows[-1][key_index]
+
+    def _python_whole_table(self):
+        order = ', '.join(f'"{col}"' for col in self.pk_columns) or '1'
+        rows = self.conn.execute(text(
+            f'SELECT {self._select_columns()} FROM "{self.table_name}" ORDER BY {order}'
+        )).fetchall()
+        if not self.pk_columns:
+            # 没有主键时按行文本排序，保证两边顺序一致
+            rows = sorted(rows, key=lambda row: [_canonical(value) for value in row])
+        return len(rows), self._digest(rows) if rows else None
+
+
+def compare_table(source_conn, target_conn, table_name, pk_columns=None, change_column=None):
+    """比较两边同一张表的指纹
+
+    Args:
+        pk_columns: 主键列，None时从模型元数据读取
+
+    Returns:
+        dict: {'in_sync': bool, 'source': 指纹, 'target': 指纹}
+    """
+    if pk_columns is None:
+        pk_columns, change_column = fingerprint_columns(table_name)
+    in_database = all(getattr(conn.dialect, 'name', '') == 'postgresql' for conn in (source_conn, target_conn))
+    source = TableFingerprint(source_conn, table_name, pk_columns, change_column, in_database).compute()
+    target = TableFingerprint(target_conn, table_name, pk_columns, change_column, in_database).compute()
+    return {'in_sync': source == target, 'source': source, 'target': target}
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统操作日志（system_logs）异步批量写入
+
+log_action和登录记录只把日志放入进程内的有界队列，由后台线程按批量大小或时间间隔
+一次INSERT多行并提交，请求处理过程中不再为日志单独提交事务。
+进程退出时（atexit）会写入队列中剩余的日志；队列已满时丢弃新日志并记录警告，不阻塞请求。
+"""
+
+import os
+import queue
+import atexit
+import logging
+import threading
+
+from src.utils.time_helpers import get_localized_now
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """缓冲系统日志并在后台线程中批量写入数据库"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.batch_size = 100
+        self.flush_interval = 2.0
+        self._queue = queue.Queue(maxsize=10000)
+        self._write_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._registered = False
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', 100)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', 2.0)
+        self._queue = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', 10000))
+        if not self._registered:
+            atexit.register(self.shutdown)
+            self._registered = True
+
+    def log(self, action, details=None, user_id=None, ip_address=None, created_at=None):
+        """将一条日志放入队列，立即返回
+
+        Returns:
+            bool: 是否成功入队，队列已满时返回False
+        """
+        entry = {
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'created_at': created_at or get_localized_now(),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"系统日志队列已满，已丢弃 {self.dropped} 条日志")
+            return False
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        # fork出的工作进程不会继承父进程的线程，按进程号判断是否需要重新启动
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._write_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _drain(self, batch=None):
+        """从队列中取出日志补足一批"""
+        batch = batch if batch is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        from src.models import db, SystemLog
+
+        with self._write_lock:
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(SystemLog.__table__.insert(), batch)
+            except Exception as e:
+                logger.error(f"批量写入系统日志失败，丢弃 {len(batch)} 条: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = self._drain([first])
+            # 未凑满一批时再等待一个间隔，合并短时间内的多条日志
+            if len(batch) < self.batch_size and not self._stop_event.wait(self.flush_interval):
+                self._drain(batch)
+            self._write(batch)
+
+    def flush(self):
+        """立即写入队列中的全部日志，并等待后台线程写完已取出的日志（进程退出和测试时调用）"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+        self._queue.join()
+
+    def shutdown(self):
+        """停止后台线程并写入剩余日志"""
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.flush_interval + 5)
+        self.flush()
+
+
+audit_log = AuditLogWriter()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+系统初始化状态
+
+首页需要判断系统是否已创建管理员账户，未创建时跳转到管理员设置页面。
+管理员账户一旦存在就不会再回到未初始化状态，因此这里只缓存"已初始化"：
+应用启动时检查一次，setup_admin 页面和 create-admin 命令创建管理员后直接置位，
+之后的检查无需查询数据库。尚未初始化时每次都重新查询，以便感知其他工作进程完成的设置。
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_admin_initialized = False
+
+
+def _query_admin_exists():
+    """查询数据库中是否存在管理员账户"""
+    from src.models import db, Role, User
+
+    admin_role = db.session.execute(db.select(Role).filter_by(name='Admin')).scalar_one_or_none()
+    if not admin_role:
+        return False
+    admin = db.session.execute(db.select(User.id).filter_by(role_id=admin_role.id).limit(1)).first()
+    return admin is not None
+
+
+def admin_exists():
+    """判断系统是否已创建管理员账户，已初始化后不再查询数据库"""
+    global _admin_initialized
+
+    if _admin_initialized:
+        return True
+    if _query_admin_exists():
+        _admin_initialized = True
+        logger.info("检测到管理员账户，系统已初始化")
+    return _admin_initialized
+
+
+def mark_admin_created():
+    """创建管理员账户后调用，标记系统已初始化"""
+    global _admin_initialized
+    _admin_initialized = True
+
+
+def reset_admin_state():
+    """清除已初始化标记，下次检查时重新查询数据库（用于重建数据库后）"""
+    global _admin_initialized
+    _admin_initialized = False
+
+
+def init_admin_state(app):
+    """应用启动时检查一次系统初始化状态"""
+    with app.app_context():
+        try:
+            reset_admin_state()
+            if admin_exists():
+                app.logger.info("系统已存在管理员账户")
+            else:
+                app.logger.info("系统尚未创建管理员账户，首页将跳转到管理员设置页面")
+        except Exception as e:
+            app.logger.warning(f"检查管理员账户失败: {e}")
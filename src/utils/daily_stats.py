@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+每日统计汇总（daily_stats）
+
+统计页面和统计接口只读取daily_stats表，不再在每次加载时对活动、报名、用户表做GROUP BY。
+汇总表通过三种方式维护：
+1. 写入钩子：通过ORM新增活动/报名/用户/积分记录或签到时，在同一事务中累加当天的计数（见src.models）；
+2. 定时任务：每隔DAILY_STATS_REFRESH_INTERVAL秒根据源表重新汇总最近DAILY_STATS_REFRESH_DAYS天，
+   修正删除记录、绕过ORM的写入等钩子无法感知的变化；
+3. 回填：flask backfill-daily-stats命令（或首次启动时汇总表为空）根据源表重建历史数据。
+
+日期按数据库中时间字段的日期（func.date）划分，与原先的分组统计口径一致；
+"今天"与统计页面、统计接口一样取get_localized_now()的日期。
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from src.utils.time_helpers import get_localized_now
+
+logger = logging.getLogger(__name__)
+
+# 回填时每批汇总的天数
+BACKFILL_CHUNK_DAYS = 366
+
+_scheduler_lock = threading.Lock()
+_scheduler_thread = None
+
+
+def _as_date(value):
+    """将func.date的结果（SQLite为字符串，PostgreSQL为date）统一转换为date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _executor(connection):
+    from src.models import db
+    return connection if connection is not None else db.session
+
+
+def _sources():
+    """各统计列的数据来源：(列名, 时间字段, 聚合表达式, 额外条件)"""
+    from src.models import Activity, Registration, User, PointsHistory
+
+    activities = Activity.__table__
+    registrations = Registration.__table__
+    users = User.__table__
+    points = PointsHistory.__table__
+    return (
+        ('activities_created', activities.c.created_at, func.count(), None),
+        ('registrations', registrations.c.register_time, func.count(), None),
+        ('new_users', users.c.created_at, func.count(), None),
+        ('checkins', registrations.c.check_in_time, func.count(), None),
+        ('points_awarded', points.c.created_at, func.sum(points.c.points), points.c.points > 0),
+    )
+
+
+def compute_daily_stats(start, end, connection=None):
+    """根据源表计算[start, end]每天的统计数据（每个统计列一次分组查询）
+
+    Returns:
+        dict: {date: {列名: 数量}}，只包含有数据的日期
+    """
+    executor = _executor(connection)
+    window_start = datetime.combine(start, datetime.min.time())
+    window_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    result = {}
+    for name, column, aggregate, condition in _sources():
+        day = func.date(column).label('day')
+        stmt = select(day, aggregate).where(column >= window_start, column < window_end)
+        if condition is not None:
+            stmt = stmt.where(condition)
+        for value, count in executor.execute(stmt.group_by(day)):
+            if value is None:
+                continue
+            result.setdefault(_as_date(value), {})[name] = int(count or 0)
+    return result
+
+
+def rollup_days(start, end, connection=None):
+    """根据源表重新汇总[start, end]每天的数据并覆盖写入daily_stats（需由调用方提交事务）
+
+    Returns:
+        int: 写入的天数
+    """
+    from src.models import DAILY_STATS_COLUMNS, daily_stats_upsert_statement
+
+    if end < start:
+        return 0
+    executor = _executor(connection)
+    computed = compute_daily_stats(start, end, connection)
+    updated_at = datetime.utcnow()
+    rows = []
+    day = start
+    while day <= end:
+        counts = computed.get(day, {})
+        row = {name: counts.get(name, 0) for name in DAILY_STATS_COLUMNS}
+        row.update(stat_date=day, updated_at=updated_at)
+        rows.append(row)
+        day += timedelta(days=1)
+
+    dialect_name = executor.get_bind().dialect.name if connection is None else connection.dialect.name
+    executor.execute(daily_stats_upsert_statement(dialect_name, accumulate=False), rows)
+    return len(rows)
+
+
+def refresh_recent_days(days=2, today=None, connection=None):
+    """重新汇总包括今天在内的最近days天（定时任务调用）"""
+    today = today or get_localized_now().date()
+    return rollup_days(today - timedelta(days=max(1, days) - 1), today, connection)
+
+
+def earliest_source_date(connection=None):
+    """源表中最早的日期，没有任何数据时返回None"""
+    executor = _executor(connection)
+    earliest = None
+    for _, column, _, _ in _sources():
+        value = executor.execute(select(func.min(column))).scalar()
+        if value is not None:
+            value = _as_date(value)
+            earliest = value if earliest is None else min(earliest, value)
+    return earliest
+
+
+def backfill_daily_stats(start=None, end=None, connection=None):
+    """根据源表重建daily_stats的历史数据，按BACKFILL_CHUNK_DAYS天分批汇总（需由调用方提交事务）
+
+    Args:
+        start: 起始日期，默认为源表中最早的日期
+        end: 结束日期，默认为今天
+
+    Returns:
+        int: 写入的天数
+    """
+    end = end or get_localized_now().date()
+    start = start or earliest_source_date(connection)
+    if start is None:
+        return 0
+    total = 0
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + timedelta(days=BACKFILL_CHUNK_DAYS - 1), end)
+        total += rollup_days(chunk_start, chunk_end, connection)
+        chunk_start = chunk_end + timedelta(days=1)
+    return total
+
+
+def ensure_daily_stats_backfilled(connection=None):
+    """汇总表为空而源表已有数据时（新建汇总表、从旧备份恢复后）回填全部历史"""
+    from src.models import DailyStats
+
+    executor = _executor(connection)
+    if executor.execute(select(DailyStats.__table__.c.stat_date).limit(1)).first() is not None:
+        return 0
+    return backfill_daily_stats(connection=connection)
+
+
+def daily_series(start, days):
+    """从daily_stats读取从start开始连续days天的统计数据（单次查询）
+
+    Returns:
+        dict: {'labels': ['2024-05-01', ...], 列名: [...], ...}，没有汇总行的日期按0计算
+    """
+    from src.models import db, DailyStats, DAILY_STATS_COLUMNS
+
+    end = start + timedelta(days=days - 1)
+    stmt = db.select(DailyStats).where(DailyStats.stat_date >= start, DailyStats.stat_date <= end)
+    rows = {row.stat_date: row for row in db.session.execute(stmt).scalars()}
+
+    labels = [(start + timedelta(days=i)) for i in range(days)]
+    series = {'labels': [day.strftime('%Y-%m-%d') for day in labels]}
+    for name in DAILY_STATS_COLUMNS:
+        series[name] = [getattr(rows[day], name) if day in rows else 0 for day in labels]
+    return series
+
+
+def monthly_totals(labels, window_start, columns):
+    """从daily_stats按月汇总指定列（单次查询）
+
+    Returns:
+        dict: {列名: 与labels一一对应的数量}
+    """
+    from src.models import db, DailyStats
+    from src.utils.statistics import month_key
+
+    key = month_key(DailyStats.stat_date).label('month')
+    stmt = select(key, *[func.sum(getattr(DailyStats, name)) for name in columns]).where(
+        DailyStats.stat_date >= window_start.date()
+    ).group_by(key)
+    totals = {row[0]: row[1:] for row in db.session.execute(stmt)}
+    return {
+        name: [int(totals[label][index] or 0) if label in totals else 0 for label in labels]
+        for index, name in enumerate(columns)
+    }
+
+
+def _scheduler_loop(app, interval, days, stop_event):
+    while not stop_event.wait(interval):
+        with app.app_context():
+            from src.models import db
+            try:
+                refresh_recent_days(days)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"定时汇总每日统计失败: {e}")
+            finally:
+                db.session.remove()
+
+
+def start_daily_stats_scheduler(app):
+    """启动定时汇总最近几天统计数据的后台线程（每个进程只启动一次）
+
+    DAILY_STATS_REFRESH_INTERVAL为0时不启动。重新汇总是幂等的，多个工作进程同时运行不会产生重复计数。
+
+    Returns:
+        threading.Event: 用于停止线程的事件，未启动时返回None
+    """
+    global _scheduler_thread
+
+    interval = app.config.get('DAILY_STATS_REFRESH_INTERVAL', 0)
+    if not interval or interval <= 0:
+        return None
+    days = app.config.get('DAILY_STATS_REFRESH_DAYS', 2)
+    with _scheduler_lock:
+        if _scheduler_thread is not None and _scheduler_thread.is_alive():
+            return _scheduler_thread.stop_event
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_scheduler_loop, args=(app, interval, days, stop_event),
+                                  name='daily-stats-rollup', daemon=True)
+        thread.stop_event = stop_event
+        thread.start()
+        _scheduler_thread = thread
+    logger.info(f"每日统计汇总定时任务已启动，每{interval}秒汇总最近{days}天")
+    return stop_event
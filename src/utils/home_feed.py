@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+首页数据快照
+
+首页的公共通知、特色活动、最新活动、即将开始的活动和热门活动对所有访客相同，
+这里将其预先计算为一份快照：进程内缓存一份，同时写入共享缓存供其他工作进程复用。
+管理员新建/编辑/删除活动或通知、修改活动状态时调用 invalidate_home_feed() 使快照失效。
+
+快照中保存的是普通对象而不是ORM实例，跨请求使用时不会触发延迟加载。
+"""
+
+import time
+import logging
+import threading
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import or_
+
+logger = logging.getLogger(__name__)
+
+# 共享缓存中的键
+HOME_FEED_KEY = 'home_feed:snapshot'
+HOME_FEED_GENERATION_KEY = 'home_feed:generation'
+
+# 模板中用到的活动字段和通知字段
+ACTIVITY_FIELDS = ('id', 'title', 'description', 'type', 'start_time', 'status', 'is_featured',
+                   'poster_image', 'poster_size', 'poster_version')
+NOTIFICATION_FIELDS = ('id', 'title', 'content', 'is_important', 'created_at')
+
+# 进程内快照
+_local_snapshot = None
+_local_lock = threading.Lock()
+
+
+def _to_dict(obj, fields):
+    return {field: getattr(obj, field, None) for field in fields}
+
+
+def _get_cache():
+    from src import cache
+    return cache
+
+
+def _get_generation(cache):
+    """读取共享缓存中的快照版本号，读取失败时返回0"""
+    try:
+        return cache.get(HOME_FEED_GENERATION_KEY) or 0
+    except Exception as e:
+        logger.warning(f"读取首页快照版本号失败: {e}")
+        return 0
+
+
+def _query_home_feed(now):
+    """从数据库查询首页数据，返回可序列化的字典"""
+    from src.models import Activity, Notification
+
+    public_notifications = Notification.query.filter(
+        Notification.is_public == True,
+        or_(
+            Notification.expiry_date == None,
+            Notification.expiry_date > now
+        )
+    ).order_by(Notification.is_important.desc(), Notification.created_at.desc()).limit(3).all()
+
+    featured_activities = Activity.query.filter(
+        Activity.is_featured == True,
+        Activity.status == 'active'
+    ).order_by(Activity.created_at.desc()).limit(3).all()
+
+    latest_activities = Activity.query.filter_by(
+        status='active'
+    ).order_by(Activity.created_at.desc()).limit(6).all()
+
+    upcoming_activities = Activity.query.filter(
+        Activity.status == 'active',
+        Activity.start_time > now
+    ).order_by(Activity.start_time.asc()).limit(3).all()
+
+    # 按有效报名人数（已报名+已参加）排序，直接使用活动上的计数器
+    popular_activities = Activity.query.filter(
+        Activity.status == 'active'
+    ).order_by(
+        (Activity.registered_count + Activity.attended_count).desc()
+    ).limit(3).all()
+
+    return {
+        'public_notifications': [_to_dict(n, NOTIFICATION_FIELDS) for n in public_notifications],
+        'featured_activities': [_to_dict(a, ACTIVITY_FIELDS) for a in featured_activities],
+        'latest_activities': [_to_dict(a, ACTIVITY_FIELDS) for a in latest_activities],
+        'upcoming_activities': [_to_dict(a, ACTIVITY_FIELDS) for a in upcoming_activities],
+        'popular_activities': [_to_dict(a, ACTIVITY_FIELDS) for a in popular_activities],
+    }
+
+
+def _build_snapshot(data, generation, expires_at):
+    """将缓存的字典数据转换为模板使用的快照对象"""
+    from src.routes.main import process_activity_poster
+
+    feed = SimpleNamespace(generation=generation, expires_at=expires_at)
+    feed.public_notifications = [SimpleNamespace(**n) for n in data['public_notifications']]
+    for name in ('featured_activities', 'latest_activities', 'upcoming_activities', 'popular_activities'):
+        setattr(feed, name, [SimpleNamespace(**a) for a in data[name]])
+
+    # 特色活动的海报文件通过内存索引解析
+    for activity in feed.featured_activities:
+        process_activity_poster(activity)
+    return feed
+
+
+def get_home_feed(now):
+    """获取首页数据快照
+
+    依次查找进程内快照、共享缓存，都未命中或已失效时查询数据库并写回两级缓存。
+
+    Args:
+        now: 当前时间，用于筛选未过期的通知和即将开始的活动
+
+    Returns:
+        SimpleNamespace: 包含public_notifications、featured_activities、latest_activities、
+        upcoming_activities、popular_activities属性的快照对象
+    """
+    global _local_snapshot
+
+    ttl = current_app.config.get('HOME_FEED_TTL', 60)
+    if ttl <= 0:
+        return _build_snapshot(_query_home_feed(now), 0, 0)
+
+    cache = _get_cache()
+    generation = _get_generation(cache)
+    current = time.time()
+
+    snapshot = _local_snapshot
+    if snapshot and snapshot.generation == generation and snapshot.expires_at > current:
+        return snapshot
+
+    with _local_lock:
+        snapshot = _local_snapshot
+        if snapshot and snapshot.generation == generation and snapshot.expires_at > current:
+            return snapshot
+
+        try:
+            cached = cache.get(HOME_FEED_KEY)
+        except Exception as e:
+            logger.warning(f"读取共享首页快照失败: {e}")
+            cached = None
+
+        if cached and cached.get('generation') == generation and cached.get('expires_at', 0) > current:
+            snapshot = _build_snapshot(cached['data'], generation, cached['expires_at'])
+        else:
+            data = _query_home_feed(now)
+            expires_at = current + ttl
+            try:
+                cache.set(HOME_FEED_KEY, {'generation': generation, 'expires_at': expires_at, 'data': data}, timeout=ttl)
+            except Exception as e:
+                logger.warning(f"写入共享首页快照失败: {e}")
+            snapshot = _build_snapshot(data, generation, expires_at)
+            logger.info(f"首页快照已重新生成 (版本: {generation})")
+
+        _local_snapshot = snapshot
+        return snapshot
+
+
+def invalidate_home_feed():
+    """使首页快照失效，活动或通知发生变化后调用"""
+    global _local_snapshot
+
+    _local_snapshot = None
+    try:
+        # 以纳秒时间戳作为新版本号，无需先读取旧值
+        cache = _get_cache()
+        cache.set(HOME_FEED_GENERATION_KEY, time.time_ns(), timeout=0)
+        cache.delete(HOME_FEED_KEY)
+        logger.info("首页快照已失效")
+    except Exception as e:
+        logger.warning(f"使首页快照失效时出错: {e}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对外HTTP请求的共享客户端
+
+天气接口、AI聊天代理和教育资源AI接口原先直接调用requests.get/post，每次请求都新建TCP+TLS连接。
+这里每个进程持有一个requests.Session，按上游主机维护keep-alive连接池，统一超时和重试策略：
+
+- 超时：timeout只传一个数字时作为读取超时，连接超时使用HTTP_CONNECT_TIMEOUT；
+- 重试：建立连接失败时所有请求都会重试（请求尚未发出）；GET等幂等请求在读取失败或502/503/504时也会重试；
+- 统计：按主机记录请求数、新建连接数、建立连接（含TLS握手）耗时和总耗时，stats()返回汇总，
+  超过HTTP_SLOW_REQUEST_SECONDS的请求记录警告。流式请求的总耗时计算到收到响应头为止。
+
+连接池参数在进程内第一次请求时读取，fork出的子进程会重新创建会话。
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'HTTP_POOL_CONNECTIONS': 10,  # 保留连接池的上游主机数
+    'HTTP_POOL_MAXSIZE': 20,  # 每个主机保留的空闲连接数
+    'HTTP_CONNECT_TIMEOUT': 5,
+    'HTTP_READ_TIMEOUT': 30,
+    'HTTP_RETRIES': 2,
+    'HTTP_RETRY_BACKOFF': 0.5,
+    'HTTP_SLOW_REQUEST_SECONDS': 3,
+}
+
+_local = threading.local()
+
+
+class _TimedConnectionMixin:
+    """记录建立连接（HTTPS包括TLS握手）的耗时，累加到当前线程正在进行的请求上"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _local.connect_time = getattr(_local, 'connect_time', 0.0) + time.perf_counter() - started
+            _local.new_connections = getattr(_local, 'new_connections', 0) + 1
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+def _setting(name):
+    """优先读取当前应用的配置，没有应用上下文时（如后台线程）读取Config类"""
+    try:
+        from flask import current_app
+        return current_app.config.get(name, DEFAULT_SETTINGS[name])
+    except RuntimeError:
+        from src.config import Config
+        return getattr(Config, name, DEFAULT_SETTINGS[name])
+
+
+def _normalize_timeout(timeout):
+    """转换为 (连接超时, 读取超时)"""
+    if timeout is None:
+        return (_setting('HTTP_CONNECT_TIMEOUT'), _setting('HTTP_READ_TIMEOUT'))
+    if not isinstance(timeout, tuple):
+        return (min(_setting('HTTP_CONNECT_TIMEOUT'), timeout), timeout)
+    return timeout
+
+
+def max_request_seconds(timeout=None):
+    """GET请求最坏情况下的耗时（秒）：每次尝试都等满连接超时和读取超时，加上重试之间的退避等待
+
+    Args:
+        timeout: 与 HttpClient.request 的timeout参数相同
+    """
+    connect, read = _normalize_timeout(timeout)
+    retries = int(_setting('HTTP_RETRIES'))
+    backoff = float(_setting('HTTP_RETRY_BACKOFF'))
+    return (connect + read) * (retries + 1) + sum(backoff * 2 ** attempt for attempt in range(retries))
+
+
+class HttpClient:
+    """进程内共享的HTTP客户端"""
+
+    def __init__(self):
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: defaultdict(float))
+
+    @property
+    def session(self):
+        # fork出的子进程不能复用父进程的连接
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    self._session = self._build_session()
+                    self._pid = os.getpid()
+                    self._stats.clear()
+        return self._session
+
+    def _build_session(self):
+        retries = int(_setting('HTTP_RETRIES'))
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            backoff_factor=float(_setting('HTTP_RETRY_BACKOFF')),
+            raise_on_status=False,
+        )
+        adapter = _TimedAdapter(
+            pool_connections=int(_setting('HTTP_POOL_CONNECTIONS')),
+            pool_maxsize=int(_setting('HTTP_POOL_MAXSIZE')),
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def reset(self):
+        """关闭所有连接，下次请求时按当前配置重新创建会话"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._stats.clear()
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """发送请求，参数与requests.request相同
+
+        Args:
+            timeout: (连接超时, 读取超时)，或只给出读取超时的数字，为None时使用配置的默认值
+        """
+        timeout = _normalize_timeout(timeout)
+
+        session = self.session
+        _local.connect_time = 0.0
+        _local.new_connections = 0
+        started = time.perf_counter()
+        error = None
+        try:
+            return session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            error = e
+            raise
+        finally:
+            self._record(method, url, time.perf_counter() - started, error)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, method, url, elapsed, error):
+        host = urlsplit(url).netloc
+        connect_time = _local.connect_time
+        new_connections = _local.new_connections
+        with self._lock:
+            stats = self._stats[host]
+            stats['requests'] += 1
+            stats['errors'] += 1 if error is not None else 0
+            stats['new_connections'] += new_connections
+            stats['connect_time'] += connect_time
+            stats['total_time'] += elapsed
+            stats['max_total_time'] = max(stats['max_total_time'], elapsed)
+        logger.debug(f"{method} {host} 建立连接 {connect_time * 1000:.0f}ms（新建{new_connections}个），"
+                     f"总耗时 {elapsed * 1000:.0f}ms")
+        if elapsed > _setting('HTTP_SLOW_REQUEST_SECONDS'):
+            logger.warning(f"外部请求较慢: {method} {host} 总耗时 {elapsed:.2f}s，其中建立连接 {connect_time:.2f}s"
+                           + (f"，错误: {error}" if error is not None else ""))
+
+    def stats(self):
+        """按主机汇总的请求统计（毫秒）"""
+        with self._lock:
+            result = {}
+            for host, stats in self._stats.items():
+                requests_count = int(stats['requests'])
+                new_connections = int(stats['new_connections'])
+                result[host] = {
+                    'requests': requests_count,
+                    'errors': int(stats['errors']),
+                    'new_connections': new_connections,
+                    'avg_connect_ms': round(stats['connect_time'] / new_connections * 1000, 1) if new_connections else 0.0,
+                    'avg_total_ms': round(stats['total_time'] / requests_count * 1000, 1) if requests_count else 0.0,
+                    'max_total_ms': round(stats['max_total_time'] * 1000, 1),
+                }
+            return result
+
+
+http_client = HttpClient()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知推送中心（Server-Sent Events）
+
+浏览器通过 /student/api/notifications/stream 建立SSE连接后，新通知、新消息由服务端推送，
+不再定时轮询未读接口；空闲的页面不会产生数据库查询。
+
+每个进程内维护 用户ID -> 订阅队列 的映射。gunicorn有多个工作进程时，发布的事件写入
+共享缓存文件（SHARED_CACHE_PATH）中的hub_events表，各进程的中继线程读取后投递给本进程的订阅者；
+NOTIFICATION_HUB_RELAY为False时（如测试环境）只在本进程内投递。
+
+每个连接在连接期间一直占用处理它的线程或协程。线程工作进程（gthread）默认不提供推送，
+gevent工作进程每个进程最多保持 NOTIFICATION_STREAM_MAX_CONNECTIONS 个连接；
+不提供推送或连接数已满时接口只发送一条fallback事件，页面改为轮询未读接口。
+"""
+
+import json
+import time
+import queue
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# 中继事件保留时间（秒）
+RELAY_RETENTION = 300
+# gevent工作进程默认的连接数上限
+ASYNC_STREAM_CONNECTIONS = 500
+
+
+def async_worker():
+    """当前进程是否为gevent工作进程（标准库已打补丁，等待事件时只占用一个协程）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def stream_connection_limit(config):
+    """本进程最多同时保持的推送连接数，0表示不提供推送"""
+    limit = config.get('NOTIFICATION_STREAM_MAX_CONNECTIONS')
+    if limit is not None:
+        return int(limit)
+    return ASYNC_STREAM_CONNECTIONS if async_worker() else 0
+
+
+def format_sse(event, data):
+    """格式化为一条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class Subscription:
+    """一个SSE连接的订阅，队列已满时丢弃新事件（客户端重连后会重新获取快照）"""
+
+    def __init__(self, hub, user_id, maxsize=100):
+        self.hub = hub
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event, data):
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            logger.warning(f"用户 {self.user_id} 的通知推送队列已满，丢弃事件 {event}")
+
+    def get(self, timeout):
+        """等待下一个事件，超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class NotificationHub:
+    """进程内的发布/订阅中心"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._store = None
+        self._relay_thread = None
+        self._relay_interval = 0.5
+        self._last_event_id = 0
+
+    def init_app(self, app):
+        if not app.config.get('NOTIFICATION_HUB_RELAY', True):
+            self._store = None
+            return
+        try:
+            from src.utils.shared_cache import SQLiteStore
+            store = SQLiteStore(app.config['SHARED_CACHE_PATH'])
+            store.execute(
+                'CREATE TABLE IF NOT EXISTS hub_events ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT, user_ids TEXT, event TEXT NOT NULL,'
+                ' payload TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            self._relay_interval = app.config.get('NOTIFICATION_HUB_RELAY_INTERVAL', 0.5)
+            self._store = store
+        except Exception as e:
+            logger.warning(f"初始化通知中继失败，只在本进程内推送: {e}")
+            self._store = None
+
+    def subscribe(self, user_id, limit=None):
+        """订阅用户的事件；本进程的订阅数已达到 limit 时返回None"""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            if limit is not None and sum(len(s) for s in self._subscribers.values()) >= limit:
+                return None
+            self._subscribers[user_id].add(subscription)
+        if self._store is not None:
+            self._ensure_relay()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event, data, user_ids=None):
+        """发布事件
+
+        Args:
+            event: 事件名称，如notification、message
+            data: 可JSON序列化的数据
+            user_ids: 接收者用户ID列表，None表示所有在线用户
+        """
+        if self._store is None:
+            self._deliver(event, data, user_ids)
+            return
+        try:
+            now = time.time()
+            self._store.execute(
+                'INSERT INTO hub_events (user_ids, event, payload, created_at) VALUES (?, ?, ?, ?)',
+                (json.dumps(list(user_ids)) if user_ids is not None else None, event,
+                 json.dumps(data, ensure_ascii=False, default=str), now)
+            )
+            self._store.execute('DELETE FROM hub_events WHERE created_at < ?', (now - RELAY_RETENTION,))
+        except Exception as e:
+            logger.warning(f"写入通知中继失败，只在本进程内推送: {e}")
+            self._deliver(event, data, user_ids)
+
+    def _deliver(self, event, data, user_ids):
+        with self._lock:
+            if user_ids is None:
+                targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+            else:
+                targets = [s for user_id in set(user_ids) for s in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            subscription.put(event, data)
+
+    def _ensure_relay(self):
+        with self._lock:
+            if self._relay_thread is not None and self._relay_thread.is_alive():
+                return
+            # 只投递订阅之后发布的事件
+            row = self._store.execute('SELECT MAX(id) FROM hub_events').fetchone()
+            self._last_event_id = row[0] or 0
+            self._relay_thread = threading.Thread(target=self._relay_loop, name='notification-hub-relay', daemon=True)
+            self._relay_thread.start()
+
+    def _relay_loop(self):
+        """读取其他进程（以及本进程）发布的事件；本进程没有订阅者时退出"""
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._relay_thread = None
+                    return
+            try:
+                rows = self._store.execute(
+                    'SELECT id, user_ids, event, payload FROM hub_events WHERE id > ? ORDER BY id',
+                    (self._last_event_id,)
+                ).fetchall()
+                for event_id, user_ids, event, payload in rows:
+                    self._last_event_id = event_id
+                    self._deliver(event, json.loads(payload), json.loads(user_ids) if user_ids else None)
+            except Exception as e:
+                logger.warning(f"读取通知中继失败: {e}")
+            time.sleep(self._relay_interval)
+
+
+notification_hub = NotificationHub()
+
+
+def notification_event_data(notification):
+    """通知横幅和推送事件使用的通知数据"""
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'content': notification.content,
+        'is_important': bool(notification.is_important),
+        'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M') if notification.created_at else ''
+    }
+
+
+def count_unread_messages(user_id):
+    """用户的未读消息数量（读取未读计数器）"""
+    from src.utils.unread_counters import get_unread_counts
+
+    return get_unread_counts(user_id)['messages']
+
+
+def publish_unread_messages(user_id):
+    """向用户推送最新的未读消息数量"""
+    try:
+        notification_hub.publish('messages', {'count': count_unread_messages(user_id)}, user_ids=[user_id])
+    except Exception as e:
+        logger.warning(f"推送未读消息数量失败: {e}")
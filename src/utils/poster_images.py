@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+活动海报尺寸变体处理
+
+根据原始海报生成不同宽度、不同编码格式（WebP/JPEG）的缩略图，
+并按内容哈希存放到磁盘派生缓存中，相同内容的海报只会被处理一次。
+"""
+
+import os
+import hashlib
+import logging
+from io import BytesIO
+from PIL import Image, ImageOps
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 默认变体宽度：卡片缩略图、详情页、高清屏详情页
+DEFAULT_VARIANT_WIDTHS = (400, 800, 1200)
+
+# 支持的输出格式及对应的MIME类型
+VARIANT_FORMATS = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+# 重新编码的图片质量
+VARIANT_QUALITY = 82
+
+
+def get_variant_widths():
+    """获取配置的变体宽度列表（升序）"""
+    widths = current_app.config.get('POSTER_VARIANT_WIDTHS') or DEFAULT_VARIANT_WIDTHS
+    return sorted(int(w) for w in widths)
+
+
+def get_cache_dir():
+    """获取海报派生缓存目录，不存在时自动创建"""
+    cache_dir = current_app.config.get('POSTER_CACHE_FOLDER')
+    if not cache_dir:
+        cache_dir = os.path.join(current_app.instance_path, 'poster_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def pick_variant_width(requested_width, widths=None):
+    """将请求的宽度对齐到最接近的已配置宽度，避免任意宽度撑爆缓存
+
+    Args:
+        requested_width: 客户端请求的宽度
+        widths: 可选的宽度列表（升序）
+
+    Returns:
+        int: 不小于请求宽度的最小配置宽度；请求过大时返回最大宽度
+    """
+    widths = widths or get_variant_widths()
+    for width in widths:
+        if requested_width <= width:
+            return width
+    return widths[-1]
+
+
+def choose_variant_format(accept_header):
+    """根据Accept请求头选择输出格式，浏览器支持WebP时优先使用WebP"""
+    if accept_header and 'image/webp' in accept_header:
+        return 'webp'
+    return 'jpeg'
+
+
+def poster_content_hash(data):
+    """计算海报内容哈希，作为派生缓存的键"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _variant_path(cache_dir, content_hash, width, fmt):
+    """派生文件路径：按哈希前两位分目录，避免单目录文件过多"""
+    return os.path.join(cache_dir, content_hash[:2], f"{content_hash}_w{width}.{fmt}")
+
+
+def render_poster_variant(data, width, fmt):
+    """将原始海报缩放到指定宽度并重新编码
+
+    Args:
+        data: 原始图片二进制数据
+        width: 目标宽度，原图更窄时不放大
+        fmt: 输出格式，webp或jpeg
+
+    Returns:
+        bytes: 重新编码后的图片数据
+    """
+    with Image.open(BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+
+        if fmt == 'jpeg':
+            # JPEG不支持透明通道，透明区域铺白底
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+                img = img.convert('RGBA')
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+        output = BytesIO()
+        img.save(output, format=fmt.upper(), quality=VARIANT_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+def find_cached_variant(content_hash, width, fmt):
+    """仅根据内容哈希查找已生成的变体，命中时无需读取原图
+
+    Returns:
+        tuple: (图片数据, MIME类型)，未命中时返回None
+    """
+    path = _variant_path(get_cache_dir(), content_hash, width, fmt)
+    try:
+        with open(path, 'rb') as f:
+            return f.read(), VARIANT_FORMATS[fmt]
+    except FileNotFoundError:
+        return None
+
+
+def get_poster_variant(data, width, fmt, content_hash=None):
+    """获取海报变体，优先读取派生缓存，未命中时生成并写入缓存
+
+    Args:
+        data: 原始图片二进制数据
+        width: 已对齐的目标宽度
+        fmt: 输出格式
+        content_hash: 原图内容哈希，为空时根据data计算
+
+    Returns:
+        tuple: (图片数据, MIME类型)
+    """
+    content_hash = content_hash or poster_content_hash(data)
+    cached = find_cached_variant(content_hash, width, fmt)
+    if cached:
+        return cached
+
+    path = _variant_path(get_cache_dir(), content_hash, width, fmt)
+    variant = render_poster_variant(data, width, fmt)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免多个工作进程同时读到写了一半的文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(variant)
+        os.replace(tmp_path, path)
+        logger.info(f"已生成海报变体: {os.path.basename(path)}, 大小: {len(variant)} 字节")
+    except Exception as e:
+        logger.warning(f"写入海报派生缓存失败: {e}")
+    return variant, VARIANT_FORMATS[fmt]
+
+
+def generate_poster_variants(data):
+    """上传海报后预先生成所有尺寸和格式的变体，首次访问无需等待缩放
+
+    Args:
+        data: 原始图片二进制数据
+
+    Returns:
+        int: 成功生成的变体数量
+    """
+    content_hash = poster_content_hash(data)
+    generated = 0
+    for width in get_variant_widths():
+        for fmt in VARIANT_FORMATS:
+            try:
+                get_poster_variant(data, width, fmt, content_hash)
+                generated += 1
+            except Exception as e:
+                logger.warning(f"生成海报变体失败 (宽度={width}, 格式={fmt}): {e}")
+                return generated
+    return generated
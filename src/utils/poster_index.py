@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+活动海报文件索引
+
+启动时扫描一次海报目录，建立 活动ID -> 海报文件名 的内存索引，并记录目录中所有文件名
+（包括不符合上传命名格式的旧文件），上传/删除海报时同步更新。
+请求处理中解析海报只需查询内存，不再对每个活动执行 os.listdir / os.path.exists。
+
+注意：索引是进程内的，多个工作进程各自持有一份。海报上传后二进制数据同时写入数据库，
+页面优先通过 poster_size 判断并走 /poster/<id> 输出，因此其他进程的索引短暂滞后不影响显示。
+"""
+
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 上传海报的文件名格式：activity_<活动ID>_<时间戳><扩展名>
+POSTER_FILENAME_PATTERN = re.compile(r'^activity_(\d+)_')
+
+
+class PosterIndex:
+    """活动海报文件的内存索引"""
+
+    def __init__(self):
+        self._files = {}
+        self._names = set()
+        self._lock = threading.Lock()
+        self.poster_dir = None
+
+    def build(self, poster_dir):
+        """扫描海报目录重建索引
+
+        Args:
+            poster_dir: 海报目录
+
+        Returns:
+            int: 已索引的海报文件数量
+        """
+        files = {}
+        count = 0
+        try:
+            names = os.listdir(poster_dir) if poster_dir and os.path.isdir(poster_dir) else []
+        except OSError as e:
+            logger.warning(f"扫描海报目录失败: {e}")
+            names = []
+
+        for name in names:
+            match = POSTER_FILENAME_PATTERN.match(name)
+            if match:
+                files.setdefault(int(match.group(1)), set()).add(name)
+                count += 1
+
+        with self._lock:
+            self._files = files
+            self._names = set(names)
+            self.poster_dir = poster_dir
+        logger.info(f"海报索引已建立: {poster_dir}, 共 {len(names)} 个文件, 其中 {count} 个活动海报, {len(files)} 个活动")
+        return count
+
+    def latest(self, activity_id):
+        """获取活动最新的海报文件名（文件名中的时间戳最大者），没有时返回None"""
+        names = self._files.get(activity_id)
+        return max(names) if names else None
+
+    def contains(self, filename):
+        """判断海报目录中是否存在该文件（任意文件名）"""
+        return filename in self._names
+
+    def register(self, activity_id, filename):
+        """记录新上传的海报文件"""
+        if activity_id is None or not filename:
+            return
+        with self._lock:
+            self._files.setdefault(int(activity_id), set()).add(filename)
+            self._names.add(filename)
+
+    def discard(self, activity_id, filename):
+        """移除已删除的海报文件"""
+        if activity_id is None or not filename:
+            return
+        with self._lock:
+            self._names.discard(filename)
+            names = self._files.get(int(activity_id))
+            if names:
+                names.discard(filename)
+                if not names:
+                    del self._files[int(activity_id)]
+
+
+poster_index = PosterIndex()
+
+
+def init_poster_index(app):
+    """应用启动时建立海报索引"""
+    static_folder = app.static_folder
+    if not static_folder:
+        logger.warning("静态文件目录未设置，海报索引为空")
+        return 0
+    return poster_index.build(os.path.join(static_folder, 'uploads', 'posters'))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程共享的本地缓存
+
+gunicorn的多个工作进程各自使用SimpleCache和memory://限流存储时，缓存命中率只有1/N，
+限流额度也被放大N倍。这里用instance目录下的一个SQLite文件（WAL模式）作为共享存储，
+不依赖Redis等外部服务：
+
+- SQLiteCache：Flask-Caching后端，CACHE_TYPE = 'src.utils.shared_cache.SQLiteCache'
+- SQLiteStorage：limits/Flask-Limiter存储，RATELIMIT_STORAGE_URL = 'sqlite:///绝对路径'
+
+缓存条目超过CACHE_THRESHOLD时先删除过期条目，再按写入顺序淘汰最早的条目。
+所有读写都是单条SQL语句（计数器使用UPSERT ... RETURNING），多进程并发下保持原子性。
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+
+from flask_caching.backends.base import BaseCache
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# 每写入多少次检查一次是否需要淘汰
+PRUNE_INTERVAL = 100
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entries ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS rate_limits ('
+    ' key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)',
+)
+
+
+class SQLiteStore:
+    """SQLite共享存储，每个线程各自持有连接，fork后的子进程会重新连接
+
+    expires_at为0表示永不过期。
+    """
+
+    def __init__(self, path, busy_timeout=30):
+        self.path = os.path.abspath(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = self.connection()
+        for statement in _SCHEMA:
+            connection.execute(statement)
+
+    def connection(self):
+        """当前线程的数据库连接"""
+        local = self._local
+        if getattr(local, 'connection', None) is None or local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                         isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+
+def _expires_at(timeout):
+    return time.time() + timeout if timeout and timeout > 0 else 0
+
+
+class SQLiteCache(BaseCache):
+    """基于SQLiteStore的Flask-Caching后端，值使用pickle序列化
+
+    :param path: SQLite文件路径
+    :param threshold: 缓存条目上限，超过后开始淘汰
+    :param default_timeout: 默认过期时间（秒），0表示永不过期
+    """
+
+    def __init__(self, path, threshold=500, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self._store = SQLiteStore(path)
+        self._threshold = threshold
+        self._writes = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        path = config.get('SHARED_CACHE_PATH') or os.path.join(app.instance_path, 'shared_cache.db')
+        kwargs.update(dict(path=path, threshold=config['CACHE_THRESHOLD']))
+        return cls(*args, **kwargs)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is None else timeout
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self):
+        """删除过期条目，仍超过上限时按写入顺序淘汰最早的条目"""
+        now = time.time()
+        self._store.execute('DELETE FROM cache_entries WHERE expires_at != 0 AND expires_at <= ?', (now,))
+        count = self._store.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._threshold:
+            self._store.execute(
+                'DELETE FROM cache_entries WHERE rowid IN '
+                '(SELECT rowid FROM cache_entries ORDER BY rowid LIMIT ?)',
+                (count - self._threshold,)
+            )
+
+    def get(self, key):
+        row = self._store.execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND (expires_at = 0 OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logger.warning(f"反序列化缓存条目失败 {key}: {e}")
+            return None
+
+    def set(self, key, value, timeout=None):
+        # REPLACE会分配新的rowid，rowid顺序即写入顺序
+        self._store.execute(
+            'REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), _expires_at(self._timeout(timeout)))
+        )
+        self._after_write()
+        return True
+
+    def add(self, key, value, timeout=None):
+        now = time.time()
+        cursor = self._store.execute(
+            'INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at '
+            'WHERE cache_entries.expires_at != 0 AND cache_entries.expires_at <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), _expires_at(self._timeout(timeout)), now)
+        )
+        self._after_write()
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        return self._store.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount == 1
+
+    def has(self, key):
+        return self._store.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires_at = 0 OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._store.execute('DELETE FROM cache_entries')
+        return True
+
+
+class SQLiteStorage(Storage):
+    """基于SQLiteStore的限流计数存储（固定窗口），URI形如sqlite:////abs/path/shared_cache.db"""
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        path = uri.split('://', 1)[1]
+        if path.startswith('/'):
+            path = path[1:]
+        self._store = SQLiteStore(path or 'shared_cache.db')
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        row = self._store.execute(
+            'INSERT INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            ' value = CASE WHEN rate_limits.expires_at <= ? THEN excluded.value ELSE rate_limits.value + excluded.value END,'
+            ' expires_at = CASE WHEN rate_limits.expires_at <= ? THEN excluded.expires_at ELSE rate_limits.expires_at END '
+            'RETURNING value',
+            (key, amount, now + expiry, now, now)
+        ).fetchall()[0]  # 取完结果语句才会结束，尽快释放写锁
+        self._writes += 1
+        if self._writes % PRUNE_INTERVAL == 0:
+            self._store.execute('DELETE FROM rate_limits WHERE expires_at <= ?', (now,))
+        return row[0]
+
+    def get(self, key):
+        row = self._store.execute(
+            'SELECT value FROM rate_limits WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._store.execute(
+            'SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            self._store.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._store.execute('DELETE FROM rate_limits').rowcount
+
+    def clear(self, key):
+        self._store.execute('DELETE FROM rate_limits WHERE key = ?', (key,))
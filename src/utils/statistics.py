@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理后台统计数据聚合
+
+所有统计均使用分组查询（GROUP BY 状态 / 月份）一次取回，查询次数与统计窗口长度无关，
+统计24个月与统计6个月的查询次数相同。月份分组在SQLite上使用strftime，在PostgreSQL上使用date_trunc。
+按时间的统计读取每日统计汇总表daily_stats（见src.utils.daily_stats），不再扫描活动和报名表。
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select, case, literal_column
+
+logger = logging.getLogger(__name__)
+
+# 活动状态及其在图表中的显示名称
+ACTIVITY_STATUS_LABELS = (
+    ('active', '进行中'),
+    ('completed', '已结束'),
+    ('cancelled', '已取消'),
+)
+
+# 月度统计允许的最大窗口（月）
+MAX_MONTHS = 120
+
+# 积分分布默认区间边界：[0,10) [10,30) ... [1000, +∞)
+DEFAULT_POINTS_BINS = (0, 10, 30, 50, 100, 200, 500, 1000)
+
+
+def _dialect_name():
+    from src.models import db
+    return db.session.get_bind().dialect.name
+
+
+def month_key(column):
+    """生成按月分组的表达式，结果形如'2024-05'"""
+    if _dialect_name() == 'sqlite':
+        return func.strftime('%Y-%m', column)
+    return func.to_char(func.date_trunc('month', column), 'YYYY-MM')
+
+
+def month_window(months, now=None):
+    """计算最近months个自然月（含当月）的月份标签和起始时间
+
+    Returns:
+        tuple: (按时间升序的月份标签列表, 窗口起始时间)
+    """
+    now = now or datetime.now()
+    year, month = now.year, now.month
+    labels = []
+    for _ in range(months):
+        labels.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    labels.reverse()
+    start_year, start_month = (int(part) for part in labels[0].split('-'))
+    return labels, datetime(start_year, start_month, 1)
+
+
+def activity_status_counts():
+    """按状态分组统计活动数量"""
+    from src.models import db, Activity
+
+    stmt = select(Activity.status, func.count()).group_by(Activity.status)
+    return {status: count for status, count in db.session.execute(stmt)}
+
+
+def participation_counts():
+    """一次查询统计学生总数和参与过活动的学生数
+
+    Returns:
+        tuple: (学生总数, 参与过活动的人数)
+    """
+    from src.models import db, Role, User, Registration
+
+    student_role_id = select(Role.id).where(Role.name == 'Student').scalar_subquery()
+    total_students = select(func.count()).select_from(User).where(User.role_id == student_role_id).scalar_subquery()
+    active_students = select(func.count(Registration.user_id.distinct())).scalar_subquery()
+    row = db.session.execute(select(total_students, active_students)).one()
+    return row[0] or 0, row[1] or 0
+
+
+def collect_statistics(months=6, now=None):
+    """汇总/admin/api/statistics所需的全部统计数据（固定3次查询）
+
+    Args:
+        months: 月度统计窗口（月），超出范围时截断到1~MAX_MONTHS
+        now: 当前时间，默认取本地时间
+
+    Returns:
+        dict: 包含registration_stats、participation_stats、monthly_stats的字典
+    """
+    from src.utils.daily_stats import monthly_totals
+
+    months = max(1, min(int(months), MAX_MONTHS))
+
+    status_counts = activity_status_counts()
+    registration_stats = {
+        'labels': [label for _, label in ACTIVITY_STATUS_LABELS],
+        'data': [status_counts.get(status, 0) for status, _ in ACTIVITY_STATUS_LABELS]
+    }
+
+    total_students, active_students = participation_counts()
+    inactive_students = total_students - active_students if total_students > active_students else 0
+    participation_stats = {
+        'labels': ['已参与活动', '未参与活动'],
+        'data': [active_students, inactive_students]
+    }
+
+    labels, window_start = month_window(months, now)
+    totals = monthly_totals(labels, window_start, ('activities_created', 'registrations'))
+    monthly_stats = {
+        'labels': labels,
+        'activities': totals['activities_created'],
+        'registrations': totals['registrations']
+    }
+
+    return {
+        'registration_stats': registration_stats,
+        'participation_stats': participation_stats,
+        'monthly_stats': monthly_stats
+    }
+
+
+def parse_bins(value, default=DEFAULT_POINTS_BINS):
+    """解析区间边界，支持逗号分隔的字符串或整数序列，结果必须严格递增
+
+    Returns:
+        tuple: 区间边界；无效时返回默认边界
+    """
+    if not value:
+        return tuple(default)
+    try:
+        if isinstance(value, str):
+            value = [part for part in value.split(',') if part.strip()]
+        edges = tuple(int(edge) for edge in value)
+    except (TypeError, ValueError):
+        logger.warning(f"无效的积分区间边界: {value}，使用默认值")
+        return tuple(default)
+    if not edges or any(a >= b for a, b in zip(edges, edges[1:])):
+        logger.warning(f"积分区间边界必须严格递增: {value}，使用默认值")
+        return tuple(default)
+    return edges
+
+
+def bin_labels(edges):
+    """区间标签，如['0-9', '10-29', ..., '1000+']"""
+    return [f'{edges[i]}-{edges[i + 1] - 1}' for i in range(len(edges) - 1)] + [f'{edges[-1]}+']
+
+
+def histogram_statement(column, edges):
+    """生成单条分桶聚合语句：CASE计算区间序号后GROUP BY，SQLite和PostgreSQL通用
+
+    小于第一个边界的值不计入任何区间，空值按0处理。
+    """
+    value = func.coalesce(column, 0)
+    if len(edges) == 1:
+        return select(literal_column('0').label('bucket'), func.count()).where(value >= edges[0])
+    whens = [(value < edge, index - 1) for index, edge in enumerate(edges) if index > 0]
+    bucket = case(*whens, else_=len(edges) - 1).label('bucket')
+    return select(bucket, func.count()).where(value >= edges[0]).group_by(bucket)
+
+
+def points_distribution(edges=None, connection=None):
+    """在数据库中统计学生积分分布
+
+    Args:
+        edges: 区间边界，默认DEFAULT_POINTS_BINS
+        connection: 可选的数据库连接，默认使用当前会话
+
+    Returns:
+        dict: {'labels': [...], 'data': [...]}
+    """
+    from src.models import db, StudentInfo
+
+    edges = parse_bins(edges)
+    stmt = histogram_statement(StudentInfo.__table__.c.points, edges)
+    executor = connection if connection is not None else db.session
+    counts = [0] * len(edges)
+    for bucket, count in executor.execute(stmt):
+        counts[int(bucket)] = count
+    return {'labels': bin_labels(edges), 'data': counts}
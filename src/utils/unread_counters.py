@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户未读计数器（user_unread_counters）
+
+消息徽章和通知横幅接口只按主键读取计数器，不再对message表COUNT或用NOT IN子查询筛选未读通知。
+计数器通过三种方式维护：
+1. 写入钩子：通过ORM新增/阅读/删除消息、发布/阅读通知时，在同一事务中增减计数（见src.models）；
+2. 按需计算：计数器不存在或被置为NULL（编辑、删除通知后）时，读取时在一条语句中根据源表计算并写回
+   （独立的事务，不影响调用方的会话）；
+3. 对账：flask reconcile-unread-counters命令（以及数据库恢复后）根据源表重建全部计数器。
+
+通知计数是未读且未过期的重要通知数量。通知过期不会触发写入，计数可能偏大，
+读取未读通知列表时发现不一致会顺便修正。
+"""
+
+import logging
+from datetime import datetime
+
+from sqlalchemy import func, select, literal
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def unread_notification_filters(user_id):
+    """用户未读且未过期的重要通知的筛选条件（user_id可以是用户ID或列表达式）"""
+    from src.models import Notification, NotificationRead, unexpired_notification_clause
+
+    notifications = Notification.__table__
+    reads = NotificationRead.__table__
+    return (
+        notifications.c.is_important == True,
+        unexpired_notification_clause(),
+        # 在对账语句中嵌套两层，需要显式关联外层的通知表和用户表
+        ~select(reads.c.id).where(
+            reads.c.notification_id == notifications.c.id,
+            reads.c.user_id == user_id
+        ).correlate_except(reads).exists(),
+    )
+
+
+def _unread_notifications_count(user_id):
+    from src.models import Notification
+
+    return select(func.count()).select_from(Notification.__table__).where(*unread_notification_filters(user_id))
+
+
+def _unread_messages_count(user_id):
+    from src.models import Message
+
+    messages = Message.__table__
+    return select(func.count()).select_from(messages).where(
+        messages.c.receiver_id == user_id,
+        messages.c.is_read == False
+    )
+
+
+def compute_unread_counts(user_id):
+    """根据源表计算用户的未读通知数和未读消息数"""
+    from src.models import db
+
+    return {
+        'notifications': db.session.execute(_unread_notifications_count(user_id)).scalar() or 0,
+        'messages': db.session.execute(_unread_messages_count(user_id)).scalar() or 0,
+    }
+
+
+def _refresh_counts(user_id, notifications=False, messages=False):
+    """根据源表计算并写入计数器，计算和写入在同一条语句中完成：
+    INSERT ... SELECT COUNT(*) ... ON CONFLICT DO UPDATE
+
+    写入钩子只调整已有的非NULL计数，先COUNT再写入时，两步之间提交的消息和通知不会计入；
+    合并为一条语句后没有这段间隙。语句在独立的连接和事务中执行，
+    不会提交或回滚调用方会话中尚未提交的改动（这些改动也不计入）。
+
+    Returns:
+        dict: 写入后的 {'notifications', 'messages'}，未重新计算的字段为计数器中原有的值
+    """
+    from src.models import db, UserUnreadCounter
+
+    table = UserUnreadCounter.__table__
+    counts = {}
+    if notifications:
+        counts['unread_notifications'] = _unread_notifications_count(user_id).scalar_subquery()
+    if messages:
+        counts['unread_messages'] = _unread_messages_count(user_id).scalar_subquery()
+    engine = db.session.get_bind()
+    source = select(
+        literal(user_id, table.c.user_id.type),
+        *counts.values(),
+        literal(datetime.utcnow(), table.c.updated_at.type),
+    )
+    stmt = _insert(engine.dialect.name)(table).from_select(['user_id', *counts, 'updated_at'], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={name: stmt.excluded[name] for name in [*counts, 'updated_at']}
+    ).returning(table.c.unread_notifications, table.c.unread_messages)
+    with engine.begin() as connection:
+        row = connection.execute(stmt).one()
+    return {'notifications': max(row.unread_notifications or 0, 0), 'messages': max(row.unread_messages or 0, 0)}
+
+
+def get_unread_counts(user_id):
+    """按主键读取用户的未读计数，计数器不存在或需要重新计算时根据源表计算并写回
+
+    Returns:
+        dict: {'notifications': 未读重要通知数, 'messages': 未读消息数}
+    """
+    from src.models import db, UserUnreadCounter
+
+    table = UserUnreadCounter.__table__
+    # 只读取，不刷新调用方会话中待写入的对象
+    with db.session.no_autoflush:
+        row = db.session.execute(
+            select(table.c.unread_notifications, table.c.unread_messages).where(table.c.user_id == user_id)
+        ).first()
+    notifications = row.unread_notifications if row is not None else None
+    messages = row.unread_messages if row is not None else None
+    if notifications is not None and messages is not None:
+        return {'notifications': max(notifications, 0), 'messages': max(messages, 0)}
+
+    try:
+        return _refresh_counts(user_id, notifications=notifications is None, messages=messages is None)
+    except Exception as e:
+        logger.warning(f"写入用户 {user_id} 的未读计数器失败: {e}")
+    if notifications is None:
+        notifications = db.session.execute(_unread_notifications_count(user_id)).scalar() or 0
+    if messages is None:
+        messages = db.session.execute(_unread_messages_count(user_id)).scalar() or 0
+    return {'notifications': notifications, 'messages': messages}
+
+
+def correct_unread_notifications(user_id):
+    """根据源表重新计算未读通知计数（通知过期后计数偏大时），返回修正后的数量"""
+    try:
+        return _refresh_counts(user_id, notifications=True)['notifications']
+    except Exception as e:
+        logger.warning(f"修正用户 {user_id} 的未读通知计数失败: {e}")
+        return None
+
+
+def reconcile_unread_counters(connection=None):
+    """根据源表重建所有用户的未读计数器（需由调用方提交事务）
+
+    Args:
+        connection: 数据库连接，为None时使用db.session
+
+    Returns:
+        int: 重建的用户数量
+    """
+    from src.models import db, User, UserUnreadCounter
+
+    executor = connection if connection is not None else db.session
+    users = User.__table__
+    table = UserUnreadCounter.__table__
+    executor.execute(table.delete())
+    source = select(
+        users.c.id,
+        _unread_notifications_count(users.c.id).scalar_subquery(),
+        _unread_messages_count(users.c.id).scalar_subquery(),
+        literal(datetime.utcnow(), table.c.updated_at.type),
+    )
+    result = executor.execute(table.insert().from_select(
+        ['user_id', 'unread_notifications', 'unread_messages', 'updated_at'], source
+    ))
+    return result.rowcount
@@ -6,12 +6,20 @@ import logging
 from datetime import datetime, timedelta
 from src.config import Config
 from src.utils.time_helpers import get_localized_now
+from src.utils.http_client import http_client
 
 logger = logging.getLogger(__name__)
 
 # 重庆市的adcode（区域编码）
 CHONGQING_ADCODE = '500000'
 
+# 每个天气接口（高德、OpenWeather）请求的读取超时（秒）
+REQUEST_TIMEOUT = 10
+
+# 显示预报天气的天数，以及活动开始后仍显示实况天气的天数
+FORECAST_DAYS = 5
+PAST_DAYS = 1
+
 # 天气现象到Weather Icons的映射
 WEATHER_ICON_MAP = {
     '晴': 'wi-day-sunny',
@@ -111,7 +119,7 @@ def get_weather_data(city_adcode=CHONGQING_ADCODE, extensions='base'):
         }
         
         logger.info(f"正在获取城市编码{city_adcode}的天气数据...")
-        response = requests.get(url, params=params, timeout=10)
+        response = http_client.get(url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
@@ -238,7 +246,7 @@ def get_openweather_data(city='Chongqing', date=None):
             }
         
         logger.info(f"使用OpenWeather API获取{city}的天气数据...")
-        response = requests.get(url, params=params, timeout=10)
+        response = http_client.get(url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         data = response.json()
@@ -368,6 +376,26 @@ def get_weather_data_with_fallback(city_adcode=CHONGQING_ADCODE, extensions='bas
         logger.error("所有天气API都失败，无法获取天气数据")
         return None
 
+def activity_weather_request(activity_start_time, now=None):
+    """
+    活动详情页需要的天气类型（与get_activity_weather的判断一致，后台预取使用）
+    
+    Args:
+        activity_start_time (datetime): 活动开始时间
+        now (datetime): 当前时间，默认为当前北京时间
+    
+    Returns:
+        tuple: (extensions, activity_date)，今天及以前的活动为('base', None)，
+        未来的活动为('all', activity_start_time)；超出显示范围时返回None
+    """
+    now = now or get_localized_now()
+    days_diff = (activity_start_time.date() - now.date()).days
+    if days_diff > FORECAST_DAYS or days_diff < -PAST_DAYS:
+        return None
+    if days_diff <= 0:
+        return 'base', None
+    return 'all', activity_start_time
+
 def get_activity_weather(activity_start_time):
     """
     获取活动当天的天气信息（带备用API支持）
@@ -383,6 +411,9 @@ def get_activity_weather(activity_start_time):
         return None
     
     try:
+        # 按日期缓存的天气数据，见src/utils/weather_cache.py
+        from src.utils.weather_cache import get_cached_weather
+        
         now = get_localized_now()
         activity_date = activity_start_time.date()
         current_date = now.date()
@@ -391,19 +422,19 @@ def get_activity_weather(activity_start_time):
         days_diff = (activity_date - current_date).days
         
         # 如果活动超过5天，不显示天气信息
-        if days_diff > 5:
+        if days_diff > FORECAST_DAYS:
             logger.info(f"活动日期{activity_date}超过5天预报范围，不显示天气信息")
             return None
         
         # 如果活动是过去超过1天的，也不显示天气信息（避免显示不准确的当前天气）
-        if days_diff < -1:
+        if days_diff < -PAST_DAYS:
             logger.info(f"活动日期{activity_date}为过去日期且超过1天，不显示天气信息")
             return None
         
         # 判断是获取实况还是预报天气
         if activity_date <= current_date:
             # 活动是今天或昨天，获取实况天气
-            weather_data = get_weather_data_with_fallback(CHONGQING_ADCODE, 'base', None)
+            weather_data = get_cached_weather(CHONGQING_ADCODE, 'base', None)
             is_forecast = False
             if days_diff == 0:
                 forecast_note = "当日天气"
@@ -411,7 +442,7 @@ def get_activity_weather(activity_start_time):
                 forecast_note = "近期天气"
         else:
             # 活动是未来，获取预报天气
-            weather_data = get_weather_data_with_fallback(CHONGQING_ADCODE, 'all', activity_start_time)
+            weather_data = get_cached_weather(CHONGQING_ADCODE, 'all', activity_start_time)
             is_forecast = True
             
             if days_diff == 1:
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+天气数据缓存
+
+活动详情页每次渲染都会请求高德天气（失败时再请求OpenWeather），而重庆的实况天气每小时才更新一次。
+这里按 (城市编码, 实况/预报, 日期) 缓存 get_weather_data_with_fallback 的结果，存放在共享缓存中，
+所有gunicorn工作进程共用：
+
+- 有效期：按上游的发布周期计算，实况约每小时（WEATHER_LIVE_REPORT_INTERVAL）、
+  预报约每三小时（WEATHER_FORECAST_REPORT_INTERVAL）发布一次，缓存到下一次发布为止；
+- 单飞：缓存过期时通过 cache.add 抢占刷新锁，同一时间只有一个请求访问上游，
+  其他请求有旧数据时直接返回旧数据，没有时最多等待WEATHER_REFRESH_WAIT_SECONDS秒，
+  仍未刷新完成则本次不显示天气，不长时间占用工作进程。锁的有效期按两个上游接口都超时并重试的
+  最坏耗时计算（refresh_lock_ttl），刷新结束前不会过期；锁中保存持有者的令牌，只有持有者才会删除；
+- 上游失败时继续使用过期数据（最长WEATHER_CACHE_STALE_SECONDS），并在WEATHER_CACHE_FAILURE_TTL秒内不再重试；
+  没有旧数据时也会短暂缓存失败结果，避免每次渲染都等待上游超时；
+- 后台预取（src/utils/weather_prefetch.py）只刷新进行中活动的天气，写入的数据带有prefetched标记。
+  请求中遇到过期的预取数据直接使用，由预取任务刷新；其他数据（如已结束、已取消活动的天气），
+  以及过期超过一个预取周期、预取任务已不再刷新的数据，照常在请求中刷新。
+"""
+
+import copy
+import time
+import uuid
+import logging
+from datetime import datetime
+
+import pytz
+from flask import current_app, has_app_context
+
+from src.utils.time_helpers import get_localized_now
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'WEATHER_LIVE_REPORT_INTERVAL': 3600,
+    'WEATHER_FORECAST_REPORT_INTERVAL': 10800,
+    'WEATHER_CACHE_MIN_TTL': 300,
+    'WEATHER_CACHE_STALE_SECONDS': 21600,
+    'WEATHER_CACHE_FAILURE_TTL': 60,
+    'WEATHER_REFRESH_WAIT_SECONDS': 3,
+    'WEATHER_PREFETCH_INTERVAL': 0,
+}
+
+# 等待其他请求刷新时的轮询间隔（秒）
+POLL_INTERVAL = 0.1
+# 天气数据依次请求的上游接口数（高德，失败时OpenWeather）
+UPSTREAMS = 2
+
+
+def _setting(name):
+    return current_app.config.get(name, DEFAULT_SETTINGS[name])
+
+
+def _get_cache():
+    from src import cache
+    return cache
+
+
+def weather_cache_key(city_adcode, extensions, activity_date=None):
+    """预报天气按活动日期缓存，实况天气按当天缓存"""
+    day = activity_date.date() if extensions == 'all' and activity_date else get_localized_now().date()
+    return f'weather:{city_adcode}:{extensions}:{day.isoformat()}'
+
+
+def _report_timestamp(report_time):
+    """将天气数据的发布时间（北京时间字符串）转换为时间戳，无法解析时返回None"""
+    if not report_time:
+        return None
+    try:
+        naive = datetime.strptime(str(report_time)[:19], '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    return pytz.timezone('Asia/Shanghai').localize(naive).timestamp()
+
+
+def weather_ttl(data, extensions, now):
+    """缓存到上游下一次发布数据为止，不短于WEATHER_CACHE_MIN_TTL、不长于一个发布周期"""
+    interval = _setting('WEATHER_LIVE_REPORT_INTERVAL' if extensions == 'base' else 'WEATHER_FORECAST_REPORT_INTERVAL')
+    reported_at = _report_timestamp(data.get('report_time'))
+    ttl = reported_at + interval - now if reported_at is not None else interval
+    return max(_setting('WEATHER_CACHE_MIN_TTL'), min(ttl, interval))
+
+
+def _safe(operation, *args, **kwargs):
+    try:
+        return operation(*args, **kwargs)
+    except Exception as e:
+        logger.warning(f"访问天气缓存失败: {e}")
+        return None
+
+
+def refresh_lock_ttl():
+    """刷新锁的有效期（秒）：每个上游接口都等满超时并重试的最坏耗时"""
+    from src.utils.http_client import max_request_seconds
+    from src.utils.weather_api import REQUEST_TIMEOUT
+
+    return int(max_request_seconds(REQUEST_TIMEOUT) * UPSTREAMS) + 1
+
+
+def _acquire_lock(cache, lock_key):
+    """抢占刷新锁，成功时返回本次持有的令牌，否则返回None"""
+    token = uuid.uuid4().hex
+    return token if _safe(cache.add, lock_key, token, timeout=refresh_lock_ttl()) else None
+
+
+def _release_lock(cache, lock_key, token):
+    """只删除自己持有的锁，锁已被其他请求重新抢占时保留"""
+    if _safe(cache.get, lock_key) == token:
+        _safe(cache.delete, lock_key)
+
+
+def _result(entry):
+    """返回缓存数据的副本，调用方可以直接修改"""
+    return copy.deepcopy(entry['data']) if entry and entry.get('data') else None
+
+
+def _refresh(cache, key, entry, fetch, extensions, now, prefetched=False):
+    """访问上游并写回缓存，失败时继续使用旧数据
+
+    Args:
+        prefetched: 由预取任务写入，之后也由预取任务负责刷新
+    """
+    data = fetch()
+    if data:
+        ttl = weather_ttl(data, extensions, now)
+        stale_until = now + ttl + _setting('WEATHER_CACHE_STALE_SECONDS')
+        new_entry = {'data': data, 'fetched_at': now, 'fresh_until': now + ttl, 'stale_until': stale_until,
+                     'prefetched': prefetched}
+        _safe(cache.set, key, new_entry, timeout=int(stale_until - now) + 1)
+        return _result(new_entry)
+
+    failure_ttl = _setting('WEATHER_CACHE_FAILURE_TTL')
+    if entry and entry.get('data') and entry.get('stale_until', 0) > now:
+        logger.warning(f"天气接口请求失败，继续使用 {int(now - entry['fetched_at'])} 秒前的天气数据: {key}")
+        entry = dict(entry, fresh_until=max(entry.get('fresh_until', 0), now + failure_ttl))
+        _safe(cache.set, key, entry, timeout=int(entry['stale_until'] - now) + 1)
+        return _result(entry)
+
+    _safe(cache.set, key, {'data': None, 'fetched_at': now, 'fresh_until': now + failure_ttl,
+                           'stale_until': now + failure_ttl}, timeout=failure_ttl)
+    return None
+
+
+def get_cached_weather(city_adcode, extensions='base', activity_date=None):
+    """带缓存的 get_weather_data_with_fallback
+
+    Args:
+        city_adcode (str): 城市区域编码
+        extensions (str): base=实况天气，all=预报天气
+        activity_date (datetime): 活动日期，预报天气按该日期缓存，实况天气按当天缓存
+
+    Returns:
+        dict: 天气数据字典的副本，获取失败时返回None
+    """
+    from src.utils import weather_api
+
+    def fetch():
+        return weather_api.get_weather_data_with_fallback(city_adcode, extensions, activity_date)
+
+    # 没有应用上下文时无法访问共享缓存，直接请求上游
+    if not has_app_context():
+        return fetch()
+
+    key = weather_cache_key(city_adcode, extensions, activity_date)
+    lock_key = f'{key}:refreshing'
+    cache = _get_cache()
+    now = time.time()
+
+    entry = _safe(cache.get, key)
+    if entry and entry.get('fresh_until', 0) > now:
+        return _result(entry)
+    # 预取任务写入的数据由预取任务刷新，请求中不等待上游；
+    # 过期超过一个预取周期说明预取任务已不再刷新这条数据（活动已结束或取消等），照常刷新
+    prefetch_interval = _setting('WEATHER_PREFETCH_INTERVAL')
+    if (prefetch_interval > 0 and entry and entry.get('prefetched') and entry.get('data')
+            and entry.get('fresh_until', 0) + prefetch_interval > now and entry.get('stale_until', 0) > now):
+        return _result(entry)
+
+    token = _acquire_lock(cache, lock_key)
+    if token:
+        try:
+            return _refresh(cache, key, entry, fetch, extensions, now)
+        finally:
+            _release_lock(cache, lock_key, token)
+
+    # 其他请求正在刷新：有旧数据时直接返回旧数据，否则短暂等待刷新结果，超时后本次不显示天气
+    if entry and entry.get('stale_until', 0) > now:
+        return _result(entry)
+    deadline = time.monotonic() + min(_setting('WEATHER_REFRESH_WAIT_SECONDS'), refresh_lock_ttl())
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _safe(cache.get, key)
+        if entry and entry.get('fresh_until', 0) > time.time():
+            return _result(entry)
+        if _safe(cache.get, lock_key) is None:
+            break
+    entry = _safe(cache.get, key)
+    return _result(entry) if entry and entry.get('fresh_until', 0) > time.time() else None
+
+
+def refresh_weather(city_adcode, extensions='base', activity_date=None, margin=0):
+    """预取天气：缓存不存在或将在margin秒内过期时访问上游刷新（需要应用上下文）
+
+    其他请求或进程正在刷新同一条数据时跳过。
+
+    Returns:
+        bool: 是否访问了上游
+    """
+    from src.utils import weather_api
+
+    key = weather_cache_key(city_adcode, extensions, activity_date)
+    cache = _get_cache()
+    now = time.time()
+    entry = _safe(cache.get, key)
+    if entry and entry.get('fresh_until', 0) > now + margin:
+        return False
+
+    lock_key = f'{key}:refreshing'
+    token = _acquire_lock(cache, lock_key)
+    if not token:
+        return False
+    try:
+        _refresh(cache, key, entry,
+                 lambda: weather_api.get_weather_data_with_fallback(city_adcode, extensions, activity_date),
+                 extensions, now, prefetched=True)
+        return True
+    finally:
+        _release_lock(cache, lock_key, token)
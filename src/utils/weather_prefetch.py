@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+活动天气后台预取
+
+活动详情页的天气原先在请求中获取，缓存未命中时第一位访问者要等待天气接口（最长10秒超时）。
+这里的后台线程每隔WEATHER_PREFETCH_INTERVAL秒查找开始时间在天气显示范围内的进行中活动，
+按活动详情页相同的规则（实况/预报）调用get_weather_data_with_fallback，在缓存过期前刷新，
+请求中只读取缓存（见src/utils/weather_cache.py）。
+
+每个工作进程各启动一个线程；刷新前会检查缓存是否仍然有效并抢占刷新锁，多个进程不会重复请求上游。
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from src.utils.time_helpers import get_localized_now
+
+logger = logging.getLogger(__name__)
+
+_prefetcher_lock = threading.Lock()
+_prefetcher_thread = None
+
+
+def prefetch_targets(now=None):
+    """需要预取的天气：[(extensions, activity_date)]，同一天的活动只保留一条"""
+    from src.models import db, Activity
+    from src.utils.weather_api import FORECAST_DAYS, PAST_DAYS, activity_weather_request
+
+    now = now or get_localized_now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_times = db.session.execute(
+        db.select(Activity.start_time).where(
+            Activity.status == 'active',
+            Activity.start_time >= today - timedelta(days=PAST_DAYS),
+            Activity.start_time < today + timedelta(days=FORECAST_DAYS + 1)
+        ).order_by(Activity.start_time)
+    ).scalars().all()
+
+    targets = {}
+    for start_time in start_times:
+        request = activity_weather_request(start_time, now)
+        if request is None:
+            continue
+        extensions, activity_date = request
+        day = activity_date.date() if activity_date else None
+        targets.setdefault((extensions, day), request)
+    return list(targets.values())
+
+
+def prefetch_activity_weather(margin=0):
+    """为即将开始的活动刷新天气缓存（需要应用上下文）
+
+    Args:
+        margin: 缓存将在多少秒内过期时提前刷新
+
+    Returns:
+        int: 访问上游的次数
+    """
+    from src.utils.weather_api import CHONGQING_ADCODE
+    from src.utils.weather_cache import refresh_weather
+
+    refreshed = 0
+    for extensions, activity_date in prefetch_targets():
+        try:
+            if refresh_weather(CHONGQING_ADCODE, extensions, activity_date, margin=margin):
+                refreshed += 1
+        except Exception as e:
+            logger.warning(f"预取天气失败 ({extensions}, {activity_date}): {e}")
+    return refreshed
+
+
+def _prefetcher_loop(app, interval, stop_event):
+    # 启动后立即预取一次，之后每隔interval秒刷新将在下一个周期内过期的数据
+    while True:
+        with app.app_context():
+            from src.models import db
+            try:
+                refreshed = prefetch_activity_weather(margin=interval)
+                if refreshed:
+                    logger.info(f"已预取 {refreshed} 条活动天气数据")
+            except Exception as e:
+                logger.error(f"预取活动天气失败: {e}")
+            finally:
+                db.session.remove()
+        if stop_event.wait(interval):
+            return
+
+
+def start_weather_prefetcher(app):
+    """启动活动天气预取后台线程（每个进程只启动一次）
+
+    WEATHER_PREFETCH_INTERVAL为0时不启动，请求中按需获取天气。
+
+    Returns:
+        threading.Event: 用于停止线程的事件，未启动时返回None
+    """
+    global _prefetcher_thread
+
+    interval = app.config.get('WEATHER_PREFETCH_INTERVAL', 0)
+    if not interval or interval <= 0:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher_thread is not None and _prefetcher_thread.is_alive():
+            return _prefetcher_thread.stop_event
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_prefetcher_loop, args=(app, interval, stop_event),
+                                  name='weather-prefetcher', daemon=True)
+        thread.stop_event = stop_event
+        thread.start()
+        _prefetcher_thread = thread
+    logger.info(f"活动天气预取任务已启动，每{interval}秒刷新一次")
+    return stop_event
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试AI聊天流式代理：逐段转发本地模拟大模型的输出，结束后保存历史记录，请求期间不持有数据库连接
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.models import db, AIChatHistory
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.payloads.append(payload)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for text in ('你好', '，同学'):
+            chunk = {'choices': [{'delta': {'content': text}}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_llm(app, monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    server.payloads = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.delenv('ARK_API_KEY', raising=False)
+    monkeypatch.setitem(app.config, 'VOLCANO_API_KEY', 'test-key')
+    monkeypatch.setitem(app.config, 'VOLCANO_API_URL', f'http://127.0.0.1:{server.server_address[1]}/chat')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(client, url):
+    """在独立线程中发送请求，避免复用测试线程的应用上下文"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=client.get(url, buffered=False)))
+    thread.start()
+    thread.join()
+    return result['response']
+
+
+def test_stream_proxies_chunks_and_saves_history(app, admin_client, admin_user, stub_llm):
+    admin_id = admin_user.id
+    db.session.remove()
+    response = _get(admin_client, '/api/ai_chat?message=在吗&session_id=s1')
+    assert response.mimetype == 'text/event-stream'
+
+    chunks = iter(response.response)
+    # 开始转发上游输出时请求上下文已结束，连接池中没有被占用的连接
+    first = next(chunks)
+    assert json.loads(first.decode('utf-8')[len('data: '):]) == {'content': '你好'}
+    assert db.engine.pool.checkedout() == 0
+
+    rest = b''.join(chunks).decode('utf-8')
+    response.close()
+    assert f"data: {json.dumps({'content': '，同学'})}" in rest
+    assert rest.endswith('event: done\ndata: {}\n\n')
+
+    assert stub_llm.payloads[0]['stream'] is True
+    assert stub_llm.payloads[0]['messages'][-1] == {'role': 'user', 'content': '在吗'}
+
+    db.session.expire_all()
+    history = db.session.execute(
+        db.select(AIChatHistory).filter_by(session_id='s1').order_by(AIChatHistory.id)
+    ).scalars().all()
+    assert [(h.role, h.content, h.user_id) for h in history] == [
+        ('user', '在吗', admin_id),
+        ('assistant', '你好，同学', admin_id),
+    ]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试系统日志异步批量写入：请求中记录日志不提交事务，后台批量写入，队列有界
+"""
+
+import threading
+
+from src.models import db, SystemLog
+from src.routes.utils import log_action
+from src.utils.audit_log import AuditLogWriter, audit_log
+
+
+def _post(client, url, data):
+    """在独立线程中发送请求，避免复用测试线程的应用上下文和登录用户"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=client.post(url, data=data)))
+    thread.start()
+    thread.join()
+    return result['response']
+
+
+def test_log_action_does_not_write_in_request(app, clean_db, sql_statements):
+    with sql_statements() as statements, sql_statements(main_thread_only=True) as request_statements:
+        with app.test_request_context('/'):
+            for i in range(5):
+                log_action('test_action', f'第{i}条')
+        # 请求线程中没有写入日志
+        assert not [s for s in request_statements if 'system_logs' in s]
+        audit_log.flush()
+
+    # 5条日志合并为批量INSERT（后台线程已取出的一批和flush取出的剩余部分）
+    assert 1 <= len([s for s in statements if 'system_logs' in s]) <= 2
+    logs = db.session.execute(db.select(SystemLog).filter_by(action='test_action')).scalars().all()
+    assert sorted(log.details for log in logs) == [f'第{i}条' for i in range(5)]
+
+
+def test_login_is_logged_in_background(app, client, admin_user):
+    response = _post(client, '/auth/login', {'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 302
+    audit_log.flush()
+    log = db.session.execute(db.select(SystemLog).filter_by(action='用户登录')).scalar_one()
+    assert log.user_id == admin_user.id
+
+
+def test_queue_is_bounded(app, clean_db, monkeypatch):
+    app.config['AUDIT_LOG_QUEUE_SIZE'] = 2
+    try:
+        writer = AuditLogWriter(app)
+    finally:
+        app.config['AUDIT_LOG_QUEUE_SIZE'] = 10000
+    # 不启动后台线程，保证队列中的日志都还未写入
+    monkeypatch.setattr(writer, '_ensure_thread', lambda: None)
+
+    assert writer.log('bounded', '1')
+    assert writer.log('bounded', '2')
+    assert not writer.log('bounded', '3')
+    assert writer.dropped == 1
+
+    writer.shutdown()
+    count = db.session.execute(db.select(db.func.count()).select_from(SystemLog).filter_by(action='bounded')).scalar()
+    assert count == 2
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量写入：按批写入、冲突时更新或跳过，PostgreSQL使用多行VALUES；恢复策略改用批量写入后结果不变
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.batch_upsert import BatchUpsert
+from src.db_sync import DatabaseSyncer
+
+
+@pytest.fixture
+def conn(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}")
+    with engine.connect() as conn:
+        conn.execute(text('CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, email TEXT)'))
+        conn.execute(text('CREATE TABLE system_logs (id INTEGER PRIMARY KEY, action TEXT)'))
+        conn.commit()
+        yield conn
+    engine.dispose()
+
+
+def _all(conn, table):
+    return [tuple(row) for row in conn.execute(text(f'SELECT * FROM {table} ORDER BY id'))]
+
+
+def test_insert_update_and_ignore(conn):
+    columns = ['id', 'username', 'email']
+    assert BatchUpsert(conn, 'users', columns, batch_size=2).write(
+        [(1, 'a', 'a@x'), (2, 'b', 'b@x'), (3, 'c', 'c@x')]) == 3
+
+    assert BatchUpsert(conn, 'users', columns, on_conflict='update', update_columns=['email']).write(
+        [(1, 'renamed', 'a@y'), (4, 'd', 'd@x')]) == 2
+    # 按id以外的唯一约束跳过冲突
+    assert BatchUpsert(conn, 'users', columns, on_conflict='ignore', conflict_columns=None).write(
+        [(5, 'b', 'dup@x'), (6, 'e', 'e@x')]) == 1
+
+    assert _all(conn, 'users') == [(1, 'a', 'a@y'), (2, 'b', 'b@x'), (3, 'c', 'c@x'), (4, 'd', 'd@x'), (6, 'e', 'e@x')]
+
+
+def test_postgresql_uses_multi_row_values():
+    executed = []
+    fake = SimpleNamespace(
+        dialect=SimpleNamespace(name='postgresql'),
+        execute=lambda stmt, params: executed.append((str(stmt), params)) or SimpleNamespace(rowcount=len(params) // 2)
+    )
+    writer = BatchUpsert(fake, 'roles', ['id', 'name'], on_conflict='update', batch_size=3)
+    assert writer.write([(i, f'r{i}') for i in range(7)]) == 7
+
+    assert len(executed) == 3
+    sql, params = executed[0]
+    assert sql == ('INSERT INTO "roles" ("id", "name") VALUES (:p0, :p1), (:p2, :p3), (:p4, :p5) '
+                   'ON CONFLICT ("id") DO UPDATE SET "name" = excluded."name"')
+    assert params == {'p0': 0, 'p1': 'r0', 'p2': 1, 'p3': 'r1', 'p4': 2, 'p5': 'r2'}
+    assert executed[2][1] == {'p0': 6, 'p1': 'r6'}
+    # 每批的参数个数不超过PostgreSQL的上限
+    assert BatchUpsert(fake, 'wide', [f'c{i}' for i in range(100)], batch_size=5000).batch_size == 655
+
+
+def test_restore_strategies_use_batches(conn):
+    conn.execute(text("INSERT INTO users (id, username, email) VALUES (1, 'admin', 'admin@x')"))
+    conn.execute(text("INSERT INTO system_logs (id, action) VALUES (1, 'existing'), (2, 'existing')"))
+    conn.commit()
+    syncer = DatabaseSyncer()
+
+    backup_users = conn.execute(text(
+        "SELECT 1 AS id, 'admin' AS username, 'old@x' AS email UNION ALL SELECT 2, 'alice', 'alice@x'"
+    )).fetchall()
+    assert syncer._migrate_users_smart(conn, None, backup_users, ['id', 'username', 'email']) == (True, 1)
+
+    assert syncer._migrate_table_append(conn, 'system_logs', [(1, 'login'), (5, 'logout')], ['id', 'action']) == (True, 2)
+
+    assert _all(conn, 'users') == [(1, 'admin', 'admin@x'), (2, 'alice', 'alice@x')]
+    assert _all(conn, 'system_logs') == [(1, 'existing'), (2, 'existing'), (3, 'login'), (5, 'logout')]
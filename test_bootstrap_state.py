@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试系统初始化状态：全新安装时首页跳转到管理员设置页面，创建管理员后首页不再查询角色和用户表
+"""
+
+from src.models import db, User
+
+
+def _record_statements(sql_statements, client, path):
+    with sql_statements() as statements:
+        response = client.get(path)
+    return response, statements
+
+
+def test_fresh_install_redirects_to_setup_admin(app, client, sql_statements):
+    response = client.get('/')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/auth/setup-admin')
+
+    response = client.post('/auth/setup-admin', data={
+        'username': 'root',
+        'email': 'root@example.com',
+        'password': 'Passw0rd!',
+        'confirm_password': 'Passw0rd!',
+    })
+    assert response.status_code == 302
+    assert db.session.execute(db.select(User).filter_by(username='root')).scalar_one_or_none()
+
+    response, statements = _record_statements(sql_statements, client, '/')
+    assert response.status_code == 200
+    assert not any('FROM roles' in s for s in statements)
+
+
+def test_admin_check_is_free_after_initialization(app, client, admin_user, sql_statements):
+    response, statements = _record_statements(sql_statements, client, '/')
+    assert response.status_code == 200
+
+    response, statements = _record_statements(sql_statements, client, '/')
+    assert response.status_code == 200
+    assert not any('FROM roles' in s or 'FROM users' in s for s in statements)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试每日统计汇总：写入钩子累加的结果与根据源表回填的结果一致，统计页面和接口只读取汇总表
+"""
+
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Activity, DailyStats, DAILY_STATS_COLUMNS, PointsHistory, Registration, Role, StudentInfo, User
+from src.utils import daily_stats
+from src.utils.daily_stats import backfill_daily_stats, daily_series, refresh_recent_days
+
+
+def _snapshot():
+    rows = db.session.execute(db.select(DailyStats).order_by(DailyStats.stat_date)).scalars().all()
+    return {row.stat_date: tuple(getattr(row, name) for name in DAILY_STATS_COLUMNS)
+            for row in rows if any(getattr(row, name) for name in DAILY_STATS_COLUMNS)}
+
+
+def _seed(admin):
+    now = datetime.utcnow()
+    role = Role(name='Student', description='学生')
+    db.session.add(role)
+    db.session.flush()
+    students = [User(username=f'student{i}', email=f'student{i}@example.com',
+                     password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000'), role_id=role.id,
+                     created_at=now - timedelta(days=i))
+                for i in range(3)]
+    db.session.add_all(students)
+    activities = [Activity(title=f'活动{i}', status='active', created_by=admin.id, created_at=now - timedelta(days=days_ago),
+                           start_time=now + timedelta(days=1), end_time=now + timedelta(days=2))
+                  for i, days_ago in enumerate([0, 3, 30])]
+    db.session.add_all(activities)
+    db.session.flush()
+    info = StudentInfo(student_id='S1', real_name='学生', user_id=students[0].id)
+    db.session.add(info)
+    db.session.flush()
+
+    registrations = [
+        Registration(user_id=students[0].id, activity_id=activities[0].id, register_time=now),
+        Registration(user_id=students[1].id, activity_id=activities[0].id, register_time=now - timedelta(days=1)),
+        Registration(user_id=students[2].id, activity_id=activities[1].id, register_time=now - timedelta(days=3)),
+    ]
+    db.session.add_all(registrations)
+    db.session.add_all([
+        PointsHistory(student_id=info.id, points=10, created_at=now),
+        PointsHistory(student_id=info.id, points=5, created_at=now),
+        PointsHistory(student_id=info.id, points=-3, created_at=now),
+    ])
+    db.session.commit()
+
+    # 签到后再取消签到，再重新签到
+    registrations[0].check_in_time = now
+    db.session.commit()
+    registrations[1].check_in_time = now - timedelta(days=1)
+    db.session.commit()
+    registrations[1].check_in_time = None
+    db.session.commit()
+    registrations[1].check_in_time = now
+    db.session.commit()
+    return now
+
+
+def test_write_hooks_match_backfill(app, admin_user):
+    now = _seed(admin_user)
+    today = now.date()
+
+    incremental = _snapshot()
+    # 管理员账户和student0都是今天注册的；第二次签到从昨天改到了今天
+    assert incremental[today] == (1, 1, 2, 2, 15)
+    assert incremental[today - timedelta(days=30)][0] == 1
+
+    db.session.execute(db.delete(DailyStats))
+    db.session.commit()
+    assert backfill_daily_stats() > 30
+    db.session.commit()
+    assert _snapshot() == incremental
+
+    # 删除记录由定时任务重新汇总最近几天修正
+    db.session.execute(db.delete(Registration).where(Registration.user_id != admin_user.id))
+    db.session.commit()
+    refresh_recent_days(2)
+    db.session.commit()
+    series = daily_series(today - timedelta(days=1), 2)
+    assert series['registrations'] == [0, 0]
+    assert series['checkins'] == [0, 0]
+
+
+def test_statistics_pages_read_rollup_only(app, admin_client, admin_user, sql_statements):
+    _seed(admin_user)
+    with sql_statements() as statements:
+        page = admin_client.get('/admin/statistics')
+        ext = admin_client.get('/admin/api/statistics_ext')
+
+    assert page.status_code == 200
+    trend = ext.get_json()['registration_trend']
+    assert len(trend['labels']) == 31
+    assert trend['data'][-3:] == [1, 1, 2]
+    assert sum(trend['data']) == 4
+    # 不再对报名和用户表按日期分组
+    assert not [s for s in statements if 'date(' in s.lower() and 'group by' in s.lower()]
+
+
+def test_refresh_uses_reader_clock(monkeypatch):
+    # 定时任务的"今天"与统计页面读取时使用同一个时钟
+    monkeypatch.setattr(daily_stats, 'get_localized_now', lambda: datetime(2026, 10, 18, 1, 30))
+    windows = []
+    monkeypatch.setattr(daily_stats, 'rollup_days', lambda start, end, connection=None: windows.append((start, end)))
+    refresh_recent_days(2)
+    assert windows == [(datetime(2026, 10, 17).date(), datetime(2026, 10, 18).date())]
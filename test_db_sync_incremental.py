@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试增量备份：首次整表复制并建立水位线，之后只复制变更的行，按墓碑删除，行数校验修正没有墓碑的删除
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src import db
+from src.db_sync import DatabaseSyncer
+from src.models import SystemLog, SyncTombstone
+
+
+def _rows(engine, table, order_by='id'):
+    with engine.connect() as conn:
+        return conn.execute(text(f'SELECT * FROM "{table}" ORDER BY {order_by}')).all()
+
+
+@pytest.fixture
+def databases(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    backup = create_engine(f"sqlite:///{tmp_path / 'backup.db'}")
+    for engine in (primary, backup):
+        db.metadata.create_all(engine)
+    with primary.begin() as conn:
+        conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'Admin')"))
+        conn.execute(text("INSERT INTO users (id, username, email, password_hash, role_id) "
+                          "VALUES (1, 'admin', 'a@example.com', 'x', 1)"))
+        conn.execute(text("INSERT INTO activities (id, title, created_by, updated_at) VALUES "
+                          "(1, '植树', 1, '2026-10-10 10:00:00'), (2, '支教', 1, '2026-10-17 10:00:00')"))
+        conn.execute(text("INSERT INTO system_logs (id, user_id, action, details) VALUES (:id, 1, 'login', :details)"),
+                      [{'id': i, 'details': f'第{i}次登录'} for i in range(1, 6)])
+    return primary, backup
+
+
+@pytest.fixture
+def syncer(databases, monkeypatch):
+    primary, backup = databases
+    syncer = DatabaseSyncer()
+    syncer.dual_db = SimpleNamespace(primary_db_url=str(primary.url), backup_db_url=str(backup.url),
+                                     is_dual_db_enabled=lambda: True)
+    syncer.upserts = []
+    original = syncer._upsert_rows
+
+    def record_upsert(conn, table_name, columns, pk_columns, rows):
+        syncer.upserts.extend((table_name, row[0]) for row in rows)
+        return original(conn, table_name, columns, pk_columns, rows)
+
+    monkeypatch.setattr(syncer, '_upsert_rows', record_upsert)
+    return syncer
+
+
+def test_incremental_backup_ships_only_changes(databases, syncer):
+    primary, backup = databases
+    assert syncer.incremental_backup_to_clawcloud()
+    for table in ('users', 'activities', 'system_logs'):
+        assert _rows(backup, table) == _rows(primary, table)
+    watermarks = dict((row[0], row) for row in _rows(backup, 'sync_watermarks', 'table_name'))
+    assert watermarks['system_logs'][1] == 5
+    assert watermarks['activities'][2] == '2026-10-17 10:00:00'
+    # 首次同步整表复制，不走upsert
+    assert syncer.upserts == []
+
+    with primary.begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, user_id, action, details) VALUES "
+                          "(6, 1, 'logout', '退出'), (7, 1, 'login', '再次登录')"))
+        conn.execute(text("UPDATE activities SET title = '秋季植树', updated_at = '2026-10-18 12:00:00' WHERE id = 1"))
+        conn.execute(text("UPDATE users SET email = 'admin@example.com' WHERE id = 1"))
+        # 有墓碑的删除和绕过ORM的批量删除
+        conn.execute(text("DELETE FROM system_logs WHERE id IN (1, 2)"))
+        conn.execute(text("INSERT INTO sync_tombstones (table_name, row_id) VALUES ('system_logs', '1')"))
+
+    assert syncer.incremental_backup_to_clawcloud()
+    for table in ('users', 'activities', 'system_logs'):
+        assert _rows(backup, table) == _rows(primary, table)
+    # 只upsert新增的日志和变更时间在水位线（含回看时间）之后的活动
+    assert sorted(syncer.upserts) == [('activities', 1), ('activities', 2), ('system_logs', 6), ('system_logs', 7)]
+    assert any(entry['action'] == '校验 system_logs' for entry in syncer.sync_log)
+    # 已同步的墓碑被清理
+    assert _rows(primary, 'sync_tombstones') == []
+    watermarks = dict((row[0], row) for row in _rows(backup, 'sync_watermarks', 'table_name'))
+    assert watermarks['system_logs'][1] == 7
+
+    syncer.upserts.clear()
+    assert syncer.incremental_backup_to_clawcloud()
+    assert [t for t, _ in syncer.upserts if t == 'system_logs'] == []
+
+
+def test_orm_deletes_record_tombstones(clean_db, admin_user):
+    log = SystemLog(user_id=admin_user.id, action='test', details='待删除')
+    db.session.add(log)
+    db.session.commit()
+    log_id = log.id
+
+    db.session.delete(log)
+    db.session.commit()
+
+    tombstones = db.session.execute(db.select(SyncTombstone)).scalars().all()
+    assert [(t.table_name, t.row_id) for t in tombstones] == [('system_logs', str(log_id))]
+
+
+def test_row_verification_diffs_in_chunks(databases, syncer, monkeypatch):
+    primary, backup = databases
+    assert syncer.incremental_backup_to_clawcloud()
+
+    # 绕过ORM删除主库中间的行，备份库多出主库最大主键之后的行
+    with primary.begin() as conn:
+        conn.execute(text("DELETE FROM system_logs WHERE id IN (2, 4)"))
+    with backup.begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, user_id, action) VALUES (9, 1, 'stray')"))
+        conn.execute(text("DELETE FROM system_logs WHERE id = 5"))
+
+    monkeypatch.setattr('src.db_sync.FALLBACK_FETCH_ROWS', 2)
+    with primary.connect() as p, backup.connect() as b:
+        assert syncer._verify_table_rows(p, b, 'system_logs', 'id') == 4
+        b.commit()
+    assert _rows(backup, 'system_logs') == _rows(primary, 'system_logs')
+    assert syncer.upserts == [('system_logs', 5)]
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试备份同步的流式传输：COPY管道按块传递数据且缓存有上限，导出失败时中止导入；
+SQLite等不支持COPY时分批读取主表并批量插入
+"""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src import db_sync
+from src.db_sync import CopyStream, DatabaseSyncer
+
+
+def test_copy_stream_is_bounded():
+    stream = CopyStream(chunk_size=64, max_chunks=2)
+    lines = [f'{i}\t用户{i}\n'.encode('utf-8') for i in range(2000)]
+    max_pending = []
+
+    def export():
+        for line in lines:
+            stream.write(line)
+            max_pending.append(stream._queue.qsize())
+        stream.finish()
+
+    exporter = threading.Thread(target=export)
+    exporter.start()
+    received = bytearray()
+    while True:
+        data = stream.read(50)
+        if not data:
+            break
+        assert len(data) <= 50
+        received += data
+    exporter.join()
+
+    assert bytes(received) == b''.join(lines)
+    assert max(max_pending) <= 2
+
+
+def test_copy_stream_propagates_export_error():
+    stream = CopyStream(chunk_size=8, max_chunks=1)
+    stream.write(b'1\ta\n')
+    stream.finish(RuntimeError('连接断开'))
+    with pytest.raises(IOError):
+        while stream.read(8192):
+            pass
+
+
+def test_copy_stream_close_unblocks_exporter():
+    stream = CopyStream(chunk_size=1, max_chunks=1)
+    errors = []
+
+    def export():
+        try:
+            for _ in range(10):
+                stream.write(b'x')
+        except IOError as e:
+            errors.append(e)
+
+    exporter = threading.Thread(target=export)
+    exporter.start()
+    stream.close()
+    exporter.join(timeout=5)
+    assert not exporter.is_alive() and errors
+
+
+def test_backup_streams_sqlite_tables(tmp_path, monkeypatch):
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    backup_url = f"sqlite:///{tmp_path / 'backup.db'}"
+    schema = ['CREATE TABLE tags (id INTEGER PRIMARY KEY, name TEXT)',
+              'CREATE TABLE system_logs (id INTEGER PRIMARY KEY, action TEXT, details TEXT)']
+    for url in (primary_url, backup_url):
+        with create_engine(url).begin() as conn:
+            for statement in schema:
+                conn.execute(text(statement))
+    with create_engine(primary_url).begin() as conn:
+        conn.execute(text('INSERT INTO tags (id, name) VALUES (1, :name)'), {'name': '志愿'})
+        conn.execute(text('INSERT INTO system_logs (id, action, details) VALUES (:id, :action, :details)'),
+                     [{'id': i, 'action': 'login', 'details': f'第{i}条'} for i in range(1, 2501)])
+    with create_engine(backup_url).begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, action, details) VALUES (9999, 'old', '旧数据')"))
+
+    monkeypatch.setattr(db_sync, 'FALLBACK_FETCH_ROWS', 700)
+    batches = []
+    syncer = DatabaseSyncer()
+    syncer.dual_db = SimpleNamespace(primary_db_url=primary_url, backup_db_url=backup_url,
+                                     is_dual_db_enabled=lambda: True)
+    original = syncer._batch_insert_fallback
+
+    def record_batch(conn, table_name, columns, column_names, rows):
+        batches.append((table_name, len(rows)))
+        return original(conn, table_name, columns, column_names, rows)
+
+    monkeypatch.setattr(syncer, '_batch_insert_fallback', record_batch)
+
+    assert syncer.backup_to_clawcloud()
+    with create_engine(backup_url).connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*), MAX(id) FROM system_logs')).one() == (2500, 2500)
+        assert conn.execute(text('SELECT name FROM tags')).scalar() == '志愿'
+    # 主表分批读取，每批不超过FALLBACK_FETCH_ROWS行
+    assert [n for t, n in batches if t == 'system_logs'] == [700, 700, 700, 400]
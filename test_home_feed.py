@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试首页数据快照：重复访问首页不再查询活动表，管理员修改活动后快照失效
+"""
+
+from datetime import datetime, timedelta
+
+from src.models import db, Activity
+from src.utils import home_feed
+
+
+def _create_activity(admin, title):
+    activity = Activity(
+        title=title,
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=datetime.utcnow() + timedelta(days=3),
+        end_time=datetime.utcnow() + timedelta(days=3, hours=2),
+        registration_deadline=datetime.utcnow() + timedelta(days=2),
+        status='active',
+        is_featured=True,
+        created_by=admin.id
+    )
+    db.session.add(activity)
+    db.session.commit()
+    return activity
+
+
+def _activity_queries(sql_statements, client, path='/'):
+    with sql_statements() as statements:
+        response = client.get(path)
+    assert response.status_code == 200
+    return response, [s for s in statements if 'FROM activities' in s]
+
+
+def test_home_feed_is_cached_and_invalidated(app, admin_client, admin_user, sql_statements, monkeypatch):
+    monkeypatch.setitem(app.config, 'HOME_FEED_TTL', 60)
+    home_feed.invalidate_home_feed()
+    activity = _create_activity(admin_user, '首页快照活动')
+
+    response, queries = _activity_queries(sql_statements, admin_client)
+    assert queries
+    assert '首页快照活动' in response.get_data(as_text=True)
+
+    response, queries = _activity_queries(sql_statements, admin_client)
+    assert not queries
+    assert '首页快照活动' in response.get_data(as_text=True)
+
+    # 管理员修改活动状态后快照失效
+    response = admin_client.post(f'/admin/activity/{activity.id}/change_status', data={'status': 'cancelled'})
+    assert response.get_json()['success']
+
+    response, queries = _activity_queries(sql_statements, admin_client)
+    assert queries
+    assert '首页快照活动' not in response.get_data(as_text=True)
+    home_feed.invalidate_home_feed()
+
+
+def test_home_feed_expires_after_ttl(app, clean_db, admin_user, monkeypatch):
+    monkeypatch.setitem(app.config, 'HOME_FEED_TTL', 60)
+    home_feed.invalidate_home_feed()
+    _create_activity(admin_user, '过期测试活动')
+
+    with app.test_request_context('/'):
+        now = datetime.utcnow()
+        first = home_feed.get_home_feed(now)
+        assert home_feed.get_home_feed(now) is first
+        assert [a.title for a in first.featured_activities] == ['过期测试活动']
+
+        clock = home_feed.time.time() + 61
+        monkeypatch.setattr(home_feed.time, 'time', lambda: clock)
+        assert home_feed.get_home_feed(now) is not first
+    home_feed.invalidate_home_feed()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试对外HTTP客户端：同一主机复用keep-alive连接，幂等请求遇到503自动重试，POST不重试，统计建立连接和总耗时
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.utils.http_client import HttpClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self):
+        self.server.hits += 1
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            status, body = 503, b'{}'
+        else:
+            status, body = 200, json.dumps({'hits': self.server.hits}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._reply()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.hits = 0
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(app):
+    app.config['HTTP_RETRY_BACKOFF'] = 0
+    try:
+        with app.app_context():
+            client = HttpClient()
+            yield client
+            client.reset()
+    finally:
+        app.config['HTTP_RETRY_BACKOFF'] = 0.5
+
+
+def test_reuses_connections(server, client):
+    url = f'http://127.0.0.1:{server.server_address[1]}/weather'
+    for i in range(5):
+        assert client.get(url, timeout=5).json() == {'hits': i + 1}
+
+    stats = client.stats()[f'127.0.0.1:{server.server_address[1]}']
+    assert stats['requests'] == 5
+    assert stats['new_connections'] == 1
+    assert stats['errors'] == 0
+    assert stats['avg_total_ms'] >= 0 and stats['max_total_ms'] >= stats['avg_total_ms']
+
+
+def test_retries_idempotent_requests_only(server, client):
+    url = f'http://127.0.0.1:{server.server_address[1]}/api'
+
+    server.failures = 2
+    assert client.get(url, timeout=5).status_code == 200
+    assert server.hits == 3
+
+    server.failures = 1
+    assert client.post(url, json={}, timeout=5).status_code == 503
+    assert server.hits == 4
+
+
+def test_records_connect_errors(client):
+    # 没有服务监听的端口，建立连接失败并计入错误
+    with pytest.raises(Exception):
+        client.get('http://127.0.0.1:9/unreachable', timeout=1)
+    assert client.stats()['127.0.0.1:9']['errors'] == 1
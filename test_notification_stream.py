@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试通知推送：SSE连接先收到未读快照，管理员发布通知和消息后推送给在线学生，空闲时不查询数据库
+"""
+
+import json
+import threading
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Role, User, StudentInfo
+from src.utils.notification_hub import NotificationHub, notification_hub, stream_connection_limit
+
+
+def _request(method, client, url, data=None):
+    """在独立线程中发送请求，避免复用测试线程的应用上下文和登录用户"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=getattr(client, method)(url, data=data)))
+    thread.start()
+    thread.join()
+    return result['response']
+
+
+def _read_event(chunks):
+    """读取下一条SSE事件（跳过retry和心跳）"""
+    for chunk in chunks:
+        text = chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+        if text.startswith('event: '):
+            lines = text.strip().split('\n')
+            return lines[0][len('event: '):], json.loads(lines[1][len('data: '):])
+    return None
+
+
+def test_hub_targets_users():
+    hub = NotificationHub()
+    first = hub.subscribe(1)
+    second = hub.subscribe(2)
+
+    hub.publish('messages', {'count': 3}, user_ids=[1])
+    hub.publish('notification', {'id': 7})
+    assert first.get(0.1) == ('messages', {'count': 3})
+    assert first.get(0.1) == ('notification', {'id': 7})
+    assert second.get(0.1) == ('notification', {'id': 7})
+    assert second.get(0.01) is None
+
+    first.close()
+    second.close()
+    assert hub.subscriber_count() == 0
+
+
+def _create_student():
+    role = Role(name='Student', description='学生')
+    db.session.add(role)
+    db.session.flush()
+    student = User(username='student', email='student@example.com',
+                   password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000'), role_id=role.id)
+    db.session.add(student)
+    db.session.flush()
+    db.session.add(StudentInfo(user_id=student.id, student_id='S1', real_name='学生'))
+    db.session.commit()
+    return student.id
+
+
+def _login(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def test_stream_pushes_notifications_and_messages(app, admin_user, sql_statements):
+    student_id, admin_id = _create_student(), admin_user.id
+
+    student_client = _login(app, student_id)
+    admin_client = _login(app, admin_id)
+
+    app.config['NOTIFICATION_STREAM_TIMEOUT'] = 5
+    try:
+        response = student_client.get('/student/api/notifications/stream', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = iter(response.response)
+
+        assert _read_event(chunks) == ('snapshot', {'notifications': [], 'message_count': 0})
+
+        with sql_statements(main_thread_only=True) as statements:
+            created = _request('post', admin_client, '/admin/notification/create',
+                               {'title': '停课通知', 'content': '明天停课', 'is_important': 'y'})
+            assert created.status_code == 302
+            name, data = _read_event(chunks)
+            assert name == 'notification'
+            assert data['title'] == '停课通知' and data['is_important']
+
+            sent = _request('post', admin_client, '/admin/message/create',
+                            {'receiver_id': student_id, 'subject': '你好', 'content': '消息内容'})
+            assert sent.status_code == 302
+            assert _read_event(chunks) == ('messages', {'count': 1})
+        # 推送过程中学生的连接没有查询数据库
+        assert statements == []
+        response.close()
+    finally:
+        app.config['NOTIFICATION_STREAM_TIMEOUT'] = 300
+
+
+def test_stream_not_available_for_admin(admin_client):
+    response = admin_client.get('/student/api/notifications/stream')
+    assert response.status_code == 204
+
+
+def test_stream_falls_back_to_polling_without_capacity(app, clean_db, monkeypatch):
+    # 线程工作进程默认不提供推送
+    assert stream_connection_limit({'NOTIFICATION_STREAM_MAX_CONNECTIONS': None}) == 0
+    student_client = _login(app, _create_student())
+
+    monkeypatch.setitem(app.config, 'NOTIFICATION_STREAM_MAX_CONNECTIONS', 0)
+    response = student_client.get('/student/api/notifications/stream')
+    assert response.mimetype == 'text/event-stream'
+    assert _read_event(iter(response.response)) == ('fallback', {'poll': True})
+
+    # 连接数已满时同样改为轮询，不占用处理请求的线程
+    monkeypatch.setitem(app.config, 'NOTIFICATION_STREAM_MAX_CONNECTIONS', 1)
+    held = notification_hub.subscribe(0)
+    try:
+        response = student_client.get('/student/api/notifications/stream')
+        assert _read_event(iter(response.response)) == ('fallback', {'poll': True})
+    finally:
+        held.close()
+    assert notification_hub.subscriber_count() == 0
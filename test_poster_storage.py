@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试海报存储与输出：列表类页面不应读取poster_data列，?w=参数返回缩略图变体，
+条件请求命中ETag时不读取海报二进制数据
+"""
+
+import os
+from io import BytesIO
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from src.models import db, Activity
+
+
+def _png_bytes(width=1600, height=900):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (200, 40, 40, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _create_poster_activity(admin, title='海报活动', featured=True, data=None):
+    activity = Activity(
+        title=title,
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=datetime.utcnow() + timedelta(days=3),
+        end_time=datetime.utcnow() + timedelta(days=3, hours=2),
+        registration_deadline=datetime.utcnow() + timedelta(days=2),
+        status='active',
+        is_featured=featured,
+        created_by=admin.id
+    )
+    activity.set_poster('activity_test_poster.png', data or (b'\x89PNG' + b'\x00' * 4096), 'image/png')
+    db.session.add(activity)
+    db.session.commit()
+    return activity
+
+
+def test_index_does_not_load_poster_data(app, client, admin_user, sql_statements):
+    activity = _create_poster_activity(admin_user)
+    assert activity.poster_size == 4100
+    db.session.expunge_all()
+
+    with sql_statements() as statements:
+        response = client.get('/')
+
+    assert response.status_code == 200
+    assert any('activities' in s for s in statements)
+    assert not any('poster_data' in s for s in statements)
+
+
+def test_poster_endpoint_still_serves_blob(app, client, admin_user):
+    activity = _create_poster_activity(admin_user)
+    assert activity.poster_url == f'/poster/{activity.id}?v={activity.poster_version}'
+
+    response = client.get(f'/poster/{activity.id}')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data.startswith(b'\x89PNG')
+
+
+def test_poster_variant_is_resized_and_cached(app, client, admin_user, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'POSTER_CACHE_FOLDER', str(tmp_path))
+    activity = _create_poster_activity(admin_user, data=_png_bytes())
+
+    response = client.get(f'/poster/{activity.id}?w=300', headers={'Accept': 'image/webp,*/*'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert 'Accept' in response.headers.get('Vary', '')
+    with Image.open(BytesIO(response.data)) as img:
+        assert img.size == (400, 225)
+
+    cached = [name for _, _, files in os.walk(tmp_path) for name in files]
+    assert any(name.endswith('_w400.webp') for name in cached)
+
+    # 不支持WebP的客户端获得JPEG
+    response = client.get(f'/poster/{activity.id}?w=800', headers={'Accept': 'image/*'})
+    assert response.mimetype == 'image/jpeg'
+    with Image.open(BytesIO(response.data)) as img:
+        assert img.size == (800, 450)
+
+
+def test_poster_conditional_get_skips_blob(app, client, admin_user, sql_statements):
+    activity = _create_poster_activity(admin_user)
+    url = activity.poster_url
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'max-age=31536000' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert activity.poster_hash in etag
+
+    db.session.expunge_all()
+    with sql_statements() as statements:
+        response = client.get(url, headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert not any('poster_data' in s for s in statements)
+
+    # 版本号不匹配的URL只允许短期缓存
+    response = client.get(f'/poster/{activity.id}?v=stale')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['Cache-Control']
+
+
+def test_poster_resolution_uses_index_without_filesystem(app, admin_user, tmp_path, monkeypatch):
+    from src.routes.main import process_activity_poster
+    from src.utils.poster_index import PosterIndex
+
+    for name in ('activity_7_20240101000000.png', 'activity_7_20240301000000.png', 'activity_8_20240101000000.jpg', 'legacy_poster.jpg'):
+        (tmp_path / name).write_bytes(b'x')
+    index = PosterIndex()
+    assert index.build(str(tmp_path)) == 3
+    monkeypatch.setattr('src.utils.poster_index.poster_index', index)
+
+    def _forbidden(*args, **kwargs):
+        raise AssertionError('热路径不应访问文件系统')
+
+    monkeypatch.setattr(os, 'listdir', _forbidden)
+    monkeypatch.setattr(os.path, 'exists', _forbidden)
+
+    activity = Activity(id=7, poster_image='activity_7_20240101000000.png')
+    process_activity_poster(activity)
+    assert activity.poster_image == 'activity_7_20240301000000.png'
+
+    missing = Activity(id=9, poster_image='activity_9_20240101000000.png')
+    process_activity_poster(missing)
+    assert missing.poster_image == 'landscape.jpg'
+
+    index.register(9, 'activity_9_20240501000000.png')
+    missing.poster_image = 'activity_9_20240101000000.png'
+    process_activity_poster(missing)
+    assert missing.poster_image == 'activity_9_20240501000000.png'
+
+    # 不符合上传命名格式的旧海报文件同样保留
+    legacy = Activity(id=10, poster_image='legacy_poster.jpg')
+    process_activity_poster(legacy)
+    assert legacy.poster_image == 'legacy_poster.jpg'
+
+    index.discard(7, 'activity_7_20240301000000.png')
+    assert index.latest(7) == 'activity_7_20240101000000.png'
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试报名名额控制：大量学生同时报名容量为K的活动时，恰好K人报名成功，不会超额
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Activity, Registration, Role, User
+
+STUDENTS = 20
+CAPACITY = 5
+
+
+def _setup(admin, students, capacity):
+    activity = Activity(
+        title='热门活动',
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=datetime.utcnow() + timedelta(days=3),
+        end_time=datetime.utcnow() + timedelta(days=3, hours=2),
+        registration_deadline=datetime.utcnow() + timedelta(days=2),
+        status='active',
+        max_participants=capacity,
+        created_by=admin.id
+    )
+    role = Role(name='Student', description='学生')
+    db.session.add_all([activity, role])
+    db.session.flush()
+    user_ids = []
+    for i in range(students):
+        user = User(
+            username=f'student{i}',
+            email=f'student{i}@example.com',
+            password_hash=generate_password_hash('student123', method='pbkdf2:sha256:1000'),
+            role_id=role.id
+        )
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+    db.session.commit()
+    return activity.id, user_ids
+
+
+def _login(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _post(client, url):
+    """在独立线程中发送请求，避免与测试线程共用应用上下文（current_user缓存在g中）"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(client.post(url).get_json()))
+    thread.start()
+    thread.join(timeout=60)
+    return result
+
+
+def test_parallel_registrations_respect_capacity(app, clean_db, admin_user):
+    activity_id, user_ids = _setup(admin_user, STUDENTS, CAPACITY)
+    clients = [_login(app, user_id) for user_id in user_ids]
+    barrier = threading.Barrier(len(clients))
+    results = [None] * len(clients)
+
+    def _register(index):
+        barrier.wait()
+        response = clients[index].post(f'/student/activity/{activity_id}/register')
+        results[index] = response.get_json()
+
+    threads = [threading.Thread(target=_register, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    succeeded = [r for r in results if r and r['success']]
+    rejected = [r for r in results if r and not r['success']]
+    assert len(succeeded) == CAPACITY
+    assert len(rejected) == STUDENTS - CAPACITY
+    assert all(r['message'] == '该活动报名人数已满' for r in rejected)
+
+    db.session.expire_all()
+    activity = db.session.get(Activity, activity_id)
+    assert activity.registered_count == CAPACITY
+    rows = db.session.execute(db.select(db.func.count()).select_from(Registration).filter_by(activity_id=activity_id)).scalar()
+    assert rows == CAPACITY
+
+
+def test_cancelled_registration_can_reclaim_seat(app, clean_db, admin_user):
+    activity_id, user_ids = _setup(admin_user, 2, 1)
+    first, second = (_login(app, user_id) for user_id in user_ids)
+
+    url = f'/student/activity/{activity_id}'
+    assert _post(first, f'{url}/register')['success']
+    assert not _post(second, f'{url}/register')['success']
+
+    assert _post(first, f'{url}/cancel')['success']
+    assert _post(second, f'{url}/register')['success']
+
+    # 名额已满时取消过的学生无法重新报名
+    response = _post(first, f'{url}/register')
+    assert not response['success']
+    assert response['message'] == '该活动报名人数已满'
+
+    db.session.expire_all()
+    activity = db.session.get(Activity, activity_id)
+    assert (activity.registered_count, activity.cancelled_count) == (1, 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试活动报名计数器：报名记录的新增、状态变化和删除都会在同一事务中更新计数器，修复命令可重新计算
+"""
+
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Activity, Registration, Role, User
+
+
+def _create_activity(admin):
+    activity = Activity(
+        title='计数器活动',
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=datetime.utcnow() + timedelta(days=3),
+        end_time=datetime.utcnow() + timedelta(days=3, hours=2),
+        registration_deadline=datetime.utcnow() + timedelta(days=2),
+        status='active',
+        created_by=admin.id
+    )
+    db.session.add(activity)
+    db.session.commit()
+    return activity
+
+
+def _create_students(count):
+    role = Role(name='Student', description='学生')
+    db.session.add(role)
+    db.session.flush()
+    users = []
+    for i in range(count):
+        user = User(
+            username=f'student{i}',
+            email=f'student{i}@example.com',
+            password_hash=generate_password_hash('student123'),
+            role_id=role.id
+        )
+        db.session.add(user)
+        users.append(user)
+    db.session.commit()
+    return users
+
+
+def _counters(activity_id):
+    activity = db.session.get(Activity, activity_id)
+    db.session.refresh(activity)
+    return activity.registered_count, activity.attended_count, activity.cancelled_count
+
+
+def test_counters_follow_registration_changes(app, admin_user):
+    activity = _create_activity(admin_user)
+    students = _create_students(4)
+    assert _counters(activity.id) == (0, 0, 0)
+
+    registrations = [Registration(user_id=s.id, activity_id=activity.id, status='registered') for s in students]
+    db.session.add_all(registrations)
+    db.session.commit()
+    assert _counters(activity.id) == (4, 0, 0)
+
+    registrations[0].status = 'attended'
+    registrations[1].status = 'cancelled'
+    db.session.commit()
+    assert _counters(activity.id) == (2, 1, 1)
+    assert activity.active_registration_count == 3
+    assert activity.total_registration_count == 4
+
+    # 已过期的对象删除时也能正确扣减
+    db.session.expire_all()
+    db.session.delete(db.session.get(Registration, registrations[0].id))
+    db.session.commit()
+    assert _counters(activity.id) == (2, 0, 1)
+
+    # 删除用户时级联删除报名记录
+    db.session.delete(db.session.get(User, students[2].id))
+    db.session.commit()
+    assert _counters(activity.id) == (1, 0, 1)
+
+    # 回滚的修改不影响计数器
+    registrations[3].status = 'attended'
+    db.session.flush()
+    db.session.rollback()
+    assert _counters(activity.id) == (1, 0, 1)
+
+
+def test_repair_command_recounts(app, admin_user):
+    activity = _create_activity(admin_user)
+    students = _create_students(3)
+    db.session.add_all([Registration(user_id=s.id, activity_id=activity.id, status='registered') for s in students])
+    db.session.commit()
+
+    # 模拟绕过ORM造成的计数器漂移
+    db.session.execute(db.update(Activity).where(Activity.id == activity.id).values(registered_count=99, cancelled_count=5))
+    db.session.commit()
+    assert _counters(activity.id) == (99, 0, 5)
+
+    result = app.test_cli_runner().invoke(args=['repair-registration-counts'])
+    assert result.exit_code == 0
+    db.session.expire_all()
+    assert _counters(activity.id) == (3, 0, 0)
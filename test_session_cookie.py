@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试没有会话的请求不下发会话Cookie，首页和海报响应可以被代理缓存
+"""
+
+from datetime import datetime, timedelta
+
+from src.models import db, Activity
+
+
+def test_cookieless_requests_set_no_cookie(app, client, admin_user):
+    activity = Activity(
+        title='海报活动',
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=datetime.utcnow() + timedelta(days=3),
+        end_time=datetime.utcnow() + timedelta(days=3, hours=2),
+        registration_deadline=datetime.utcnow() + timedelta(days=2),
+        status='active',
+        created_by=admin_user.id
+    )
+    activity.set_poster('activity_test_poster.png', b'\x89PNG' + b'\x00' * 1024, 'image/png')
+    db.session.add(activity)
+    db.session.commit()
+
+    for url in ('/', activity.poster_url):
+        client.cookie_jar.clear()
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'Set-Cookie' not in response.headers, url
+
+
+def test_repeat_visit_sets_no_cookie(admin_client):
+    first = admin_client.get('/')
+    assert first.status_code == 200
+
+    second = admin_client.get('/')
+    assert second.status_code == 200
+    assert 'Set-Cookie' not in second.headers
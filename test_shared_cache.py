@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试跨进程共享缓存：多个进程并发计数和读写缓存的结果正确，过期和淘汰生效
+"""
+
+import time
+import multiprocessing
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from src.utils.shared_cache import SQLiteCache, SQLiteStorage
+
+WORKERS = 4
+HITS_PER_WORKER = 50
+
+
+def _worker(path, index, results):
+    storage = storage_from_string(f'sqlite:///{path}')
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse(f'{WORKERS * HITS_PER_WORKER // 2} per hour')
+    allowed = sum(limiter.hit(limit, 'client') for _ in range(HITS_PER_WORKER))
+
+    cache = SQLiteCache(path)
+    cache.set(f'worker:{index}', {'index': index, 'allowed': allowed})
+    cache.add('first', index)
+    results.put(allowed)
+
+
+def test_multiprocess_counters_and_cache(tmp_path):
+    path = str(tmp_path / 'shared_cache.db')
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(path, i, results)) for i in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    # 所有进程共用一组计数：总命中数不多于限额，恰好放行限额数量的请求
+    allowed = [results.get(timeout=5) for _ in range(WORKERS)]
+    assert sum(allowed) == WORKERS * HITS_PER_WORKER // 2
+    storage = storage_from_string(f'sqlite:///{path}')
+    assert isinstance(storage, SQLiteStorage)
+    assert storage.get('LIMITER/client/100/1/hour') == WORKERS * HITS_PER_WORKER
+
+    cache = SQLiteCache(path)
+    for i in range(WORKERS):
+        assert cache.get(f'worker:{i}')['index'] == i
+    # add只有第一个进程成功
+    assert cache.get('first') in range(WORKERS)
+
+
+def test_expiry_and_eviction(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'), threshold=10)
+    cache.set('short', 1, timeout=1)
+    cache.set('forever', 2, timeout=0)
+    assert cache.get('short') == 1
+    assert not cache.add('short', 3)
+
+    storage = SQLiteStorage(f"sqlite:///{tmp_path / 'cache.db'}")
+    assert storage.incr('counter', 1) == 1
+    assert storage.incr('counter', 1) == 2
+
+    time.sleep(1.1)
+    assert cache.get('short') is None
+    assert cache.add('short', 3)
+    assert cache.get('short') == 3
+    # 计数窗口过期后重新计数
+    assert storage.get('counter') == 0
+    assert storage.incr('counter', 1) == 1
+
+    for i in range(30):
+        cache.set(f'key{i}', i)
+    cache.prune()
+    assert cache.get('key29') == 29
+    assert cache.get('forever') is None
+    assert sum(cache.has(f'key{i}') for i in range(30)) == 10
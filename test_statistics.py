@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试管理后台统计接口：分组查询结果正确，查询次数不随月份窗口变化，月度数据来自每日统计汇总
+"""
+
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Activity, Registration, Role, User
+from src.utils.statistics import month_window
+
+
+def _seed(admin):
+    now = datetime.now()
+    role = Role(name='Student', description='学生')
+    db.session.add(role)
+    db.session.flush()
+    students = []
+    for i in range(3):
+        student = User(username=f'student{i}', email=f'student{i}@example.com',
+                       password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000'), role_id=role.id)
+        db.session.add(student)
+        students.append(student)
+
+    activities = []
+    for i, (status, days_ago) in enumerate([('active', 0), ('active', 40), ('completed', 70), ('cancelled', 400)]):
+        activity = Activity(title=f'活动{i}', status=status, created_by=admin.id,
+                            created_at=now - timedelta(days=days_ago),
+                            start_time=now + timedelta(days=1), end_time=now + timedelta(days=2))
+        db.session.add(activity)
+        activities.append(activity)
+    db.session.flush()
+
+    db.session.add_all([
+        Registration(user_id=students[0].id, activity_id=activities[0].id, register_time=now),
+        Registration(user_id=students[1].id, activity_id=activities[0].id, register_time=now),
+        Registration(user_id=students[0].id, activity_id=activities[1].id, register_time=now - timedelta(days=40)),
+    ])
+    db.session.commit()
+
+
+def _get_statistics(sql_statements, client, months):
+    with sql_statements() as statements:
+        response = client.get(f'/admin/api/statistics?months={months}')
+    assert response.status_code == 200
+    # 只统计聚合查询，排除登录用户和角色的加载
+    return response.get_json(), [s for s in statements if 'count(' in s.lower() or 'daily_stats' in s]
+
+
+def test_month_window_spans_calendar_months():
+    labels, start = month_window(3, datetime(2024, 2, 15))
+    assert labels == ['2023-12', '2024-01', '2024-02']
+    assert start == datetime(2023, 12, 1)
+
+
+def test_statistics_use_constant_queries(app, admin_client, admin_user, sql_statements):
+    _seed(admin_user)
+
+    data, short_window = _get_statistics(sql_statements, admin_client, 6)
+    assert data['registration_stats']['data'] == [2, 1, 1]
+    assert data['participation_stats']['data'] == [2, 1]
+
+    monthly = data['monthly_stats']
+    assert len(monthly['labels']) == 6
+    assert sum(monthly['activities']) == 3
+    assert sum(monthly['registrations']) == 3
+    assert monthly['registrations'][-1] == 2
+
+    data, long_window = _get_statistics(sql_statements, admin_client, 24)
+    assert len(data['monthly_stats']['labels']) == 24
+    assert sum(data['monthly_stats']['activities']) == 4
+    assert len(long_window) == len(short_window) == 3
+
+
+def test_points_distribution_matches_python_binning(app, admin_client):
+    from src.models import StudentInfo
+    from src.utils.statistics import points_distribution
+
+    points = [None, -5, 0, 9, 10, 29, 30, 99, 500, 999, 1000, 5000]
+    db.session.add_all([StudentInfo(student_id=f'S{i}', points=p) for i, p in enumerate(points)])
+    db.session.commit()
+
+    dist = points_distribution()
+    assert dist['labels'] == ['0-9', '10-29', '30-49', '50-99', '100-199', '200-499', '500-999', '1000+']
+    # None按0计算，负数不计入任何区间
+    assert dist['data'] == [3, 2, 1, 1, 0, 0, 2, 2]
+
+    response = admin_client.get('/admin/api/statistics_ext?bins=0,100,1000')
+    assert response.status_code == 200
+    assert response.get_json()['points_dist'] == {'labels': ['0-99', '100-999', '1000+'], 'data': [7, 2, 2]}
+
+    # 无效的区间边界回退到默认值
+    assert points_distribution('10,5')['labels'] == dist['labels']
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试同步调度：按模型外键推导依赖，被引用的表完成后才开始引用它的表，互不依赖的表并发执行，进度写入BackupStatus
+"""
+
+import time
+import threading
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+
+from src import db
+from src.db_sync import DatabaseSyncer, backup_status
+from src.sync_planner import TableSyncScheduler, sync_workers, table_dependencies
+
+
+def test_dependencies_from_models():
+    dependencies = table_dependencies(['registrations', 'activities', 'users', 'roles', 'tags', 'unknown'])
+    assert dependencies == {
+        'registrations': {'users', 'activities'},
+        'activities': {'users'},
+        'users': {'roles'},
+        'roles': set(),
+        'tags': set(),
+        'unknown': set(),
+    }
+    assert sync_workers('postgresql://a', 'sqlite:///b.db') == 1
+
+
+def test_scheduler_respects_dependencies_and_runs_in_parallel():
+    dependencies = {'a': set(), 'b': set(), 'c': set(), 'd': {'a', 'b'}, 'e': {'d'}}
+    lock = threading.Lock()
+    events = []
+    active = {'now': 0, 'max': 0}
+
+    def sync_table(name):
+        with lock:
+            events.append(('start', name))
+            active['now'] += 1
+            active['max'] = max(active['max'], active['now'])
+        time.sleep(0.05)
+        with lock:
+            events.append(('end', name))
+            active['now'] -= 1
+        if name == 'c':
+            raise RuntimeError('复制失败')
+        return len(name)
+
+    finished = []
+    results = TableSyncScheduler(dependencies, max_workers=2).run(
+        sync_table, on_finish=lambda name, result: finished.append(name))
+
+    assert set(finished) == set(dependencies)
+    assert results['d'] == 1 and isinstance(results['c'], RuntimeError)
+    assert active['max'] == 2
+    position = {event: i for i, event in enumerate(events)}
+    assert position[('start', 'd')] > max(position[('end', 'a')], position[('end', 'b')])
+    assert position[('start', 'e')] > position[('end', 'd')]
+
+
+def test_scheduler_stops_starting_tables_after_deadline():
+    results = TableSyncScheduler({'a': set(), 'b': {'a'}}, deadline=time.time() - 1).run(lambda name: 1)
+    assert results == {}
+
+
+def test_full_backup_reports_table_progress(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    backup = create_engine(f"sqlite:///{tmp_path / 'backup.db'}")
+    for engine in (primary, backup):
+        db.metadata.create_all(engine)
+    with primary.begin() as conn:
+        conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'Admin')"))
+        conn.execute(text("INSERT INTO users (id, username, password_hash, role_id) VALUES (1, 'admin', 'x', 1)"))
+        conn.execute(text("INSERT INTO system_logs (id, user_id, action) VALUES (1, 1, 'login'), (2, 1, 'logout')"))
+
+    syncer = DatabaseSyncer()
+    syncer.dual_db = SimpleNamespace(primary_db_url=str(primary.url), backup_db_url=str(backup.url),
+                                     is_dual_db_enabled=lambda: True)
+    task_id = backup_status.create_task()
+    assert syncer._backup_with_progress(task_id)
+
+    status = syncer.get_backup_status(task_id)
+    assert status['completed_tables'] == status['total_tables'] == len(status['tables'])
+    assert status['tables']['system_logs'] == {'status': 'completed', 'rows': 2}
+    assert status['tables']['users'] == {'status': 'completed', 'rows': 1}
+    assert status['total_rows'] == 4
+    with backup.connect() as conn:
+        assert conn.execute(text('SELECT COUNT(*) FROM system_logs')).scalar() == 2
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试表指纹：按主键分块计算、与数据库方言无关；同步和恢复时跳过两边一致的表，数据库状态页逐表显示差异
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src import db
+from src.db_sync import DatabaseSyncer, backup_status
+from src.table_checksum import TableFingerprint, _canonical, compare_table, fingerprint_columns
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    backup = create_engine(f"sqlite:///{tmp_path / 'backup.db'}")
+    for engine in (primary, backup):
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO roles (id, name) VALUES (1, 'Admin')"))
+            conn.execute(text("INSERT INTO users (id, username, password_hash, role_id) VALUES (1, 'admin', 'x', 1)"))
+    yield primary, backup
+    primary.dispose()
+    backup.dispose()
+
+
+def _syncer(primary, backup):
+    syncer = DatabaseSyncer()
+    syncer.dual_db = SimpleNamespace(primary_db_url=str(primary.url), backup_db_url=str(backup.url),
+                                     is_dual_db_enabled=lambda: True)
+    return syncer
+
+
+def test_fingerprint_chunks_and_basis(engines):
+    primary, backup = engines
+    assert fingerprint_columns('activities') == (['id'], 'updated_at')
+    assert fingerprint_columns('activity_tags') == (['activity_id', 'tag_id'], None)
+
+    with primary.begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, action) VALUES (1, 'a'), (2, 'b'), (3, 'c'), (4, 'd'), (5, 'e')"))
+    with primary.connect() as conn:
+        whole = TableFingerprint(conn, 'system_logs', ['id']).compute()
+        chunked = TableFingerprint(conn, 'system_logs', ['id'], chunk_rows=2).compute()
+    assert whole['rows'] == chunked['rows'] == 5
+    assert whole['basis'] == 'row'
+
+    # 同样的行在另一个库中指纹一致，修改任意一列后不一致
+    with backup.begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, action) VALUES (1, 'a'), (2, 'b'), (3, 'c'), (4, 'd'), (5, 'e')"))
+    with primary.connect() as p, backup.connect() as b:
+        assert compare_table(p, b, 'system_logs')['in_sync']
+        b.execute(text("UPDATE system_logs SET action = 'changed' WHERE id = 3"))
+        result = compare_table(p, b, 'system_logs')
+        assert not result['in_sync'] and result['source']['rows'] == result['target']['rows'] == 5
+
+
+def test_canonical_values_match_across_dialects():
+    # SQLite原生查询返回字符串和整数，PostgreSQL返回datetime和bool
+    assert _canonical('2026-10-18 08:00:00') == _canonical(datetime(2026, 10, 18, 8))
+    assert _canonical('2026-10-18 08:00:00.500000') == _canonical(datetime(2026, 10, 18, 8, 0, 0, 500000))
+    assert _canonical(True) == _canonical(1)
+    assert _canonical(None) == ''
+
+
+def test_postgresql_digest_computed_in_database():
+    executed = []
+    chunks = iter([(2, 7, 'aaa'), (1, 9, 'bbb')])
+
+    def execute(stmt, params):
+        executed.append((str(stmt), params))
+        count, last_key, digest = next(chunks)
+        return SimpleNamespace(one=lambda: SimpleNamespace(row_count=count, last_key=last_key, digest=digest))
+
+    fake = SimpleNamespace(execute=execute)
+    fingerprint = TableFingerprint(fake, 'activities', ['id'], 'updated_at', in_database=True, chunk_rows=2).compute()
+
+    assert fingerprint['rows'] == 3 and fingerprint['basis'] == 'updated_at'
+    assert len(executed) == 2
+    assert 'md5(string_agg(r' in executed[0][0] and 'WHERE' not in executed[0][0]
+    assert 'WHERE t."id" > :after' in executed[1][0] and executed[1][1] == {'after': 7, 'limit': 2}
+
+
+def test_full_backup_skips_unchanged_tables(engines):
+    primary, backup = engines
+    with primary.begin() as conn:
+        conn.execute(text("INSERT INTO system_logs (id, user_id, action) VALUES (1, 1, 'login'), (2, 1, 'logout')"))
+    syncer = _syncer(primary, backup)
+
+    task_id = backup_status.create_task()
+    assert syncer._backup_with_progress(task_id)
+    tables = syncer.get_backup_status(task_id)['tables']
+    assert tables['system_logs'] == {'status': 'completed', 'rows': 2}
+    assert tables['users'] == {'status': 'unchanged'}
+
+    with primary.begin() as conn:
+        conn.execute(text("UPDATE users SET email = 'admin@example.com' WHERE id = 1"))
+    task_id = backup_status.create_task()
+    assert syncer._backup_with_progress(task_id)
+    tables = syncer.get_backup_status(task_id)['tables']
+    assert tables['system_logs'] == {'status': 'unchanged'}
+    assert tables['users'] == {'status': 'completed', 'rows': 1}
+    with backup.connect() as conn:
+        assert conn.execute(text('SELECT email FROM users')).scalar() == 'admin@example.com'
+
+
+def test_drift_report_and_restore_skip(engines):
+    primary, backup = engines
+    with backup.begin() as conn:
+        conn.execute(text("INSERT INTO tags (id, name) VALUES (1, '志愿')"))
+    syncer = _syncer(primary, backup)
+
+    drift = {entry['table']: entry for entry in syncer.compare_table_fingerprints()}
+    assert drift['tags'] == {'table': 'tags', 'status': 'drift', 'primary_rows': 0, 'backup_rows': 1, 'basis': 'row'}
+    assert drift['users']['status'] == 'in_sync'
+    assert drift['activities']['basis'] == 'updated_at'
+    assert 'sync_tombstones' not in drift
+
+    # 两边一致的表恢复时不再写入
+    with backup.connect() as b, primary.connect() as p:
+        assert syncer._restore_table_full(b, p, 'users', 0, float('inf')) == (True, 0)
+        assert syncer._restore_table_safe(b, p, 'tags', 0, float('inf')) == (True, 1)
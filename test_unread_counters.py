@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试未读计数器：发布/阅读通知、发送/阅读/删除消息时计数同步更新，徽章接口只按主键读取，对账命令与源表一致
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from src.models import db, Role, Tag, User, StudentInfo, Message, Notification, NotificationRead, UserUnreadCounter
+from src.utils.unread_counters import get_unread_counts, compute_unread_counts, reconcile_unread_counters
+
+
+def _get(client, url):
+    """在独立线程中发送请求，避免复用测试线程的应用上下文和登录用户"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(response=client.get(url)))
+    thread.start()
+    thread.join()
+    return result['response']
+
+
+def _create_student(username):
+    role = db.session.execute(db.select(Role).filter_by(name='Student')).scalar_one_or_none()
+    if role is None:
+        role = Role(name='Student', description='学生')
+        db.session.add(role)
+        db.session.flush()
+    student = User(username=username, email=f'{username}@example.com',
+                   password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000'), role_id=role.id)
+    db.session.add(student)
+    db.session.flush()
+    db.session.add(StudentInfo(user_id=student.id, student_id=username, real_name=username))
+    db.session.commit()
+    return student
+
+
+def _notify(admin, title, is_important=True):
+    notification = Notification(title=title, content=title, is_important=is_important,
+                                 created_at=datetime.utcnow(), created_by=admin.id)
+    db.session.add(notification)
+    db.session.commit()
+    return notification
+
+
+def _counter(user_id):
+    db.session.expire_all()
+    return db.session.get(UserUnreadCounter, user_id)
+
+
+def test_counters_follow_writes(app, admin_user):
+    student = _create_student('alice')
+    student_id = student.id
+
+    # 首次读取时根据源表计算并写回
+    assert get_unread_counts(student_id) == {'notifications': 0, 'messages': 0}
+
+    first = _notify(admin_user, '重要通知')
+    _notify(admin_user, '普通通知', is_important=False)
+    second = _notify(admin_user, '另一条重要通知')
+    assert _counter(student_id).unread_notifications == 2
+
+    db.session.add(NotificationRead(notification_id=first.id, user_id=student_id))
+    db.session.commit()
+    assert _counter(student_id).unread_notifications == 1
+
+    messages = [Message(sender_id=admin_user.id, receiver_id=student_id, subject=f'消息{i}', content='内容',
+                        created_at=datetime.utcnow()) for i in range(3)]
+    db.session.add_all(messages)
+    db.session.commit()
+    assert _counter(student_id).unread_messages == 3
+
+    # 对已过期的对象修改已读状态，也能按原值计算
+    db.session.expire_all()
+    messages[0].is_read = True
+    db.session.commit()
+    messages[0].is_read = True
+    db.session.commit()
+    assert _counter(student_id).unread_messages == 2
+
+    db.session.delete(messages[1])
+    db.session.delete(messages[0])
+    db.session.commit()
+    assert _counter(student_id).unread_messages == 1
+
+    # 编辑通知后通知计数需要重新计算
+    second.is_important = False
+    db.session.commit()
+    assert _counter(student_id).unread_notifications is None
+    assert get_unread_counts(student_id) == {'notifications': 0, 'messages': 1}
+    assert get_unread_counts(student_id) == compute_unread_counts(student_id)
+
+
+def test_badge_endpoints_use_counter(app, admin_user, sql_statements):
+    student = _create_student('bob')
+    student_id = student.id
+    _notify(admin_user, '停课通知')
+    db.session.add(Message(sender_id=admin_user.id, receiver_id=student_id, subject='你好', content='内容',
+                           created_at=datetime.utcnow()))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(student_id)
+        sess['_fresh'] = True
+    # 第一次请求计算并写入计数器
+    assert _get(client, '/student/api/messages/unread_count').get_json()['count'] == 1
+
+    with sql_statements() as statements:
+        assert _get(client, '/student/api/messages/unread_count').get_json()['count'] == 1
+    assert not [s for s in statements if 'FROM message' in s]
+    assert [s for s in statements if 'user_unread_counters' in s]
+
+    data = _get(client, '/student/api/notifications/unread').get_json()
+    assert [n['title'] for n in data['notifications']] == ['停课通知']
+
+
+def test_expired_notification_corrects_counter(app, admin_user):
+    student = _create_student('carol')
+    student_id = student.id
+    assert get_unread_counts(student_id)['notifications'] == 0
+    notification = _notify(admin_user, '即将过期')
+    assert _counter(student_id).unread_notifications == 1
+
+    # 直接修改数据库（绕过ORM钩子）模拟通知过期
+    db.session.execute(db.update(Notification).where(Notification.id == notification.id)
+                       .values(expiry_date=datetime.now() - timedelta(days=2)))
+    db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(student_id)
+        sess['_fresh'] = True
+    data = _get(client, '/student/api/notifications/unread').get_json()
+    assert data['notifications'] == []
+    assert _counter(student_id).unread_notifications == 0
+
+
+def test_reconcile_rebuilds_all_users(app, admin_user):
+    students = [_create_student(f'user{i}') for i in range(3)]
+    ids = [s.id for s in students]
+    notification = _notify(admin_user, '重要通知')
+    db.session.add(NotificationRead(notification_id=notification.id, user_id=ids[0]))
+    db.session.add(Message(sender_id=admin_user.id, receiver_id=ids[1], subject='你好', content='内容',
+                           created_at=datetime.utcnow()))
+    db.session.commit()
+
+    # 计数器被破坏后对账恢复
+    db.session.add(UserUnreadCounter(user_id=ids[2], unread_notifications=9, unread_messages=9))
+    db.session.commit()
+
+    assert reconcile_unread_counters() == 4
+    db.session.commit()
+    for user_id in ids + [admin_user.id]:
+        counter = _counter(user_id)
+        assert {'notifications': counter.unread_notifications, 'messages': counter.unread_messages} == \
+            compute_unread_counts(user_id)
+    assert _counter(ids[0]).unread_notifications == 0
+    assert _counter(ids[1]).unread_messages == 1
+
+
+def test_refresh_counts_and_stores_in_one_statement(app, admin_user, sql_statements):
+    student_id = _create_student('dave').id
+    db.session.add(Message(sender_id=admin_user.id, receiver_id=student_id, subject='你好', content='内容',
+                           created_at=datetime.utcnow()))
+    db.session.commit()
+    db.session.execute(db.delete(UserUnreadCounter))
+    db.session.commit()
+
+    # 调用方会话中未提交的改动既不会被提交也不会被丢弃
+    pending = Tag(name='未提交')
+    db.session.add(pending)
+    with sql_statements() as statements:
+        assert get_unread_counts(student_id) == {'notifications': 0, 'messages': 1}
+    assert pending in db.session.new
+
+    counter_writes = [s for s in statements if 'user_unread_counters' in s and 'INSERT' in s]
+    assert len(counter_writes) == 1
+    assert 'count(' in counter_writes[0].lower() and 'ON CONFLICT' in counter_writes[0]
+    # 计算和写入之间没有单独的COUNT查询
+    assert not [s for s in statements if 'FROM message' in s and 'INSERT' not in s]
+
+    db.session.rollback()
+    assert db.session.execute(db.select(Tag).filter_by(name='未提交')).scalar_one_or_none() is None
+    assert _counter(student_id).unread_messages == 1
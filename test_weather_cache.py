@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试天气缓存：按日期命中缓存，并发未命中只请求一次上游，上游失败时继续使用旧数据，没有旧数据时等待刷新有上限，有效期跟随发布时间
+"""
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import cache
+from src.utils import weather_api, weather_cache
+from src.utils.time_helpers import get_localized_now
+
+
+@pytest.fixture
+def upstream(app, monkeypatch):
+    """替换上游天气接口，记录调用次数"""
+    calls = []
+    state = {'data': {'description': '晴', 'temperature': 20}, 'delay': 0}
+
+    def fake_fetch(city_adcode, extensions, activity_date):
+        calls.append((city_adcode, extensions, activity_date))
+        time.sleep(state['delay'])
+        return dict(state['data'], extensions=extensions) if state['data'] else None
+
+    monkeypatch.setattr(weather_api, 'get_weather_data_with_fallback', fake_fetch)
+    with app.app_context():
+        cache.clear()
+        yield calls, state
+        cache.clear()
+
+
+def test_hits_cache_per_date(upstream):
+    calls, _ = upstream
+    tomorrow = get_localized_now() + timedelta(days=1)
+
+    first = weather_cache.get_cached_weather('500000', 'base')
+    first['activity_date'] = '调用方可以修改返回值'
+    assert weather_cache.get_cached_weather('500000', 'base') == {'description': '晴', 'temperature': 20,
+                                                                  'extensions': 'base'}
+    weather_cache.get_cached_weather('500000', 'all', tomorrow)
+    weather_cache.get_cached_weather('500000', 'all', tomorrow + timedelta(hours=2))
+    weather_cache.get_cached_weather('500000', 'all', tomorrow + timedelta(days=1))
+    assert [c[1] for c in calls] == ['base', 'all', 'all']
+
+
+def test_concurrent_misses_fetch_once(app, upstream):
+    calls, state = upstream
+    state['delay'] = 0.3
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(weather_cache.get_cached_weather('500000', 'base'))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and all(r and r['description'] == '晴' for r in results)
+
+
+def test_stale_data_served_when_upstream_fails(upstream, monkeypatch):
+    calls, state = upstream
+    assert weather_cache.get_cached_weather('500000', 'base')['description'] == '晴'
+
+    # 超过有效期后上游失败，继续返回旧数据，并在失败重试间隔内不再请求上游
+    now = time.time() + 3601
+    monkeypatch.setattr(weather_cache.time, 'time', lambda: now)
+    state['data'] = None
+    assert weather_cache.get_cached_weather('500000', 'base')['description'] == '晴'
+    assert weather_cache.get_cached_weather('500000', 'base')['description'] == '晴'
+    assert len(calls) == 2
+
+    # 上游恢复后使用新数据
+    now += 61
+    state['data'] = {'description': '小雨', 'temperature': 15}
+    assert weather_cache.get_cached_weather('500000', 'base')['description'] == '小雨'
+    assert len(calls) == 3
+
+
+def test_failure_without_stale_data_is_cached_briefly(upstream):
+    calls, state = upstream
+    state['data'] = None
+    assert weather_cache.get_cached_weather('500000', 'base') is None
+    assert weather_cache.get_cached_weather('500000', 'base') is None
+    assert len(calls) == 1
+
+
+def test_ttl_follows_report_time(app):
+    with app.app_context():
+        report = datetime(2026, 10, 18, 16, 0, 0)
+        reported_at = weather_cache._report_timestamp(report.strftime('%Y-%m-%d %H:%M:%S'))
+        # 发布20分钟后获取，缓存到下一次发布（40分钟后）
+        assert weather_cache.weather_ttl({'report_time': report.strftime('%Y-%m-%d %H:%M:%S')}, 'base',
+                                         reported_at + 1200) == pytest.approx(2400)
+        # 已过下一次发布时间但上游尚未更新，使用最短有效期
+        assert weather_cache.weather_ttl({'report_time': report.strftime('%Y-%m-%d %H:%M:%S')}, 'base',
+                                         reported_at + 7200) == 300
+        # 没有发布时间时按一个发布周期缓存
+        assert weather_cache.weather_ttl({}, 'all', reported_at) == 10800
+
+
+def test_refresh_lock_covers_slow_upstream(app, upstream, monkeypatch):
+    calls, state = upstream
+    # 锁的有效期覆盖两个上游接口都等满超时并重试的耗时（连接5秒+读取10秒，共3次尝试）
+    assert weather_cache.refresh_lock_ttl() >= 2 * (5 + 10) * 3
+
+    # 上游比锁的有效期还慢：锁过期后被其他请求抢占，原持有者结束时不能删除别人的锁
+    monkeypatch.setattr(weather_cache, 'refresh_lock_ttl', lambda: 1)
+    state['delay'] = 1.5
+    lock_key = weather_cache.weather_cache_key('500000', 'base') + ':refreshing'
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(weather_cache.get_cached_weather('500000', 'base'))
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(1.2)
+    assert cache.add(lock_key, 'other-holder', timeout=60)
+    thread.join()
+
+    assert results[0]['description'] == '晴'
+    assert cache.get(lock_key) == 'other-holder'
+    assert len(calls) == 1
+
+
+def test_waiters_give_up_quickly_without_stale_data(app, upstream, monkeypatch):
+    calls, state = upstream
+    state['delay'] = 1.5
+    monkeypatch.setitem(app.config, 'WEATHER_REFRESH_WAIT_SECONDS', 0.3)
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(weather_cache.get_cached_weather('500000', 'base'))
+
+    holder = threading.Thread(target=worker)
+    holder.start()
+    time.sleep(0.2)
+    # 刷新锁被占用且没有旧数据：等待不超过WEATHER_REFRESH_WAIT_SECONDS，随后不显示天气
+    started = time.monotonic()
+    assert weather_cache.get_cached_weather('500000', 'base') is None
+    assert time.monotonic() - started < 1
+    holder.join()
+
+    assert results[0]['description'] == '晴'
+    assert len(calls) == 1
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试活动天气预取：只预取天气显示范围内的进行中活动，缓存有效时不重复请求，开启预取后请求中不再等待预取任务负责的数据
+"""
+
+import time
+from datetime import timedelta
+
+import pytest
+
+from src import cache
+from src.models import db, Activity
+from src.utils import weather_api, weather_cache
+from src.utils.time_helpers import get_localized_now
+from src.utils.weather_prefetch import prefetch_targets, prefetch_activity_weather
+
+
+def _activity(admin, start_time, status='active'):
+    activity = Activity(
+        title='预取活动',
+        description='测试活动',
+        location='重庆师范大学',
+        start_time=start_time,
+        end_time=start_time + timedelta(hours=2),
+        registration_deadline=start_time - timedelta(hours=1),
+        status=status,
+        created_by=admin.id
+    )
+    db.session.add(activity)
+    return activity
+
+
+@pytest.fixture
+def upstream(app, monkeypatch):
+    calls = []
+
+    def fake_fetch(city_adcode, extensions, activity_date):
+        calls.append((extensions, activity_date.date() if activity_date else None))
+        return {'description': '多云', 'temperature': 22}
+
+    monkeypatch.setattr(weather_api, 'get_weather_data_with_fallback', fake_fetch)
+    cache.clear()
+    yield calls
+    cache.clear()
+
+
+def test_prefetch_upcoming_activities(app, admin_user, upstream):
+    now = get_localized_now().replace(tzinfo=None)
+    tomorrow = now.replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    _activity(admin_user, now.replace(hour=0, minute=30))
+    _activity(admin_user, tomorrow)
+    _activity(admin_user, tomorrow + timedelta(hours=5))
+    _activity(admin_user, tomorrow + timedelta(days=1), status='cancelled')
+    _activity(admin_user, now + timedelta(days=8))
+    db.session.commit()
+
+    assert sorted(t[0] for t in prefetch_targets()) == ['all', 'base']
+
+    assert prefetch_activity_weather() == 2
+    assert sorted(upstream, key=str) == sorted([('base', None), ('all', tomorrow.date())], key=str)
+    # 缓存仍然有效，不重复请求
+    assert prefetch_activity_weather(margin=60) == 0
+    assert len(upstream) == 2
+
+    # 详情页直接读取预取的数据
+    weather = weather_api.get_activity_weather(tomorrow)
+    assert weather['description'] == '多云' and weather['is_forecast']
+    assert len(upstream) == 2
+
+
+def test_requests_use_stale_data_when_prefetching(app, admin_user, upstream, monkeypatch):
+    start = get_localized_now().replace(tzinfo=None) + timedelta(days=2)
+    _activity(admin_user, start)
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'WEATHER_PREFETCH_INTERVAL', 600)
+    assert prefetch_activity_weather() == 1
+    key = weather_cache.weather_cache_key(weather_api.CHONGQING_ADCODE, 'all', start)
+    fresh_until = cache.get(key)['fresh_until']
+
+    # 预取的数据已过期，但由预取任务负责刷新，请求中不访问上游
+    monkeypatch.setattr(weather_cache.time, 'time', lambda: fresh_until + 300)
+    assert weather_api.get_activity_weather(start)['description'] == '多云'
+    assert len(upstream) == 1
+
+    # 过期超过一个预取周期，预取任务已不再刷新这条数据，请求中照常刷新
+    monkeypatch.setattr(weather_cache.time, 'time', lambda: fresh_until + 900)
+    assert weather_api.get_activity_weather(start)['description'] == '多云'
+    assert len(upstream) == 2
+    assert not cache.get(key)['prefetched']
+
+
+def test_requests_refresh_keys_not_prefetched(app, admin_user, upstream, monkeypatch):
+    # 已结束的活动不在预取范围内，请求写入的数据由请求刷新
+    start = get_localized_now().replace(tzinfo=None) + timedelta(days=2)
+    _activity(admin_user, start, status='completed')
+    db.session.commit()
+    monkeypatch.setitem(app.config, 'WEATHER_PREFETCH_INTERVAL', 600)
+    assert prefetch_activity_weather() == 0
+    assert weather_api.get_activity_weather(start)['description'] == '多云'
+    assert len(upstream) == 1
+
+    key = weather_cache.weather_cache_key(weather_api.CHONGQING_ADCODE, 'all', start)
+    fresh_until = cache.get(key)['fresh_until']
+    monkeypatch.setattr(weather_cache.time, 'time', lambda: fresh_until + 60)
+    assert weather_api.get_activity_weather(start)['description'] == '多云'
+    assert len(upstream) == 2